@@ -0,0 +1,5 @@
+import os
+
+# 数据库基准会清空并重建种子数据：任何基准模块导入 modules.database 之前都切换到独立的基准库，
+# 避免误连 .env 中配置的业务库（load_dotenv 不会覆盖已经存在的环境变量）
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB_NAME", "todobot_bench")
@@ -0,0 +1,106 @@
+"""
+指令分派微基准：对比 startswith 链和指令注册表，动词数量从 4 增加到 1024。
+
+startswith 链的成本随动词数量线性增长（未匹配的文本要走完整条链），
+注册表按首词查字典后只匹配一个小正则，成本基本不随动词数量变化。
+
+运行：python -m benchmarks.bench_commands [--messages 10000] [--repeat 5]
+"""
+import argparse
+import os
+import timeit
+
+# bot.config 导入时会校验必填配置，基准测试不需要真实的值
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("XAI_API_KEY", "benchmark")
+
+from bot.commands import CommandRegistry, CommandUsageError, Int, Text, Time  # noqa: E402
+
+BASE_VERBS = ["done", "delete", "change time", "change endtime"]
+
+
+async def _noop(update, context, **kwargs):
+    pass
+
+
+def make_verbs(count: int):
+    extra = [f"verb{i:04d}" for i in range(max(0, count - len(BASE_VERBS)))]
+    return BASE_VERBS + extra
+
+
+def make_registry(verbs) -> CommandRegistry:
+    registry = CommandRegistry()
+    registry.register("done", _noop, Int("todo_id", "任务编号"))
+    registry.register("delete", _noop, Int("todo_id", "任务编号"))
+    registry.register("change time", _noop, Time("new_time"))
+    registry.register("change endtime", _noop, Int("todo_id", "任务编号"), Text("end_time", "截止时间"))
+    for verb in verbs[len(BASE_VERBS):]:
+        registry.register(verb, _noop, Int("value", "参数"))
+    return registry
+
+
+def make_messages(verbs, count: int):
+    """一半是指令（均匀分布在所有动词上），一半是普通待办文本"""
+    messages = []
+    for i in range(count):
+        if i % 2:
+            messages.append(f"买牛奶和面包 第{i}次")
+        else:
+            messages.append(f"{verbs[(i // 2) % len(verbs)]} {i}")
+    return messages
+
+
+def legacy_dispatch(verbs, text: str):
+    """引入注册表之前的方式：逐个 startswith 判断"""
+    lowered = text.lower()
+    for verb in verbs:
+        if lowered.startswith(verb):
+            return verb
+    return None
+
+
+def registry_dispatch(registry: CommandRegistry, text: str):
+    matched = registry.match(text)
+    if matched:
+        command, rest, _ = matched
+        try:
+            command.parse(rest)
+        except CommandUsageError:
+            pass
+        return command.verb
+    return None
+
+
+def bench(name: str, func, repeat: int, messages: int) -> float:
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f"{name:<28} {best * 1e9 / messages:9.0f} ns/条")
+    return best
+
+
+def run(messages: int, repeat: int) -> dict:
+    print(f"messages={messages}, repeat={repeat}（取最好一次）")
+    results = {}
+    for count in (4, 16, 64, 256, 1024):
+        verbs = make_verbs(count)
+        registry = make_registry(verbs)
+        texts = make_messages(verbs, messages)
+        registry.match("")  # 预编译
+        results[f'legacy_{count}'] = bench(
+            f"startswith x{count}", lambda: [legacy_dispatch(verbs, t) for t in texts], repeat, messages
+        )
+        results[f'registry_{count}'] = bench(
+            f"registry x{count}", lambda: [registry_dispatch(registry, t) for t in texts], repeat, messages
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.messages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
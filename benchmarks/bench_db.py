@@ -0,0 +1,253 @@
+"""
+数据库查询基准：在本地 PostgreSQL 的独立基准库中写入种子数据，逐个测量 TodoDAO / LinkRepository 的查询，
+以及 handler 和定时任务常用的异步查询。
+
+基准库由 BENCH_DB_NAME 指定（默认 todobot_bench，需事先 CREATE DATABASE），
+连接参数沿用 DB_HOST / DB_PORT / DB_USER / DB_PASSWORD；连不上时跳过。
+每次运行先删除基准会话的旧数据再重新写入，结果为单次调用的耗时。
+
+运行：python -m benchmarks.bench_db [--rows 10000] [--number 50] [--repeat 5]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import timeit
+from datetime import datetime, timedelta, timezone
+
+# bot.config 导入时会校验必填配置，基准测试不需要真实的值
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("XAI_API_KEY", "benchmark")
+
+from sqlalchemy import delete, insert, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from modules.database import DB_NAME, SessionLocal, close_async_engine, engine, init_db  # noqa: E402
+from modules.link.models import Link  # noqa: E402
+from modules.link.repository import AsyncLinkRepository, LinkRepository  # noqa: E402
+from modules.todo.dao import AsyncTodoDAO, TodoDAO, todo_sort_key  # noqa: E402
+from modules.todo.models import Todo, TodoCounter  # noqa: E402
+from modules.todo.service import due_windows  # noqa: E402
+
+# 种子数据所属的会话和用户
+BENCH_CHAT_ID = -1001
+BENCH_USER_ID = 1001
+
+
+def connect() -> bool:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except OperationalError as e:
+        print(f"无法连接基准数据库 {DB_NAME}，跳过数据库基准: {str(e).splitlines()[0]}")
+        return False
+
+
+def seed(rows: int):
+    """重建基准会话的待办和链接：三分之一已完成、四分之三有截止时间、四分之一链接已读"""
+    now = datetime.now(timezone.utc)
+    todos = [
+        {
+            'chat_id': BENCH_CHAT_ID,
+            'todo_id': i + 1,
+            'todo_name': f"整理第 {i} 周的周报 & 发送给 <团队>",
+            'status': 'completed' if i % 3 == 0 else 'pending',
+            'create_time': now - timedelta(days=i % 30, minutes=i),
+            'end_time': now + timedelta(hours=(i % 200) - 50) if i % 4 else None,
+        }
+        for i in range(rows)
+    ]
+    links = [
+        {
+            'user_id': BENCH_USER_ID,
+            'url': f"https://example.com/posts/{i}?ref=bench",
+            'title': f"Article {i}",
+            'is_read': i % 4 == 0,
+            'created_at': now - timedelta(minutes=i),
+        }
+        for i in range(rows)
+    ]
+    db = SessionLocal()
+    try:
+        db.execute(delete(Todo).where(Todo.chat_id == BENCH_CHAT_ID))
+        db.execute(delete(TodoCounter).where(TodoCounter.chat_id == BENCH_CHAT_ID))
+        db.execute(delete(Link).where(Link.user_id == BENCH_USER_ID))
+        db.execute(insert(Todo), todos)
+        db.execute(insert(TodoCounter).values(chat_id=BENCH_CHAT_ID, last_id=rows))
+        db.execute(insert(Link), links)
+        db.commit()
+    finally:
+        db.close()
+    # 更新统计信息，让查询计划与长期运行的库一致
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE todos"))
+        conn.execute(text("ANALYZE links"))
+
+
+def seeded_ids():
+    db = SessionLocal()
+    try:
+        todo_ids = [row[0] for row in db.query(Todo.todo_id).filter(Todo.chat_id == BENCH_CHAT_ID)]
+        link_ids = [row[0] for row in db.query(Link.id).filter(Link.user_id == BENCH_USER_ID)]
+        return todo_ids, link_ids
+    finally:
+        db.close()
+
+
+def bench(name: str, func, number: int, repeat: int) -> float:
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print(f"{name:<44} {best * 1000:9.3f} ms/次")
+    return best
+
+
+def async_bench(loop, name: str, factory, number: int, repeat: int) -> float:
+    """每轮在同一个事件循环里顺序 await number 次 factory()"""
+    async def batch():
+        for _ in range(number):
+            await factory()
+
+    best = min(timeit.repeat(lambda: loop.run_until_complete(batch()), number=1, repeat=repeat)) / number
+    print(f"{name:<44} {best * 1000:9.3f} ms/次")
+    return best
+
+
+def run_todo_dao(number: int, repeat: int, todo_ids) -> dict:
+    chat = BENCH_CHAT_ID
+    now = datetime.now(timezone.utc)
+    ids = itertools.cycle(todo_ids)
+    windows = due_windows(chat, now.date(), days=2)
+    first_page = TodoDAO.get_page(chat, True)
+    cursor = todo_sort_key(first_page.items[-1], True) if first_page.items else None
+
+    results = {
+        'todo_dao.get_by_id': bench("TodoDAO.get_by_id", lambda: TodoDAO.get_by_id(chat, next(ids)), number, repeat),
+        'todo_dao.get_pending_todos': bench(
+            "TodoDAO.get_pending_todos", lambda: TodoDAO.get_pending_todos(chat), number, repeat),
+        'todo_dao.get_due_todos': bench(
+            "TodoDAO.get_due_todos", lambda: TodoDAO.get_due_todos(chat, windows[0][2], windows[0][3]), number, repeat),
+        'todo_dao.get_due_windows': bench(
+            "TodoDAO.get_due_windows", lambda: TodoDAO.get_due_windows(windows), number, repeat),
+        'todo_dao.get_all_todos': bench(
+            "TodoDAO.get_all_todos", lambda: TodoDAO.get_all_todos(chat), number, repeat),
+        'todo_dao.get_page': bench(
+            "TodoDAO.get_page", lambda: TodoDAO.get_page(chat, True), number, repeat),
+        'todo_dao.get_page_cursor': bench(
+            "TodoDAO.get_page（第二页）", lambda: TodoDAO.get_page(chat, True, cursor), number, repeat),
+    }
+
+    # 写操作：先创建，再在新建的事项上修改，最后删除，种子数据保持不变
+    created = []
+    results['todo_dao.create'] = bench(
+        "TodoDAO.create",
+        lambda: created.append(TodoDAO.create(chat, "基准测试", now, now + timedelta(days=1)).todo_id),
+        number, repeat
+    )
+    new_ids = itertools.cycle(created)
+    results['todo_dao.update_end_time'] = bench(
+        "TodoDAO.update_end_time",
+        lambda: TodoDAO.update_end_time(chat, next(new_ids), now + timedelta(days=2)), number, repeat
+    )
+    results['todo_dao.update_status'] = bench(
+        "TodoDAO.update_status", lambda: TodoDAO.update_status(chat, next(new_ids), 'pending'), number, repeat
+    )
+    results['todo_dao.delete'] = bench("TodoDAO.delete", lambda: TodoDAO.delete(chat, created.pop()), number, repeat)
+    return results
+
+
+def run_link_repository(number: int, repeat: int, link_ids) -> dict:
+    user = BENCH_USER_ID
+    repository = LinkRepository()
+    ids = itertools.cycle(link_ids)
+    first_page = repository.get_unread_page(user)
+    cursor = (first_page.items[-1].created_at, first_page.items[-1].id) if first_page.items else None
+
+    results = {
+        'link_repository.get_by_id': bench(
+            "LinkRepository.get_by_id", lambda: repository.get_by_id(next(ids)), number, repeat),
+        'link_repository.get_unread_links': bench(
+            "LinkRepository.get_unread_links(5)", lambda: repository.get_unread_links(user, 5), number, repeat),
+        'link_repository.get_unread_links_all': bench(
+            "LinkRepository.get_unread_links（全部）", lambda: repository.get_unread_links(user), number, repeat),
+        'link_repository.get_random_unread_link': bench(
+            "LinkRepository.get_random_unread_link", lambda: repository.get_random_unread_link(user), number, repeat),
+        'link_repository.get_unread_count': bench(
+            "LinkRepository.get_unread_count", lambda: repository.get_unread_count(user), number, repeat),
+        'link_repository.get_latest_unread_link': bench(
+            "LinkRepository.get_latest_unread_link", lambda: repository.get_latest_unread_link(user), number, repeat),
+        'link_repository.get_unread_page': bench(
+            "LinkRepository.get_unread_page", lambda: repository.get_unread_page(user), number, repeat),
+        'link_repository.get_unread_page_cursor': bench(
+            "LinkRepository.get_unread_page（第二页）",
+            lambda: repository.get_unread_page(user, cursor), number, repeat),
+    }
+
+    created = []
+    results['link_repository.create'] = bench(
+        "LinkRepository.create",
+        lambda: created.append(repository.create(user, "https://example.com/bench", "基准测试").id), number, repeat
+    )
+    new_ids = itertools.cycle(created)
+    results['link_repository.update_summary'] = bench(
+        "LinkRepository.update_summary", lambda: repository.update_summary(next(new_ids), "摘要"), number, repeat
+    )
+    results['link_repository.mark_as_read'] = bench(
+        "LinkRepository.mark_as_read", lambda: repository.mark_as_read(next(new_ids)), number, repeat
+    )
+    return results
+
+
+def run_async(number: int, repeat: int) -> dict:
+    """handler、待办缓存和定时任务走的异步查询"""
+    chat, user = BENCH_CHAT_ID, BENCH_USER_ID
+    now = datetime.now(timezone.utc)
+    windows = due_windows(chat, now.date(), days=2)
+    repository = AsyncLinkRepository()
+    loop = asyncio.new_event_loop()
+    try:
+        return {
+            'async_todo_dao.get_page': async_bench(
+                loop, "AsyncTodoDAO.get_page", lambda: AsyncTodoDAO.get_page(chat, True), number, repeat),
+            'async_todo_dao.get_due_windows': async_bench(
+                loop, "AsyncTodoDAO.get_due_windows", lambda: AsyncTodoDAO.get_due_windows(windows), number, repeat),
+            'async_todo_dao.get_cache_snapshot': async_bench(
+                loop, "AsyncTodoDAO.get_cache_snapshot",
+                lambda: AsyncTodoDAO.get_cache_snapshot(chat, 1000), number, repeat),
+            'async_todo_dao.get_pending_due_between': async_bench(
+                loop, "AsyncTodoDAO.get_pending_due_between",
+                lambda: AsyncTodoDAO.get_pending_due_between(now, now + timedelta(hours=6)), number, repeat),
+            'async_link_repository.get_unread_page': async_bench(
+                loop, "AsyncLinkRepository.get_unread_page",
+                lambda: repository.get_unread_page(user), number, repeat),
+        }
+    finally:
+        loop.run_until_complete(close_async_engine())
+        loop.close()
+
+
+def run(rows: int, number: int, repeat: int) -> dict:
+    """连不上数据库时返回空结果"""
+    if not connect():
+        return {}
+    init_db()
+    print(f"database={DB_NAME}, rows={rows}, number={number}, repeat={repeat}（取最好一轮的平均值）")
+    seed(rows)
+    todo_ids, link_ids = seeded_ids()
+    results = {}
+    results.update(run_todo_dao(number, repeat, todo_ids))
+    results.update(run_link_repository(number, repeat, link_ids))
+    results.update(run_async(number, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.number, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+解析与清理微基准：待办输入解析、待办列表渲染（10 / 1k / 10k 条）、LLM 输出清理、链接正文清理和 URL 提取。
+
+全部离线运行，不访问网络和数据库。
+
+运行：python -m benchmarks.bench_parse [--inputs 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import os
+import timeit
+from datetime import datetime, timedelta
+
+# bot.config 导入时会校验必填配置，基准测试不需要真实的值
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("XAI_API_KEY", "benchmark")
+
+from benchmarks.bench_render import make_todos  # noqa: E402
+from bot.config import TIMEZONE  # noqa: E402
+from modules.link.sanitizer import sanitize_telegram_html  # noqa: E402
+from modules.link.service import LinkService  # noqa: E402
+from modules.todo.service import format_todo_list, parse_todo_input  # noqa: E402
+
+TODO_LIST_ROWS = (10, 1000, 10000)
+# LLM 输出的大致字节数：普通摘要、长文解释、异常冗长的输出（清理耗时随大小超线性增长）
+LLM_OUTPUT_SIZES = (4 * 1024, 16 * 1024, 64 * 1024)
+
+
+def make_todo_inputs(count: int):
+    """四种输入各占四分之一：日期+时间、只有日期、/todo 前缀、纯文本"""
+    day = (datetime.now(TIMEZONE) + timedelta(days=30)).strftime("%Y-%m-%d")
+    inputs = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            inputs.append(f"{day} 09:{i % 60:02d}, 提交第 {i} 版设计稿")
+        elif kind == 1:
+            inputs.append(f"{day}, 准备第 {i} 次周会材料")
+        elif kind == 2:
+            inputs.append(f"/todo 回复第 {i} 封邮件")
+        else:
+            inputs.append(f"买牛奶和面包 第{i}次")
+    return inputs
+
+
+def make_llm_output(size: int) -> str:
+    """模拟 LLM 返回的 HTML：标题、段落、列表、代码和链接，夹杂 Telegram 不支持的标签"""
+    block = (
+        "<h2>要点</h2>\n"
+        "<p>这篇文章讨论了 <strong>缓存一致性</strong> 与 <em>延迟</em> 的取舍，"
+        "并给出了 <a href=\"https://example.com/ref\" target=\"_blank\">参考实现</a>。</p>\n"
+        "<ul><li><b>优点</b>：读路径无锁</li><li><i>缺点</i>：写放大 &amp; 额外内存</li></ul>\n"
+        "<pre><code class=\"language-python\">for item in items:\n    cache[item.key] = item</code></pre>\n"
+        "<div class=\"note\"><span style=\"color:red\">注意</span>：<a>无链接的锚点</a> 应被移除</div>\n"
+    )
+    return block * max(1, size // len(block.encode("utf-8")))
+
+
+def make_page_html(size: int) -> str:
+    """模拟抓取到的网页正文，用于 LinkService.clean_html"""
+    block = (
+        "<div class=\"post\"><h1>标题 &amp; 副标题</h1><p>正文 <a href=\"/x?a=1&b=2\">链接</a> "
+        "含有 <code>&lt;tag&gt;</code> 和 \"引号\" 以及 'quotes'</p><img src=\"a.png\"/></div>\n"
+    )
+    return block * max(1, size // len(block.encode("utf-8")))
+
+
+def make_link_messages(count: int):
+    """带标题的链接消息（不会触发抓取网页和生成标题）"""
+    return [f"第 {i} 篇值得一读的文章 https://example.com/posts/{i}?utm_source=bench&ref={i}" for i in range(count)]
+
+
+def bench(name: str, func, repeat: int) -> float:
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f"{name:<36} {best * 1000:9.2f} ms")
+    return best
+
+
+def _parse_all(inputs):
+    for text in inputs:
+        parse_todo_input(text)
+
+
+def run(inputs: int, repeat: int) -> dict:
+    print(f"inputs={inputs}, repeat={repeat}（取最好一次）")
+    results = {}
+
+    todo_inputs = make_todo_inputs(inputs)
+    results['parse_todo_input'] = bench(f"parse_todo_input x{inputs}", lambda: _parse_all(todo_inputs), repeat)
+
+    for rows in TODO_LIST_ROWS:
+        todos = make_todos(rows)
+        results[f'format_todo_list_{rows}'] = bench(
+            f"format_todo_list {rows} 条", lambda: format_todo_list(todos), repeat
+        )
+
+    for size in LLM_OUTPUT_SIZES:
+        output = make_llm_output(size)
+        results[f'sanitize_telegram_html_{size // 1024}k'] = bench(
+            f"sanitize_telegram_html {size // 1024}KB", lambda: sanitize_telegram_html(output), repeat
+        )
+
+    service = LinkService()
+    page = make_page_html(256 * 1024)
+    results['clean_html_256k'] = bench("LinkService.clean_html 256KB", lambda: service.clean_html(page), repeat)
+
+    messages = make_link_messages(inputs)
+
+    async def extract_all():
+        for text in messages:
+            await service.extract_url_and_title(text)
+
+    loop = asyncio.new_event_loop()
+    try:
+        results['extract_url_and_title'] = bench(
+            f"extract_url_and_title x{inputs}", lambda: loop.run_until_complete(extract_all()), repeat
+        )
+    finally:
+        loop.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.inputs, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+消息渲染微基准：渲染 10k 条待办 / 提醒 / 链接，并与旧的 += 拼接实现对比。
+
+运行：python -m benchmarks.bench_render [--rows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# bot.config 导入时会校验必填配置，基准测试不需要真实的值
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ.setdefault("XAI_API_KEY", "benchmark")
+
+from bot.config import TIMEZONE  # noqa: E402
+from utils.render import (  # noqa: E402
+    render_due_reminder, render_link_list, render_todo_list, split_html
+)
+
+
+def make_todos(rows: int):
+    now = datetime.now(TIMEZONE)
+    return [
+        SimpleNamespace(
+            todo_id=i,
+            todo_name=f"整理第 {i} 周的周报 & 发送给 <团队>",
+            status='completed' if i % 3 == 0 else 'pending',
+            create_time=now - timedelta(days=i % 30, minutes=i),
+            end_time=now + timedelta(hours=(i % 200) - 50) if i % 4 else None
+        )
+        for i in range(rows)
+    ]
+
+
+def make_links(rows: int):
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=i,
+            title=f"Article {i}: Understanding <things> & stuff",
+            url=f"https://example.com/posts/{i}?ref=bench&id={i}",
+            summary="这是一段摘要。" * 8,
+            created_at=now - timedelta(minutes=i)
+        )
+        for i in range(rows)
+    ]
+
+
+def legacy_format_todo_list(todos, list_type="all") -> str:
+    """引入渲染模块之前的实现：逐行 += 拼接，每行调用 strftime 和 datetime.now()"""
+    result = f"📝 {'未完成的' if list_type == 'pending' else '所有'}待办事项:\n"
+    for todo in todos:
+        result += "\n━━━━━━━━━━━━━━━\n"
+        result += f"📌 <code>{todo.todo_id}</code> "
+        result += "✅" if todo.status == 'completed' else "⭕️"
+        result += f" {todo.todo_name}\n"
+        result += f"⏰ 创建：{todo.create_time.strftime('%m-%d %H:%M')}"
+        if todo.end_time:
+            time_diff = todo.end_time - datetime.now(TIMEZONE)
+            if time_diff.days >= 0:
+                result += f"\n⏳ 截止：{todo.end_time.strftime('%m-%d %H:%M')}"
+                result += f" (还剩 {time_diff.days}天{time_diff.seconds // 3600}小时)"
+            else:
+                result += f"\n⚠️ 截止：{todo.end_time.strftime('%m-%d %H:%M')} [已过期]"
+    result += "\n━━━━━━━━━━━━━━━"
+    return result
+
+
+def bench(name: str, func, repeat: int) -> float:
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(f"{name:<32} {best * 1000:9.2f} ms")
+    return best
+
+
+def run(rows: int, repeat: int) -> dict:
+    todos = make_todos(rows)
+    links = make_links(rows)
+    big_html = "\n".join(f"<b>段落 {i}</b> <i>{'内容 ' * 20}</i> &amp; <a href=\"https://x.y/{i}\">链接</a>"
+                         for i in range(rows))
+
+    print(f"rows={rows}, repeat={repeat}（取最好一次）")
+    return {
+        'legacy_todo_list': bench("legacy format_todo_list", lambda: legacy_format_todo_list(todos), repeat),
+        'render_todo_list': bench("render_todo_list", lambda: render_todo_list(todos), repeat),
+        'render_due_reminder': bench(
+            "render_due_reminder",
+            lambda: render_due_reminder("🌅 <b>早间提醒</b>", "📅 <b>今日截止事项</b>", todos, "❗️", ""),
+            repeat
+        ),
+        'render_link_list': bench("render_link_list", lambda: render_link_list(links, "📚"), repeat),
+        'split_html': bench("split_html", lambda: split_html(big_html), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+运行全部基准，结果保存为 JSON，并与保存的基准线比较。
+
+    python -m benchmarks.run_all                          # 运行并与 benchmarks/baseline.json 比较
+    python -m benchmarks.run_all --save-baseline          # 把本次结果保存为基准线
+    python -m benchmarks.run_all --quick --skip-db        # 小数据量、不连数据库，适合快速检查
+
+结果 JSON：{"meta": {...运行参数和环境}, "results": {"套件.名称": 秒, ...}}，数值越小越好。
+某项耗时超过基准线的 (1 + threshold) 倍、且绝对差值超过 min-delta-ms 时视为退化，退出码为 1。
+不同机器上的耗时不可比，基准线应在同一台机器上生成。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks import bench_commands, bench_db, bench_parse, bench_render
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# 每个套件的运行参数：默认 / --quick
+PARAMS = {
+    'render': ({'rows': 10000, 'repeat': 5}, {'rows': 1000, 'repeat': 3}),
+    'commands': ({'messages': 10000, 'repeat': 5}, {'messages': 2000, 'repeat': 3}),
+    'parse': ({'inputs': 10000, 'repeat': 5}, {'inputs': 1000, 'repeat': 3}),
+    'db': ({'rows': 10000, 'number': 50, 'repeat': 5}, {'rows': 1000, 'number': 10, 'repeat': 3}),
+}
+SUITES = {
+    'render': bench_render.run,
+    'commands': bench_commands.run,
+    'parse': bench_parse.run,
+    'db': bench_db.run,
+}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suites(names: List[str], quick: bool) -> dict:
+    params = {name: PARAMS[name][1 if quick else 0] for name in names}
+    results: Dict[str, float] = {}
+    for name in names:
+        print(f"\n== {name} ==")
+        for key, value in SUITES[name](**params[name]).items():
+            results[f"{name}.{key}"] = value
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': params,
+        },
+        'results': results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta: float) -> List[str]:
+    """打印逐项对比，返回退化的基准名称"""
+    if current['meta']['params'] != baseline['meta'].get('params'):
+        print("⚠️ 运行参数与基准线不同，对比结果仅供参考")
+    regressions = []
+    base_results = baseline['results']
+    print(f"\n{'基准':<52} {'基准线':>12} {'本次':>12} {'变化':>8}")
+    for name, value in current['results'].items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<52} {'-':>12} {value * 1000:10.3f}ms {'新增':>8}")
+            continue
+        change = (value - base) / base if base else 0.0
+        regressed = value > base * (1 + threshold) and value - base > min_delta
+        flag = "  ❌ 退化" if regressed else ""
+        print(f"{name:<52} {base * 1000:10.3f}ms {value * 1000:10.3f}ms {change:+8.1%}{flag}")
+        if regressed:
+            regressions.append(name)
+    for name in base_results.keys() - current['results'].keys():
+        print(f"{name:<52} {'(本次未运行)':>12}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="只运行指定套件，可重复")
+    parser.add_argument("--skip-db", action="store_true", help="不运行数据库基准")
+    parser.add_argument("--quick", action="store_true", help="使用较小的数据量")
+    parser.add_argument("--output", help="把本次结果写入该 JSON 文件")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基准线 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基准线")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的相对变慢比例，默认 0.25")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="小于该绝对差值（毫秒）的变化忽略")
+    args = parser.parse_args()
+
+    names = args.suite or list(SUITES)
+    if args.skip_db:
+        names = [name for name in names if name != 'db']
+    current = run_suites(names, args.quick)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"\n基准线已保存到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n没有基准线 {args.baseline}，使用 --save-baseline 保存本次结果")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold, args.min_delta_ms / 1000)
+    if regressions:
+        print(f"\n❌ {len(regressions)} 项超过阈值 {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\n✅ 没有超过阈值 {args.threshold:.0%} 的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,19 @@ from telegram.ext import Application
 
 async def setup_bot(token: str) -> Application:
     """初始化并返回 bot application"""
+    # 延迟导入，避免 bot 包与 modules 之间的循环导入
+    from bot.application import TracedApplication
+    from bot.lifecycle import post_init, post_shutdown
+    from bot.rate_limiter import PriorityRateLimiter
+
     try:
-        application = Application.builder().token(token).build()
+        application = (Application.builder()
+                       .application_class(TracedApplication)
+                       .token(token)
+                       .rate_limiter(PriorityRateLimiter())
+                       .post_init(post_init)
+                       .post_shutdown(post_shutdown)
+                       .build())
         return application
     except Exception as e:
         print(f"Error initializing bot: {e}")
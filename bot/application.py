@@ -0,0 +1,26 @@
+from telegram import Update
+from telegram.ext import Application
+
+from utils.tracing import start_trace
+
+
+def describe_update(update: Update) -> str:
+    """追踪日志中的更新类型，不包含消息正文"""
+    if update.callback_query:
+        return f"callback {(update.callback_query.data or '').split(':', 1)[0]}"
+    message = update.effective_message
+    if message and message.text:
+        head = message.text.split(maxsplit=1)[0] if message.text.strip() else ""
+        return f"command {head.split('@', 1)[0]}" if head.startswith("/") else "message"
+    return "update"
+
+
+class TracedApplication(Application):
+    """每个更新在独立的追踪上下文中处理，耗时分解写入 logs/trace.log"""
+
+    async def process_update(self, update: object) -> None:
+        if not isinstance(update, Update):
+            await super().process_update(update)
+            return
+        with start_trace(update.update_id, describe_update(update)):
+            await super().process_update(update)
@@ -0,0 +1,220 @@
+"""
+声明式命令注册表：文本指令（done 1、change endtime ...）和斜杠命令（/read 1）统一注册，
+注册后预编译为"首词字典 + 每个首词一个小正则"，一次查表即可分派，动词数量增加时匹配成本基本不变。
+
+- 动词后必须是空白、@机器人名 或消息结尾，"doneX" 之类的普通文本不会被误认为指令
+- 参数按声明的类型解析，格式不符时自动回复由声明生成的用法说明
+- 未匹配任何动词的文本交给 fallback 处理（例如创建待办事项）
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from html import escape
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import CallbackContext, MessageHandler, filters
+
+from utils.metrics import HANDLER_SECONDS
+from utils.tracing import span
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class CommandUsageError(ValueError):
+    """指令参数不符合声明，消息内容直接回复给用户"""
+
+
+@dataclass
+class Arg:
+    """
+    指令参数声明。
+    pattern 匹配原始文本，convert 转换为目标类型，转换失败时回复 error；
+    rest=True 表示吞掉剩余的全部文本（只能是最后一个参数）
+    """
+    name: str
+    label: str
+    pattern: str = r"\S+"
+    convert: Callable[[str], Any] = str
+    error: Optional[str] = None
+    optional: bool = False
+    rest: bool = False
+
+    @property
+    def placeholder(self) -> str:
+        return f"[{self.label}]" if self.optional else f"<{self.label}>"
+
+
+def Int(name: str, label: str, optional: bool = False) -> Arg:
+    return Arg(name, label, r"\S+", int, f"❌ {label}应为数字", optional)
+
+
+def Time(name: str, label: str = "HH:MM", optional: bool = False) -> Arg:
+    def convert(value: str) -> str:
+        if not re.match(r"^\d{2}:\d{2}$", value):
+            raise ValueError(value)
+        return value
+    return Arg(name, label, r"\S+", convert, "❌ 时间格式错误，请使用 HH:MM 格式", optional)
+
+
+def Text(name: str, label: str, optional: bool = False) -> Arg:
+    return Arg(name, label, r".+", str.strip, None, optional, rest=True)
+
+
+@dataclass
+class Command:
+    verb: str
+    handler: Handler
+    args: Tuple[Arg, ...] = ()
+    description: str = ""
+    _grammar: Optional[re.Pattern] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        for arg in self.args[:-1]:
+            if arg.rest:
+                raise ValueError(f"指令 {self.verb} 的参数 {arg.name} 会吞掉剩余文本，只能放在最后")
+        pattern = ""
+        for arg in self.args:
+            part = rf"\s+(?P<{arg.name}>{arg.pattern})"
+            pattern += f"(?:{part})?" if arg.optional else part
+        self._grammar = re.compile(rf"^{pattern}\s*$", re.S)
+
+    @property
+    def usage(self) -> str:
+        return " ".join([self.verb] + [arg.placeholder for arg in self.args])
+
+    def parse(self, rest: str) -> Dict[str, Any]:
+        """按声明解析参数，失败时抛出 CommandUsageError；未声明参数的指令忽略多余文本"""
+        if not self.args:
+            return {}
+        match = self._grammar.match(rest)
+        if not match:
+            raise CommandUsageError(f"格式错误，请使用：{escape(self.usage)}")
+        values = {}
+        for arg in self.args:
+            raw = match.group(arg.name)
+            if raw is None:
+                values[arg.name] = None
+                continue
+            try:
+                values[arg.name] = arg.convert(raw)
+            except ValueError:
+                raise CommandUsageError(arg.error or f"格式错误，请使用：{escape(self.usage)}")
+        return values
+
+
+# 首个单词，斜杠命令可带 @机器人名；动词后必须是空白或结尾由各首词的小正则保证
+_HEAD = re.compile(r"\s*(?P<head>[^\s@]+)(?:@(?P<bot>\w+))?")
+
+
+def _normalize(verb: str) -> str:
+    return " ".join(verb.lower().split())
+
+
+class CommandRegistry:
+    """指令注册表，install 后由一个 MessageHandler 负责全部分派"""
+
+    def __init__(self):
+        self._commands: Dict[str, Command] = {}
+        self._index: Optional[Dict[str, re.Pattern]] = None
+        self.fallback: Optional[Handler] = None
+
+    def register(self, verb: str, handler: Handler, *args: Arg, description: str = "") -> Command:
+        """注册一个动词；多个单词的动词之间可以是任意空白"""
+        key = _normalize(verb)
+        if key in self._commands:
+            raise ValueError(f"指令 {verb} 已注册")
+        command = Command(key, handler, args, description)
+        self._commands[key] = command
+        self._index = None
+        return command
+
+    def command(self, verb: str, *args: Arg, description: str = ""):
+        """装饰器形式的 register"""
+        def decorator(handler: Handler) -> Handler:
+            self.register(verb, handler, *args, description=description)
+            return handler
+        return decorator
+
+    def set_fallback(self, handler: Handler):
+        """未匹配任何动词的文本交给 handler(update, context, text)"""
+        self.fallback = handler
+
+    @property
+    def commands(self) -> List[Command]:
+        return list(self._commands.values())
+
+    def _compile(self) -> Dict[str, re.Pattern]:
+        """
+        按首个单词建索引：首词查字典，同一首词下的后续单词（如 change time / change endtime）
+        编译成一个小正则，长的在前。动词再多，每条消息也只做一次查表和一次小正则匹配
+        """
+        tails: Dict[str, List[str]] = {}
+        for verb in self._commands:
+            head, _, tail = verb.partition(" ")
+            tails.setdefault(head, []).append(tail)
+        index = {}
+        for head, words in tails.items():
+            words.sort(key=len, reverse=True)
+            alternation = "|".join(
+                r"\s+" + r"\s+".join(map(re.escape, tail.split())) if tail else "" for tail in words
+            )
+            index[head] = re.compile(rf"(?P<tail>{alternation})(?P<rest>\s.*)?$", re.I | re.S)
+        return index
+
+    def match(self, text: str) -> Optional[Tuple[Command, str, Optional[str]]]:
+        """返回 (指令, 参数文本, @的机器人名)，不是指令时返回 None"""
+        if self._index is None:
+            self._index = self._compile()
+        head_match = _HEAD.match(text)
+        if not head_match:
+            return None
+        head = head_match.group('head').lower()
+        pattern = self._index.get(head)
+        if pattern is None:
+            return None
+        match = pattern.match(text, head_match.end())
+        if not match:
+            return None
+        tail = match.group('tail')
+        verb = f"{head} {_normalize(tail)}" if tail else head
+        return self._commands[verb], match.group('rest') or "", head_match.group('bot')
+
+    async def dispatch(self, update: Update, context: CallbackContext):
+        message = update.effective_message
+        text = message.text or ""
+        matched = self.match(text)
+        if not matched:
+            # 未注册的斜杠命令直接忽略，不交给 fallback
+            if self.fallback and not text.lstrip().startswith("/"):
+                with HANDLER_SECONDS.track(command="<text>"), span("handler <text>"):
+                    await self.fallback(update, context, text.strip())
+            return
+
+        command, rest, bot_name = matched
+        # 群组中 @其他机器人 的命令不处理
+        if bot_name and context.bot.username and bot_name.lower() != context.bot.username.lower():
+            return
+        try:
+            values = command.parse(rest)
+        except CommandUsageError as e:
+            await message.reply_text(str(e), parse_mode=ParseMode.HTML)
+            return
+        # 兼容按 context.args 读取参数的处理函数
+        context.args = rest.split()
+        with HANDLER_SECONDS.track(command=command.verb), span(f"handler {command.verb}"):
+            await command.handler(update, context, **values)
+
+    def install(self, application, group: int = 0):
+        """注册到 Application；应在其他 MessageHandler（例如链接识别）之后调用"""
+        self._index = self._compile()
+        application.add_handler(MessageHandler(filters.TEXT, self.dispatch), group=group)
+        logging.info(f"已注册 {len(self._commands)} 个指令")
+
+
+_registry = CommandRegistry()
+
+
+def get_command_registry() -> CommandRegistry:
+    return _registry
@@ -1,5 +1,4 @@
 import os
-import re
 from datetime import datetime
 
 import pytz
@@ -14,6 +13,45 @@ REMINDER_TIME = os.getenv("REMINDER_TIME", "09:00")
 TIMEZONE = pytz.timezone(os.getenv("TIMEZONE", "Asia/Shanghai"))
 CHAT_ID = os.getenv("CHAT_ID")
 
+# 定时提醒配置：每个会话的提醒时间和时区保存在 reminders 表，以下为新会话的默认值
+REMINDER_AFTERNOON_TIME = os.getenv("REMINDER_AFTERNOON_TIME", "16:00")  # 下午提醒（今日和明日截止事项）
+REMINDER_DIGEST_TIME = os.getenv("REMINDER_DIGEST_TIME", "14:50")  # 未读链接摘要推送
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))  # 每次领取的到期提醒数量
+REMINDER_MAX_LATENESS = float(os.getenv("REMINDER_MAX_LATENESS", "3600"))  # 超过触发时间多久的提醒直接跳过（秒）
+REMINDER_SEND_CONCURRENCY = int(os.getenv("REMINDER_SEND_CONCURRENCY", "30"))  # 同时发送提醒的会话数
+REMINDER_DIGEST_CONCURRENCY = int(os.getenv("REMINDER_DIGEST_CONCURRENCY", "2"))  # 同时生成链接摘要的会话数
+
+# 截止提醒：单个待办临近截止和已过期时各通知一次
+DEADLINE_NOTIFY = os.getenv("DEADLINE_NOTIFY", "true").lower() in ("1", "true", "yes")
+DEADLINE_WARNING_LEAD = float(os.getenv("DEADLINE_WARNING_LEAD", "1800"))  # 截止前多久发送“即将截止”（秒）
+DEADLINE_HORIZON = float(os.getenv("DEADLINE_HORIZON", "21600"))  # 内存中保留未来多长时间内的截止事项（秒）
+
+# 运行模式：polling（长轮询，默认）或 webhook（内置 HTTP 服务接收推送）
+RUN_MODE = os.getenv("RUN_MODE", "polling").strip().lower()
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")  # 监听地址
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))  # 监听端口
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")  # 接收更新的路径
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # 对外的基础 URL，设置后启动时自动向 Telegram 注册 webhook
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")  # 校验 X-Telegram-Bot-Api-Secret-Token
+
+# 日志配置：日志经队列由后台线程写出；SQL 只记录慢查询，阈值见 DB_SLOW_QUERY_MS
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))  # 请求体、SQL 参数等写入日志时的最大字符数
+
+# 指标服务：GET /metrics 返回 Prometheus 文本格式，端口设为 0 时不启动
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# 追踪：每个更新的耗时分解写入 logs/trace.log，耗时低于 TRACE_MIN_MS（毫秒）的不写，负数关闭
+TRACE_MIN_MS = float(os.getenv("TRACE_MIN_MS", "0"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))  # 单个更新最多记录的 span 数
+
+# 性能分析：/profile 只对 ADMIN_USER_IDS（逗号分隔的用户 ID）开放，未配置时不可用
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))  # 采样间隔
+PROFILE_DEFAULT_SECONDS = int(os.getenv("PROFILE_DEFAULT_SECONDS", "30"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
 # 数据库配置
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "26221030")
@@ -47,10 +85,77 @@ if PROXY_HOST and PROXY_PORT:
 DAILY_LINK_REMINDER_TIME = os.getenv("DAILY_LINK_REMINDER_TIME", "10:00")
 MAX_SUMMARY_LENGTH = int(os.getenv("MAX_SUMMARY_LENGTH", "200"))
 
+# 未读链接摘要推送配置
+DIGEST_ITEM_COUNT = int(os.getenv("DIGEST_ITEM_COUNT", "5"))  # 每次推送的链接数量
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "3"))  # 同时抓取/生成摘要的链接数量
+DIGEST_ITEM_TIMEOUT = float(os.getenv("DIGEST_ITEM_TIMEOUT", "60"))  # 抓取单个链接、生成一组摘要各自的时限（秒）
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "2"))  # 每组合并为一次摘要请求的链接数量，越小首条推送越快
+
+# 链接后台补全（标题、正文、摘要预生成）任务队列配置
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "2"))  # 并发 worker 数量
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "5"))  # 最大尝试次数
+ENRICH_BACKOFF_BASE = float(os.getenv("ENRICH_BACKOFF_BASE", "30"))  # 重试退避基数（秒）
+ENRICH_BACKOFF_MAX = float(os.getenv("ENRICH_BACKOFF_MAX", "3600"))  # 重试退避上限（秒）
+ENRICH_VISIBILITY_TIMEOUT = float(os.getenv("ENRICH_VISIBILITY_TIMEOUT", "600"))  # 任务被领取后多久未完成视为丢失（秒）
+ENRICH_POLL_INTERVAL = float(os.getenv("ENRICH_POLL_INTERVAL", "10"))  # 队列为空时的轮询间隔（秒）
+ENRICH_DONE_RETENTION = float(os.getenv("ENRICH_DONE_RETENTION", "604800"))  # 已完成任务的保留时长（秒），超过后删除
+ENRICH_PRUNE_INTERVAL = float(os.getenv("ENRICH_PRUNE_INTERVAL", "3600"))  # 清理已完成任务的间隔（秒）
+
+# 出站消息限流配置（Telegram 限制：全局约 30 条/秒，单个私聊约 1 条/秒，群组约 20 条/分钟）
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))  # 全局每秒条数
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))  # 单个私聊每秒条数
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))  # 单个私聊允许的突发条数
+SEND_GROUP_PER_MINUTE = float(os.getenv("SEND_GROUP_PER_MINUTE", "20"))  # 单个群组每分钟条数
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))  # 收到 RetryAfter 后最多重发次数
+
+# 列表分页配置
+TODO_PAGE_SIZE = int(os.getenv("TODO_PAGE_SIZE", "10"))  # /demo、/demoz 每页条数
+UNREAD_PAGE_SIZE = int(os.getenv("UNREAD_PAGE_SIZE", "5"))  # /unread 每页条数
+
+# 待办事项内存缓存配置
+TODO_CACHE_MAX_ENTRIES = int(os.getenv("TODO_CACHE_MAX_ENTRIES", "5000"))  # 每个会话最多缓存的待办条数
+TODO_CACHE_MAX_CHATS = int(os.getenv("TODO_CACHE_MAX_CHATS", "1000"))  # 最多缓存的会话数，超出时淘汰最久未访问的
+
+# 网页缓存配置
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "cache/pages")  # 磁盘缓存目录
+PAGE_CACHE_MEMORY_BYTES = int(os.getenv("PAGE_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))  # 内存层字节预算
+PAGE_CACHE_DISK_BYTES = int(os.getenv("PAGE_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))  # 磁盘层字节预算
+PAGE_CACHE_DEFAULT_TTL = int(os.getenv("PAGE_CACHE_DEFAULT_TTL", "600"))  # 响应未声明缓存策略时的新鲜期（秒）
+PAGE_FETCH_TIMEOUT = float(os.getenv("PAGE_FETCH_TIMEOUT", "20"))  # 抓取网页超时（秒）
+
 # API 配置
 API_KEY = os.getenv("API_KEY")
 API_URL = os.getenv("API_URL", "https://openai.com/v1/chat/completions")  # 提供默认值
 
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+
+# 正文提取后各任务送入 LLM 的 token 预算
+TOKEN_BUDGET_TITLE = int(os.getenv("TOKEN_BUDGET_TITLE", "800"))
+TOKEN_BUDGET_SUMMARY = int(os.getenv("TOKEN_BUDGET_SUMMARY", "3000"))
+TOKEN_BUDGET_EXPLAIN = int(os.getenv("TOKEN_BUDGET_EXPLAIN", "6000"))
+
+# 流式输出配置：/summarize 和 /explain 边生成边更新消息
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # 两次编辑消息的最小间隔（秒）
+
+# 批量摘要配置：多篇文档合并到一次请求
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "12000"))  # 单次批量请求的输入 token 预算
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", "8"))  # 单次批量请求的最大文档数
+
+# AI 结果缓存配置
+AI_CACHE_MEMORY_ENTRIES = int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "1024"))  # 进程内 LRU 条数
+
+# LLM 客户端配置（连接池、超时、重试与熔断）
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))  # 最大并发连接数
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))  # 建立连接超时（秒）
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))  # 单次请求超时（秒）
+LLM_TOTAL_TIMEOUT = float(os.getenv("LLM_TOTAL_TIMEOUT", "120"))  # 含重试在内的总超时（秒）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # 退避基数（秒）
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "10"))  # 单次退避上限（秒）
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # 连续失败多少次后熔断
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # 熔断后多久允许试探（秒）
+
 
 # 验证必要的配置
 def validate_config():
@@ -65,22 +170,14 @@ def validate_config():
     if missing_configs:
         raise ValueError(f"缺少必要的配置项: {', '.join(missing_configs)}")
 
+    if RUN_MODE not in ("polling", "webhook"):
+        raise ValueError(f"RUN_MODE 只能是 polling 或 webhook，当前为: {RUN_MODE}")
+
 
 # 启动时验证配置
 validate_config()
 
 
-def set_reminder_time(new_time: str) -> bool:
-    """
-    修改提醒时间，格式需为 HH:MM
-    """
-    if re.match(r'^\d{2}:\d{2}$', new_time):
-        global REMINDER_TIME
-        REMINDER_TIME = new_time
-        return True
-    return False
-
-
 def get_current_time():
     """
     获取当前时区的时间
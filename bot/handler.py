@@ -1,195 +1,274 @@
 import logging
+from datetime import datetime
 
 from telegram import Update
 from telegram.constants import ParseMode
-from telegram.ext import CallbackContext, CommandHandler, MessageHandler, filters
+from telegram.ext import CallbackContext, CallbackQueryHandler
 
-from bot.config import set_reminder_time
+from bot.commands import Int, Text, Time, get_command_registry
+from bot.config import ADMIN_USER_IDS, PROFILE_DEFAULT_SECONDS, PROFILE_MAX_SECONDS
+from bot.keyboards import page_keyboard, parse_page_callback
+from bot.messaging import edit_chunks, reply_chunks
+from modules.reminder import service as reminder_service
 # 只保留待办事项业务逻辑接口
 from modules.todo import service as todo_service
+from utils import profiler
 
 
-async def handle_message(update: Update, context: CallbackContext):
-    """处理用户消息的异步函数"""
+async def handle_done(update: Update, context: CallbackContext, todo_id: int):
+    """done <任务编号>：标记任务完成"""
+    message = update.effective_message
+    if await todo_service.complete_todo_async(update.effective_chat.id, todo_id):
+        await message.reply_text(
+            f"✅ 任务 <code>{todo_id}</code> 已标记为完成",
+            parse_mode=ParseMode.HTML
+        )
+    else:
+        await message.reply_text(
+            "❌ 任务不存在或已完成",
+            parse_mode=ParseMode.HTML
+        )
+
+
+async def handle_delete(update: Update, context: CallbackContext, todo_id: int):
+    """delete <任务编号>：删除任务"""
+    message = update.effective_message
+    if await todo_service.delete_todo_async(update.effective_chat.id, todo_id):
+        await message.reply_text(
+            f"🗑 任务 <code>{todo_id}</code> 已删除",
+            parse_mode=ParseMode.HTML
+        )
+    else:
+        await message.reply_text(
+            "❌ 任务不存在",
+            parse_mode=ParseMode.HTML
+        )
+
+
+async def handle_change_time(update: Update, context: CallbackContext, new_time: str):
+    """change time <HH:MM>：修改当前会话的早间提醒时间"""
+    message = update.effective_message
+    try:
+        reminder = await reminder_service.set_reminder_time_async(
+            update.effective_chat.id, reminder_service.MORNING, new_time
+        )
+    except ValueError as e:
+        await message.reply_text(f"❌ {str(e)}", parse_mode=ParseMode.HTML)
+        return
+    await message.reply_text(
+        f"⏰ 提醒时间已更新为 <code>{new_time}</code>（{reminder.timezone}）",
+        parse_mode=ParseMode.HTML
+    )
+
+
+async def handle_change_timezone(update: Update, context: CallbackContext, timezone: str):
+    """change timezone <时区>：修改当前会话所有提醒的时区"""
     message = update.effective_message
     chat_id = update.effective_chat.id
-    text = message.text.strip()
+    try:
+        await reminder_service.ensure_reminders(chat_id, (reminder_service.MORNING, reminder_service.AFTERNOON))
+        await reminder_service.set_timezone_async(chat_id, timezone)
+    except ValueError as e:
+        await message.reply_text(f"❌ {str(e)}", parse_mode=ParseMode.HTML)
+        return
+    await message.reply_text(
+        f"🌍 提醒时区已更新为 <code>{timezone.strip()}</code>",
+        parse_mode=ParseMode.HTML
+    )
 
-    # 判断是否为完成任务的指令
-    if text.lower().startswith("done"):
-        parts = text.split()
-        if len(parts) != 2:
-            await message.reply_text(
-                "格式错误，请使用：done todo_id",
-                parse_mode=ParseMode.HTML
-            )
-            return
-        try:
-            todo_id = int(parts[1])
-            if todo_service.complete_todo(todo_id):
-                await message.reply_text(
-                    f"✅ 任务 <code>{todo_id}</code> 已标记为完成",
-                    parse_mode=ParseMode.HTML
-                )
-            else:
-                await message.reply_text(
-                    "❌ 任务不存在或已完成",
-                    parse_mode=ParseMode.HTML
-                )
-        except ValueError:
-            await message.reply_text(
-                "❌ 任务编号应为数字",
-                parse_mode=ParseMode.HTML
-            )
 
-    # 判断是否为删除任务的指令
-    elif text.lower().startswith("delete"):
-        parts = text.split()
-        if len(parts) != 2:
-            await message.reply_text(
-                "格式错误，请使用：delete todo_id",
-                parse_mode=ParseMode.HTML
-            )
-            return
-        try:
-            todo_id = int(parts[1])
-            if todo_service.delete_todo(todo_id):
-                await message.reply_text(
-                    f"🗑 任务 <code>{todo_id}</code> 已删除",
-                    parse_mode=ParseMode.HTML
-                )
-            else:
-                await message.reply_text(
-                    "❌ 任务不存在",
-                    parse_mode=ParseMode.HTML
-                )
-        except ValueError:
-            await message.reply_text(
-                "❌ 任务编号应为数字",
-                parse_mode=ParseMode.HTML
-            )
+async def handle_reminders_command(update: Update, context: CallbackContext):
+    """处理 /reminders 命令：查看当前会话的提醒设置"""
+    reminders = await reminder_service.get_reminders_async(update.effective_chat.id)
+    if not reminders:
+        await update.effective_message.reply_text("📭 当前会话还没有定时提醒，创建任务后会自动开启")
+        return
+    lines = [f"⏰ <b>定时提醒</b>（{reminders[0].timezone}）"]
+    for reminder in reminders:
+        name = reminder_service.KIND_NAMES.get(reminder.kind, reminder.kind)
+        state = "" if reminder.enabled else "（已停用）"
+        lines.append(f"• {name}：<code>{reminder.local_time.strftime('%H:%M')}</code>{state}")
+    await update.effective_message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
 
-    # 判断是否为修改提醒时间的指令
-    elif text.lower().startswith("change time"):
-        parts = text.split(maxsplit=2)
-        if len(parts) < 3:
-            await message.reply_text(
-                "格式错误，请使用：change time HH:MM",
-                parse_mode=ParseMode.HTML
-            )
-            return
-        new_time = parts[2].strip()
-        if set_reminder_time(new_time):
+
+async def handle_change_endtime(update: Update, context: CallbackContext, todo_id: int, end_time: str):
+    """change endtime <任务编号> <截止时间>：修改任务截止时间"""
+    message = update.effective_message
+    try:
+        if await todo_service.modify_end_time_async(update.effective_chat.id, todo_id, end_time):
             await message.reply_text(
-                f"⏰ 提醒时间已更新为 <code>{new_time}</code>",
+                f"✅ 任务 <code>{todo_id}</code> 截止时间已更新为 <code>{end_time}</code>",
                 parse_mode=ParseMode.HTML
             )
         else:
             await message.reply_text(
-                "❌ 时间格式错误，请使用 HH:MM 格式",
+                "❌ 操作失败",
                 parse_mode=ParseMode.HTML
             )
+    except ValueError as e:
+        await message.reply_text(
+            f"❌ {str(e)}",
+            parse_mode=ParseMode.HTML
+        )
 
-    # 修改任务截止时间的指令
-    elif text.lower().startswith("change endtime"):
-        command_args = text[len("change endtime"):].strip()
-        parts = command_args.split(None, 1)
-        if len(parts) < 2:
-            await message.reply_text(
-                "格式错误，请使用：change endtime todo_id YYYY-MM-DD HH:MM",
-                parse_mode=ParseMode.HTML
-            )
-            return
-        try:
-            todo_id = int(parts[0])
-        except ValueError:
-            await message.reply_text(
-                "❌ 任务编号应为数字",
-                parse_mode=ParseMode.HTML
-            )
-            return
-
-        new_end_time_str = parts[1]
-        try:
-            if todo_service.modify_end_time(todo_id, new_end_time_str):
-                await message.reply_text(
-                    f"✅ 任务 <code>{todo_id}</code> 截止时间已更新为 <code>{new_end_time_str}</code>",
-                    parse_mode=ParseMode.HTML
-                )
-            else:
-                await message.reply_text(
-                    "❌ 操作失败",
-                    parse_mode=ParseMode.HTML
-                )
-        except ValueError as e:
-            await message.reply_text(
-                f"❌ {str(e)}",
-                parse_mode=ParseMode.HTML
-            )
 
-    # 如果不匹配上述指令，则视为任务创建
-    else:
-        try:
-            todo = todo_service.create_todo(text)
-            response = (
-                f"✅ 任务创建成功！\n"
-                f"📌 任务编号：<code>{todo.todo_id}</code>\n"
-                f"📝 任务内容：{todo.todo_name}\n"
-                f"⏱ 创建时间：{todo.create_time.strftime('%Y-%m-%d %H:%M')}"
-            )
-            if todo.end_time:
-                response += f"\n⏰ 截止时间：{todo.end_time.strftime('%Y-%m-%d %H:%M')}"
+async def handle_create_todo(update: Update, context: CallbackContext, text: str):
+    """不匹配任何指令的文本视为任务创建"""
+    message = update.effective_message
+    try:
+        todo = await todo_service.create_todo_async(update.effective_chat.id, text)
+        await reminder_service.ensure_reminders(
+            update.effective_chat.id, (reminder_service.MORNING, reminder_service.AFTERNOON)
+        )
+        response = (
+            f"✅ 任务创建成功！\n"
+            f"📌 任务编号：<code>{todo.todo_id}</code>\n"
+            f"📝 任务内容：{todo.todo_name}\n"
+            f"⏱ 创建时间：{todo_service.to_local(todo.create_time).strftime('%Y-%m-%d %H:%M')}"
+        )
+        if todo.end_time:
+            response += f"\n⏰ 截止时间：{todo_service.to_local(todo.end_time).strftime('%Y-%m-%d %H:%M')}"
 
-            await message.reply_text(
-                response,
-                parse_mode=ParseMode.HTML
-            )
-        except Exception as e:
-            await message.reply_text(
-                f"❌ {str(e)}",
-                parse_mode=ParseMode.HTML
-            )
+        await message.reply_text(
+            response,
+            parse_mode=ParseMode.HTML
+        )
+    except Exception as e:
+        await message.reply_text(
+            f"❌ {str(e)}",
+            parse_mode=ParseMode.HTML
+        )
+
+
+def _todo_page_prefix(pending_only: bool) -> str:
+    return "todos:pending" if pending_only else "todos:all"
+
+
+async def _render_todo_page(chat_id: int, pending_only: bool, cursor: str = None, forward: bool = True):
+    """获取会话中的一页待办事项，返回 (消息列表, 翻页按钮, 本页条数)"""
+    page = await todo_service.get_todo_page_async(chat_id, pending_only, cursor, forward)
+    list_type = "pending" if pending_only else "all"
+    markup = page_keyboard(
+        _todo_page_prefix(pending_only),
+        page,
+        lambda todo: todo_service.encode_todo_cursor(todo, pending_only)
+    )
+    return todo_service.format_todo_list(page.items, list_type), markup, len(page.items)
 
 
 async def handle_demo_command(update: Update, context: CallbackContext):
-    """处理 /demo 命令"""
+    """处理 /demo 命令：分页显示所有待办事项"""
     if not update or not update.effective_message:
         logging.error("无效的更新对象或消息对象")
         return
 
     logging.info("执行 /demo 命令")
-    todos = todo_service.get_all_todos()
-    logging.info(f"获取到 {len(todos)} 个待办事项")
-    formatted_list = todo_service.format_todo_list(todos, "all")
+    messages, markup, count = await _render_todo_page(update.effective_chat.id, pending_only=False)
+    logging.info(f"获取到 {count} 个待办事项")
 
-    await update.effective_message.reply_text(
-        formatted_list,
-        parse_mode=ParseMode.HTML
-    )
+    await reply_chunks(update.effective_message, messages, reply_markup=markup)
 
 
 async def handle_demoz_command(update: Update, context: CallbackContext):
-    """处理 /demoz 命令"""
+    """处理 /demoz 命令：分页显示未完成待办事项"""
     if not update or not update.effective_message:
         logging.error("无效的更新对象或消息对象")
         return
 
     logging.info("执行 /demoz 命令")
-    todos = todo_service.get_pending_todos()
-    logging.info(f"获取到 {len(todos)} 个未完成待办事项")
-    formatted_list = todo_service.format_todo_list(todos, "pending")
+    messages, markup, count = await _render_todo_page(update.effective_chat.id, pending_only=True)
+    logging.info(f"获取到 {count} 个未完成待办事项")
 
-    await update.effective_message.reply_text(
-        formatted_list,
-        parse_mode=ParseMode.HTML
+    await reply_chunks(update.effective_message, messages, reply_markup=markup)
+
+
+async def handle_todo_page_callback(update: Update, context: CallbackContext):
+    """处理 /demo、/demoz 列表的翻页按钮"""
+    query = update.callback_query
+    try:
+        prefix, forward, cursor = parse_page_callback(query.data)
+        pending_only = prefix == _todo_page_prefix(True)
+        messages, markup, count = await _render_todo_page(update.effective_chat.id, pending_only, cursor, forward)
+    except ValueError as e:
+        await query.answer(f"❌ {str(e)}")
+        return
+
+    if not count:
+        await query.answer("没有更多待办事项了")
+        return
+    await query.answer()
+    await edit_chunks(query, messages, reply_markup=markup)
+
+
+async def handle_resync_command(update: Update, context: CallbackContext):
+    """处理 /resync 命令：从数据库重新加载待办缓存"""
+    if not update or not update.effective_message:
+        logging.error("无效的更新对象或消息对象")
+        return
+
+    try:
+        count = await todo_service.resync_todos_async(update.effective_chat.id)
+        await update.effective_message.reply_text(f"✅ 待办缓存已重新加载，共 {count} 条")
+    except Exception as e:
+        logging.error(f"重新加载待办缓存失败: {e}")
+        await update.effective_message.reply_text(f"❌ 重新加载待办缓存失败: {str(e)}")
+
+
+async def _send_profile(message, seconds: int):
+    try:
+        result = await profiler.profile(seconds)
+    except ValueError as e:
+        await message.reply_text(f"❌ {str(e)}")
+        return
+    if not result.stacks:
+        await message.reply_text("📭 没有采集到调用栈")
+        return
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed.txt"
+    await message.reply_document(
+        document=result.collapsed().encode("utf-8"),
+        filename=filename,
+        caption=(f"🔬 采样 {result.duration:.1f} 秒，共 {result.samples} 次、{len(result.stacks)} 个调用栈\n"
+                 f"用 flamegraph.pl 或 speedscope 打开即可查看火焰图")
     )
 
 
+async def handle_profile_command(update: Update, context: CallbackContext, seconds: int = None):
+    """处理 /profile [秒数] 命令：采样分析整个进程，完成后以文件形式发送 collapsed stack"""
+    message = update.effective_message
+    if not update.effective_user or update.effective_user.id not in ADMIN_USER_IDS:
+        await message.reply_text("❌ 仅管理员可以使用该命令（ADMIN_USER_IDS）")
+        return
+    seconds = seconds or PROFILE_DEFAULT_SECONDS
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        await message.reply_text(f"❌ 采样时长应在 1 到 {PROFILE_MAX_SECONDS} 秒之间")
+        return
+    await message.reply_text(f"🔬 开始采样 {seconds} 秒，完成后发送结果文件")
+    # 在后台采样：更新按顺序处理，处理函数本身不能等待整个采样时长
+    context.application.create_task(_send_profile(message, seconds))
+
+
 def register_handlers(application):
-    """注册所有处理器"""
-    # 注册消息处理器
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    """注册所有处理器；文本指令和斜杠命令登记到指令注册表，由 main 统一 install"""
+    registry = get_command_registry()
+
+    # 文本指令
+    registry.register("done", handle_done, Int("todo_id", "任务编号"), description="标记任务完成")
+    registry.register("delete", handle_delete, Int("todo_id", "任务编号"), description="删除任务")
+    registry.register("change time", handle_change_time, Time("new_time"), description="修改提醒时间")
+    registry.register("change timezone", handle_change_timezone, Text("timezone", "时区"),
+                      description="修改提醒时区")
+    registry.register("change endtime", handle_change_endtime,
+                      Int("todo_id", "任务编号"), Text("end_time", "YYYY-MM-DD HH:MM"),
+                      description="修改任务截止时间")
+    # 其余文本创建任务
+    registry.set_fallback(handle_create_todo)
+
+    # 斜杠命令
+    registry.register("/demo", handle_demo_command, description="查看所有待办事项")
+    registry.register("/demoz", handle_demoz_command, description="查看未完成待办事项")
+    registry.register("/resync", handle_resync_command, description="重新加载待办缓存")
+    registry.register("/reminders", handle_reminders_command, description="查看定时提醒设置")
+    registry.register("/profile", handle_profile_command, Int("seconds", "秒数", optional=True),
+                      description="采样分析性能（仅管理员）")
 
-    # 注册命令处理器
-    application.add_handler(CommandHandler("demo", handle_demo_command))
-    application.add_handler(CommandHandler("demoz", handle_demoz_command))
+    application.add_handler(CallbackQueryHandler(handle_todo_page_callback, pattern=r"^todos:"))
@@ -0,0 +1,40 @@
+from typing import Callable, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from modules.pagination import Page
+
+# Telegram 限制 callback_data 最长 64 字节
+MAX_CALLBACK_DATA = 64
+
+
+def page_keyboard(prefix: str, page: Page, cursor_of: Callable[[object], str]) -> Optional[InlineKeyboardMarkup]:
+    """
+    生成“上一页 / 下一页”按钮，回调数据为 “前缀:p|n:游标”，
+    游标取当前页首条（上一页）或末条（下一页）。只有一页时返回 None
+    """
+    if not page.items:
+        return None
+    buttons = []
+    if page.has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"{prefix}:p:{cursor_of(page.items[0])}"))
+    if page.has_next:
+        buttons.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"{prefix}:n:{cursor_of(page.items[-1])}"))
+    for button in buttons:
+        if len(button.callback_data.encode()) > MAX_CALLBACK_DATA:
+            raise ValueError(f"回调数据过长: {button.callback_data}")
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+def parse_page_callback(data: str):
+    """
+    解析 page_keyboard 生成的回调数据，返回 (前缀, 是否下一页, 游标)
+
+    Raises:
+        ValueError: 回调数据格式错误
+    """
+    parts = data.split(':')
+    # 前缀本身由两段组成，例如 todos:all、links:unread
+    if len(parts) < 4 or parts[2] not in ('p', 'n'):
+        raise ValueError("无效的分页参数")
+    return f"{parts[0]}:{parts[1]}", parts[2] == 'n', ':'.join(parts[3:])
@@ -0,0 +1,73 @@
+import logging
+from functools import partial
+
+from telegram.ext import Application
+
+from bot.config import CHAT_ID, DEADLINE_NOTIFY, METRICS_PORT
+from bot.metrics_server import MetricsServer
+from bot.scheduler import send_deadline_notices
+from modules.database import close_async_engine
+from modules.link.jobs import EnrichmentWorkerPool, get_enrichment_queue
+from modules.link.llm_client import close_llm_client
+from modules.link.page_cache import close_page_cache, get_page_cache
+from modules.link.service import LinkService
+from modules.reminder import service as reminder_service
+from modules.todo.deadlines import get_deadline_timer
+from modules.todo.repository import get_todo_repository
+from utils.metrics import register_stats
+
+
+async def post_init(application: Application):
+    """应用启动后预热缓存并启动后台任务"""
+    # 待办缓存：/demo、/demoz 和提醒直接从内存读取
+    await get_todo_repository().warm()
+
+    # 配置的 CHAT_ID 默认开启全部提醒；其他会话在首次创建待办或保存链接时开启
+    if CHAT_ID:
+        await reminder_service.ensure_reminders(int(CHAT_ID), reminder_service.KINDS)
+
+    # 截止提醒定时器：单个待办临近截止和过期时通知
+    if DEADLINE_NOTIFY:
+        get_deadline_timer().start(partial(send_deadline_notices, application.bot))
+
+    # 链接补全 worker：处理保存链接后入队的标题/正文/摘要任务
+    pool = EnrichmentWorkerPool(get_enrichment_queue(), LinkService().process_job)
+    pool.start()
+    application.bot_data['enrichment_pool'] = pool
+
+    # 指标：已有 stats() 的组件在导出时读取当前值
+    if application.bot.rate_limiter is not None:
+        register_stats("rate_limiter", "出站消息限流器", application.bot.rate_limiter.stats)
+    register_stats("todo_cache", "待办缓存", get_todo_repository().stats)
+    register_stats("deadline_timer", "截止提醒定时器", get_deadline_timer().stats)
+    register_stats("page_cache", "网页缓存", get_page_cache().stats)
+    if METRICS_PORT:
+        server = MetricsServer()
+        try:
+            await server.start()
+            application.bot_data['metrics_server'] = server
+        except OSError as e:
+            logging.error(f"启动指标服务失败: {e}")
+
+
+async def post_shutdown(application: Application):
+    """应用退出时停止后台任务并释放共享资源"""
+    pool = application.bot_data.get('enrichment_pool')
+    if pool:
+        await pool.stop()
+    await get_deadline_timer().stop()
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server:
+        await metrics_server.stop()
+    try:
+        await close_llm_client()
+    except Exception as e:
+        logging.error(f"关闭 LLM 客户端失败: {e}")
+    try:
+        await close_page_cache()
+    except Exception as e:
+        logging.error(f"关闭网页抓取会话失败: {e}")
+    try:
+        await close_async_engine()
+    except Exception as e:
+        logging.error(f"关闭数据库连接池失败: {e}")
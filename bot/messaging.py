@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import List, Sequence, Set, Tuple
+
+from telegram import Bot, CallbackQuery, Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+
+async def send_chunks(bot: Bot, chat_id: int, chunks: List[str], reply_markup=None, **kwargs):
+    """依次发送渲染好的多条 HTML 消息，按钮只挂在最后一条上"""
+    for index, chunk in enumerate(chunks):
+        last = index == len(chunks) - 1
+        await bot.send_message(
+            chat_id=chat_id,
+            text=chunk,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup if last else None,
+            **kwargs
+        )
+
+
+async def send_bulk(bot: Bot, outbox: Sequence[Tuple[int, List[str]]], concurrency: int, **kwargs) -> Set[int]:
+    """
+    批量发送：outbox 为 [(会话ID, 消息列表)]，多个会话并发发送（最多 concurrency 个），
+    同一会话内按顺序发送；节奏由限流器控制。
+    单个会话失败不影响其他会话，返回已屏蔽机器人（Forbidden）的会话ID
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    blocked: Set[int] = set()
+
+    async def deliver(chat_id: int, chunks: List[str]):
+        async with semaphore:
+            try:
+                await send_chunks(bot, chat_id, chunks, **kwargs)
+            except Forbidden as e:
+                logging.warning(f"会话 {chat_id} 已屏蔽机器人或不可用: {e}")
+                blocked.add(chat_id)
+            except TelegramError as e:
+                logging.error(f"向会话 {chat_id} 发送消息失败: {e}")
+
+    await asyncio.gather(*(deliver(chat_id, chunks) for chat_id, chunks in outbox if chunks))
+    return blocked
+
+
+async def reply_chunks(message: Message, chunks: List[str], reply_markup=None, **kwargs):
+    """回复多条 HTML 消息，按钮只挂在最后一条上"""
+    for index, chunk in enumerate(chunks):
+        last = index == len(chunks) - 1
+        await message.reply_text(
+            chunk,
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup if last else None,
+            **kwargs
+        )
+
+
+async def edit_chunks(query: CallbackQuery, chunks: List[str], reply_markup=None):
+    """
+    用第一条替换按钮所在的消息，其余作为新消息发送；按钮挂在最后一条上
+    """
+    try:
+        await query.edit_message_text(
+            chunks[0],
+            parse_mode=ParseMode.HTML,
+            reply_markup=reply_markup if len(chunks) == 1 else None
+        )
+    except BadRequest as e:
+        # 内容没有变化时 Telegram 会拒绝编辑
+        if "not modified" not in str(e).lower():
+            raise
+    if len(chunks) > 1:
+        await reply_chunks(query.message, chunks[1:], reply_markup=reply_markup)
@@ -0,0 +1,44 @@
+"""
+指标服务：本地 aiohttp 服务，GET /metrics 返回 Prometheus 文本格式的指标。
+
+默认只监听 127.0.0.1，与 webhook 服务分开，不对外暴露：
+
+    curl http://127.0.0.1:9464/metrics
+"""
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from bot.config import METRICS_LISTEN, METRICS_PORT
+from utils.metrics import MetricsRegistry, get_metrics_registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """导出进程内指标的 HTTP 服务"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, listen: str = METRICS_LISTEN,
+                 port: int = METRICS_PORT):
+        self.registry = registry or get_metrics_registry()
+        self.listen = listen
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/metrics", self.handle_metrics)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logging.info(f"Metrics server listening on {self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
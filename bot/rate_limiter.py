@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from bot.config import (
+    SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_GROUP_PER_MINUTE, SEND_MAX_RETRIES
+)
+
+# 优先级通道：交互回复优先，定时推送等批量消息让路
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# 批量发送时传给 bot 方法的 rate_limit_args，例如 send_message(..., rate_limit_args=BULK_SEND)
+BULK_SEND = {'priority': BULK}
+
+# 闲置的会话令牌桶超过该数量时清理
+_MAX_IDLE_BUCKETS = 10000
+
+
+class TokenBucket:
+    """令牌桶：按 rate 个/秒补充，最多积攒 capacity 个"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """距离有一个可用令牌还需等待的秒数，0 表示现在就可用"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    """
+    出站消息限流，所有经过 Application.bot 的请求都会经过这里：
+
+    - 全局令牌桶（约 30 条/秒）+ 每个会话一个令牌桶（私聊约 1 条/秒，群组约 20 条/分钟）
+    - 两个优先级通道：有交互请求在等全局令牌时，批量请求不会抢占
+    - 收到 RetryAfter 时暂停所有发送，等待结束后自动重发，最多重试 max_retries 次
+
+    不带 chat_id 的请求（例如 answerCallbackQuery）不限流。
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 chat_burst: float = SEND_CHAT_BURST, group_per_minute: float = SEND_GROUP_PER_MINUTE,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_per_minute / 60
+        self.max_retries = max_retries
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._paused_until = 0.0
+        # 正在等待全局令牌的交互请求数
+        self._interactive_waiting = 0
+        self.counters = {'sent': 0, 'throttled': 0, 'retried': 0, 'bulk_yielded': 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        # 配置中的 chat_id 可能是数字字符串
+        if isinstance(chat_id, str) and chat_id.lstrip('-').isdigit():
+            chat_id = int(chat_id)
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_IDLE_BUCKETS:
+                self._prune()
+            # 群组和频道的 chat_id 为负数或 @用户名
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.is_full(now)]:
+            del self._chats[chat_id]
+
+    async def _acquire(self, chat_id: Union[int, str], priority: str):
+        """等待会话和全局令牌都可用后各取一个"""
+        interactive = priority != BULK
+        waiting_global = False
+        throttled = False
+        try:
+            while True:
+                now = time.monotonic()
+                delay = self._paused_until - now
+                if delay <= 0:
+                    delay = self._chat_bucket(chat_id).delay(now)
+                if delay <= 0:
+                    if interactive and not waiting_global:
+                        waiting_global = True
+                        self._interactive_waiting += 1
+                    if not interactive and self._interactive_waiting:
+                        # 交互请求优先：让出全局令牌
+                        self.counters['bulk_yielded'] += 1
+                        delay = 1 / self.global_bucket.rate
+                    else:
+                        delay = self.global_bucket.delay(now)
+                        if delay <= 0:
+                            self._chat_bucket(chat_id).consume()
+                            self.global_bucket.consume()
+                            return
+                throttled = True
+                await asyncio.sleep(delay)
+        finally:
+            if waiting_global:
+                self._interactive_waiting -= 1
+            if throttled:
+                self.counters['throttled'] += 1
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get('chat_id')
+        priority = (rate_limit_args or {}).get('priority', INTERACTIVE)
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                retry_after = float(e.retry_after)
+                # 触发限流时所有发送一起暂停
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                self.counters['retried'] += 1
+                logging.warning(f"{endpoint} 触发 Telegram 限流，{retry_after:.0f}s 后第 {attempt} 次重发")
+                if chat_id is None:
+                    await asyncio.sleep(retry_after)
+                continue
+            self.counters['sent'] += 1
+            return result
+
+    def stats(self) -> dict:
+        return {**self.counters, 'chats': len(self._chats), 'interactive_waiting': self._interactive_waiting}
@@ -1,201 +1,238 @@
+import asyncio
 import logging
+from collections import defaultdict
 from datetime import datetime
+from typing import Dict, List, Tuple
 
+import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
-from telegram.ext import ContextTypes
-
-from bot.config import get_current_time, TIMEZONE
+from telegram.error import Forbidden, TelegramError
+
+from bot.config import (
+    TIMEZONE,
+    DIGEST_ITEM_COUNT, DIGEST_CONCURRENCY, DIGEST_ITEM_TIMEOUT, DIGEST_BATCH_SIZE,
+    REMINDER_BATCH_SIZE, REMINDER_MAX_LATENESS, REMINDER_SEND_CONCURRENCY, REMINDER_DIGEST_CONCURRENCY,
+    DEADLINE_WARNING_LEAD
+)
+from bot.messaging import send_bulk, send_chunks
+from bot.rate_limiter import BULK_SEND
 from modules.link.service import LinkService
+from modules.reminder import service as reminder_service
+from modules.reminder.dao import AsyncReminderDAO
+from modules.reminder.models import Reminder
 from modules.todo import service as todo_service
+from modules.todo.deadlines import DUE_SOON, OVERDUE
+from modules.todo.models import Todo
+from utils.metrics import SCHEDULER_JOB_SECONDS, register_stats
+from utils.render import render_digest_item, render_digest_overview, render_due_sections
 
 
-async def send_reminder(bot, chat_id):
-    """
-    发送早间提醒，只包含今日截止的待办事项
-    """
-    current_time = get_current_time()
-    today_tasks = todo_service.get_today_todos()
+# 截止窗口分组的标题、标记和为空时的文本；已过期分组为空时不显示
+_DUE_SECTIONS = {
+    todo_service.TODAY: ("📅 <b>今日截止事项</b>", "❗️", "✨ 今天没有截止的任务"),
+    todo_service.TOMORROW: ("📆 <b>明日截止事项</b>", "⚠️", "✨ 明天没有截止的任务"),
+    todo_service.OVERDUE: ("⏰ <b>已过期未完成</b>", "‼️", None),
+}
 
-    message = "🌅 <b>早间提醒</b>\n\n"
-    message += "📅 <b>今日截止事项</b>\n"
+# 待办提醒的标题和覆盖的天数：早间提醒只看今天，下午提醒看今天和明天
+_TODO_REMINDERS = {
+    reminder_service.MORNING: ("🌅 <b>早间提醒</b>", 1),
+    reminder_service.AFTERNOON: ("🕒 <b>下午提醒</b>", 2),
+}
 
-    if today_tasks:
-        for todo in today_tasks:
-            message += f"❗️ <code>{todo.todo_id}</code>. {todo.todo_name}\n"
-    else:
-        message += "✨ 今天没有截止的任务"
 
-    try:
-        await bot.send_message(
-            chat_id=chat_id,
-            text=message,
-            parse_mode=ParseMode.HTML
-        )
-    except TelegramError as e:
-        logging.error("发送提醒失败: %s", e)
+def render_todo_reminder(title: str, days: int, chat_id: int, buckets) -> List[str]:
+    """把 get_due_buckets 的结果渲染为一组消息：今日、明日（days=2 时）、已过期依次排列"""
+    labels = [todo_service.TODAY, todo_service.TOMORROW][:days] + [todo_service.OVERDUE]
+    sections = []
+    for label in labels:
+        section, marker, empty_text = _DUE_SECTIONS[label]
+        sections.append((section, buckets.get((chat_id, label), []), marker, empty_text))
+    return render_due_sections(title, sections)
 
 
-async def send_afternoon_reminder(bot, chat_id):
+async def send_unread_links_summary(bot, chat_id):
     """
-    发送下午提醒，分别发送今日和明日截止的待办事项
+    发送未读链接摘要。
+    链接按顺序分组，各组并发抓取、提取正文并合并为一次摘要请求（受信号量和时限限制）；
+    消息按原顺序发送，前面的组完成后立即发送，不等待后面的组；
+    超时或失败的链接使用简短的兜底消息，不影响其他链接。
     """
-    today_tasks = todo_service.get_today_todos()
-    tomorrow_tasks = todo_service.get_tomorrow_todos()
-
-    # 发送今日截止任务
-    today_message = "🕒 <b>下午提醒</b>\n\n"
-    today_message += "📅 <b>今日截止事项</b>\n"
-    if today_tasks:
-        for todo in today_tasks:
-            today_message += f"❗️ <code>{todo.todo_id}</code>. {todo.todo_name}\n"
-    else:
-        today_message += "✨ 今天没有截止的任务"
-
-    # 发送明日截止任务
-    tomorrow_message = "🕒 <b>下午提醒</b>\n\n"
-    tomorrow_message += "📆 <b>明日截止事项</b>\n"
-    if tomorrow_tasks:
-        for todo in tomorrow_tasks:
-            tomorrow_message += f"⚠️ <code>{todo.todo_id}</code>. {todo.todo_name}\n"
-    else:
-        tomorrow_message += "✨ 明天没有截止的任务"
+    service = LinkService()
+    unread_links = await service.get_unread_links_async(chat_id, limit=DIGEST_ITEM_COUNT)
 
-    try:
-        # 分别发送两条消息
+    if not unread_links:
         await bot.send_message(
             chat_id=chat_id,
-            text=today_message,
-            parse_mode=ParseMode.HTML
+            text="📚 今天没有未读的链接",
+            parse_mode=ParseMode.HTML,
+            rate_limit_args=BULK_SEND
         )
+        return
+
+    # 先启动摘要生成，再发送总览消息
+    groups = service.start_summaries(unread_links, DIGEST_CONCURRENCY, DIGEST_ITEM_TIMEOUT, DIGEST_BATCH_SIZE)
+
+    try:
+        # 发送总览消息
+        await send_chunks(bot, chat_id, render_digest_overview(unread_links),
+                          disable_web_page_preview=True, rate_limit_args=BULK_SEND)
+
+        # 按原顺序逐组等待，每组完成后立即发送该组的摘要
+        for group, task in groups:
+            try:
+                summaries = await task
+            except Exception as e:
+                logging.error(f"批量生成链接摘要失败: {str(e)}")
+                summaries = {}
+            for link in group:
+                await _send_digest_item(bot, chat_id, link, summaries.get(link.id))
+    finally:
+        for _, task in groups:
+            task.cancel()
+
+
+async def _send_digest_item(bot, chat_id, link, summary):
+    summary = summary or "⏱ 摘要暂时无法生成，请直接访问原文。"
+    try:
+        await send_chunks(bot, chat_id, render_digest_item(link, summary),
+                          disable_web_page_preview=True, rate_limit_args=BULK_SEND)
+    except TelegramError as te:
+        logging.error(f"发送链接摘要消息失败: {te}")
+        # 尝试发送不带格式的消息
         await bot.send_message(
             chat_id=chat_id,
-            text=tomorrow_message,
-            parse_mode=ParseMode.HTML
+            text=f"链接: {link.url}\n\n摘要生成失败，请直接访问原文。",
+            disable_web_page_preview=True,
+            rate_limit_args=BULK_SEND
         )
-    except TelegramError as e:
-        logging.error("发送下午提醒失败: %s", e)
 
 
-async def send_unread_links_summary(bot, chat_id):
-    """
-    发送未读链接摘要
+async def send_deadline_notices(bot, grouped: Dict[int, Dict[str, List[Todo]]]):
+    """发送截止提醒定时器的通知：同一时刻触发的同一会话的事项合并为一条"""
+    outbox = []
+    for chat_id, kinds in grouped.items():
+        messages = render_due_sections("⏰ <b>截止提醒</b>", [
+            (f"⏳ <b>{int(DEADLINE_WARNING_LEAD // 60)} 分钟内截止</b>", kinds.get(DUE_SOON), "❗️", None),
+            ("⚠️ <b>已到截止时间</b>", kinds.get(OVERDUE), "⚠️", None),
+        ])
+        outbox.append((chat_id, messages))
+    await send_bulk(bot, outbox, REMINDER_SEND_CONCURRENCY, rate_limit_args=BULK_SEND)
+
+
+class ReminderEngine:
     """
-    service = LinkService()
-    # 获取5条未读链接
-    unread_links = service.get_unread_links(limit=5)
-    
-    if not unread_links:
-        await bot.send_message(
-            chat_id=chat_id,
-            text="📚 今天没有未读的链接",
-            parse_mode=ParseMode.HTML
-        )
-        return
+    定时提醒引擎：每分钟执行一次 tick，不为每个会话单独注册定时任务。
 
-    # 发送总览消息
-    overview = "📚 <b>未读链接摘要</b>\n\n"
-    for i, link in enumerate(unread_links, 1):
-        overview += f"{i}. <a href='{link.url}'>{link.title or '无标题'}</a>\n"
-    
-    await bot.send_message(
-        chat_id=chat_id,
-        text=overview,
-        parse_mode=ParseMode.HTML,
-        disable_web_page_preview=True
-    )
+    1. 一次索引查询领取所有 next_fire_at 已到的提醒，并在同一事务中推进到下一次触发时间
+    2. 早间/下午提醒按会话各自时区计算今日、明日和已过期窗口，一次批量查询取出所有会话的待办
+    3. 渲染后交给 send_bulk 并发发送，节奏由限流器的批量通道控制
+
+    提醒领取后即推进，发送失败不会重发（至多一次）；停机超过 REMINDER_MAX_LATENESS 错过的提醒直接跳过。
+    """
 
-    # 为每个链接生成并发送摘要
-    for link in unread_links:
+    def __init__(self, bot):
+        self.bot = bot
+        self.counters = {'ticks': 0, 'fired': 0, 'skipped_late': 0, 'blocked_chats': 0}
+
+    async def tick(self):
+        now = datetime.now(pytz.utc)
+        self.counters['ticks'] += 1
+        while True:
+            claimed = await AsyncReminderDAO.claim_due(
+                now, REMINDER_BATCH_SIZE, lambda reminder: reminder_service.advance(reminder, now)
+            )
+            if claimed:
+                await self.fire(claimed, now)
+            if len(claimed) < REMINDER_BATCH_SIZE:
+                break
+
+    async def fire(self, claimed: List[Tuple[Reminder, datetime]], now: datetime):
+        by_kind: Dict[str, List[Tuple[Reminder, datetime]]] = defaultdict(list)
+        for reminder, scheduled_at in claimed:
+            if (now - scheduled_at).total_seconds() > REMINDER_MAX_LATENESS:
+                self.counters['skipped_late'] += 1
+                logging.warning(f"跳过过期的提醒: {reminder}")
+                continue
+            by_kind[reminder.kind].append((reminder, scheduled_at))
+
+        todo_items = by_kind.get(reminder_service.MORNING, []) + by_kind.get(reminder_service.AFTERNOON, [])
+        outbox = await self._todo_outbox(todo_items) if todo_items else []
+
+        blocked = await send_bulk(self.bot, outbox, REMINDER_SEND_CONCURRENCY, rate_limit_args=BULK_SEND)
+        if by_kind.get(reminder_service.DIGEST):
+            blocked |= await self._send_digests(by_kind[reminder_service.DIGEST])
+
+        self.counters['fired'] += len(outbox) + len(by_kind.get(reminder_service.DIGEST, ()))
+        if blocked:
+            self.counters['blocked_chats'] += len(blocked)
+            await reminder_service.disable_chats_async(blocked)
+
+    @staticmethod
+    def _local_date(reminder: Reminder, scheduled_at: datetime):
+        tz = pytz.timezone(reminder.timezone)
+        return tz, scheduled_at.astimezone(tz).date()
+
+    async def _todo_outbox(self, items) -> List[Tuple[int, List[str]]]:
+        """早间和下午提醒：所有会话的今日、明日、已过期窗口合并为一次查询，每个会话一组消息"""
+        windows = {}
+        plans = []
+        for reminder, scheduled_at in items:
+            title, days = _TODO_REMINDERS[reminder.kind]
+            tz, today = self._local_date(reminder, scheduled_at)
+            for window in todo_service.due_windows(reminder.chat_id, today, days, tz):
+                # 同一会话同时触发早间和下午提醒时，相同的窗口只查一次
+                windows.setdefault(window[:2], window)
+            plans.append((reminder.chat_id, title, days))
+        buckets = await todo_service.get_due_buckets_async(windows.values())
+        return [(chat_id, render_todo_reminder(title, days, chat_id, buckets)) for chat_id, title, days in plans]
+
+    async def _send_digests(self, items) -> set:
+        """未读链接摘要需要抓取网页和调用 LLM，按会话限制并发"""
+        semaphore = asyncio.Semaphore(max(1, REMINDER_DIGEST_CONCURRENCY))
+        blocked = set()
+
+        async def digest(chat_id: int):
+            async with semaphore:
+                try:
+                    with SCHEDULER_JOB_SECONDS.track(job="digest"):
+                        await send_unread_links_summary(self.bot, chat_id)
+                except Forbidden as e:
+                    logging.warning(f"会话 {chat_id} 已屏蔽机器人或不可用: {e}")
+                    blocked.add(chat_id)
+                except Exception as e:
+                    logging.error(f"发送会话 {chat_id} 的未读链接摘要失败: {e}")
+
+        await asyncio.gather(*(digest(reminder.chat_id) for reminder, _ in items))
+        return blocked
+
+    async def run_once(self):
+        """调度器入口，单次失败只记录日志，下一分钟继续"""
         try:
-            summary = await service.generate_summary(link.url)
-            message = f"🔍 <b>{link.title or '无标题'}</b>\n\n"
-            message += f"🌐 <a href='{link.url}'>原文链接</a>\n\n"
-            message += f"📝 <b>摘要</b>:\n{summary}"
-            
-            try:  # 添加单独的消息发送错误处理
-                await bot.send_message(
-                    chat_id=chat_id,
-                    text=message,
-                    parse_mode=ParseMode.HTML,
-                    disable_web_page_preview=True
-                )
-            except TelegramError as te:
-                logging.error(f"发送链接摘要消息失败: {te}")
-                # 尝试发送不带格式的消息
-                await bot.send_message(
-                    chat_id=chat_id,
-                    text=f"链接: {link.url}\n\n摘要生成失败，请直接访问原文。",
-                    disable_web_page_preview=True
-                )
+            with SCHEDULER_JOB_SECONDS.track(job="reminders"):
+                await self.tick()
         except Exception as e:
-            logging.error(f"生成链接摘要失败 (URL: {link.url}): {str(e)}")
-            continue
+            logging.error(f"执行定时提醒失败: {e}")
 
+    def stats(self) -> dict:
+        return dict(self.counters)
 
-def start_scheduler(bot, chat_id, reminder_time: str):
+
+def start_scheduler(bot) -> AsyncIOScheduler:
     """
-    启动定时任务调度器，设置每日早晚两次提醒。
+    启动定时任务调度器：只注册一个每分钟执行的任务，由 ReminderEngine 处理所有会话的提醒
     """
+    engine = ReminderEngine(bot)
+    register_stats("reminder_engine", "定时提醒引擎", engine.stats)
     scheduler = AsyncIOScheduler(timezone=TIMEZONE)
-    # 早间提醒
-    hour, minute = map(int, reminder_time.split(":"))
-    scheduler.add_job(
-        send_reminder,
-        'cron',
-        hour=hour,
-        minute=minute,
-        args=[bot, chat_id],
-        timezone=TIMEZONE
-    )
-    # 添加下午 16:00 提醒
-    scheduler.add_job(
-        send_afternoon_reminder,
-        'cron',
-        hour=16,
-        minute=0,
-        args=[bot, chat_id],
-        timezone=TIMEZONE
-    )
-    # 添加未读链接摘要推送
     scheduler.add_job(
-        send_unread_links_summary,
+        engine.run_once,
         'cron',
-        hour=14,
-        minute=50,
-        args=[bot, chat_id],
-        timezone=TIMEZONE
+        second=0,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=30
     )
     scheduler.start()
     return scheduler
-
-
-async def send_daily_reminder(context: ContextTypes.DEFAULT_TYPE):
-    """发送每日未读链接提醒"""
-    job = context.job
-    user_id = job.data['user_id']
-
-    service = LinkService()
-    reminder = service.get_unread_summary(user_id)
-
-    await context.bot.send_message(
-        chat_id=user_id,
-        text=f"📅 每日提醒\n{reminder}"
-    )
-
-
-def schedule_daily_reminder(application, user_id: int, time: str = "10:00"):
-    """设置每日提醒定时任务"""
-    job_queue = application.job_queue
-
-    # 解析时间
-    hour, minute = map(int, time.split(':'))
-
-    # 设置每日定时任务
-    job_queue.run_daily(
-        send_daily_reminder,
-        time=datetime.time(hour=hour, minute=minute),
-        days=(0, 1, 2, 3, 4, 5, 6),  # 每天
-        data={'user_id': user_id}
-    )
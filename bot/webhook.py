@@ -0,0 +1,156 @@
+"""
+Webhook 运行模式：内置 aiohttp 服务接收 Telegram 推送的更新，替代长轮询。
+
+- POST /<WEBHOOK_PATH>：校验 X-Telegram-Bot-Api-Secret-Token 后把更新放入 application.update_queue
+- GET /healthz：健康检查，返回运行状态和更新队列积压
+
+本地调试时无需连接 Telegram，直接把录制的更新 JSON POST 到监听地址即可：
+
+    curl -X POST http://127.0.0.1:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET_TOKEN" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+import asyncio
+import hmac
+import json
+import logging
+import re
+import signal
+import time
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from bot.config import WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN
+from utils.metrics import register_stats
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Telegram 对 secret_token 的要求：1-256 个字符，只能包含字母、数字、_ 和 -
+_SECRET_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
+
+
+class WebhookServer:
+    """接收 Telegram webhook 推送并交给 Application 处理的 HTTP 服务"""
+
+    def __init__(self, application: Application, listen: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, secret_token: Optional[str] = WEBHOOK_SECRET_TOKEN):
+        if secret_token and not _SECRET_PATTERN.match(secret_token):
+            raise ValueError("WEBHOOK_SECRET_TOKEN 只能包含字母、数字、_ 和 -，长度 1-256")
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token
+        self.started_at = time.monotonic()
+        self.last_update_at: Optional[float] = None
+        self.counters = {'accepted': 0, 'rejected': 0, 'invalid': 0}
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self.handle_update)
+        self.app.router.add_get("/healthz", self.handle_health)
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        received = request.headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(received.encode(), self.secret_token.encode())
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """接收一条更新；放入队列后立即返回，处理在 Application 中异步进行"""
+        if not self._authorized(request):
+            self.counters['rejected'] += 1
+            logging.warning(f"拒绝来自 {request.remote} 的 webhook 请求：secret token 不匹配")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            # 合法 JSON 但不是对象（[]、1 ……）时 de_json 会抛出意料外的异常，返回 500 会让 Telegram 反复重试
+            if not isinstance(data, dict):
+                raise ValueError(f"更新应为 JSON 对象，收到 {type(data).__name__}")
+            update = Update.de_json(data, self.application.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError, AttributeError) as e:
+            self.counters['invalid'] += 1
+            logging.warning(f"无法解析 webhook 更新: {e}")
+            return web.Response(status=400)
+        if update is None:
+            self.counters['invalid'] += 1
+            return web.Response(status=400)
+
+        await self.application.update_queue.put(update)
+        self.counters['accepted'] += 1
+        self.last_update_at = time.monotonic()
+        return web.Response(status=200)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """健康检查：Application 未运行时返回 503"""
+        now = time.monotonic()
+        running = self.application.running
+        body = {
+            'status': 'ok' if running else 'stopped',
+            'uptime': round(now - self.started_at, 1),
+            'update_queue': self.application.update_queue.qsize(),
+            'last_update_age': round(now - self.last_update_at, 1) if self.last_update_at else None,
+            **self.counters,
+        }
+        return web.json_response(body, status=200 if running else 503)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logging.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run_webhook(application: Application, server: Optional[WebhookServer] = None):
+    """
+    以 webhook 模式运行，直到收到 SIGINT/SIGTERM。
+    配置了 WEBHOOK_URL 时向 Telegram 注册 webhook；未配置时只启动本地服务（用于反向代理已注册或本地调试）。
+    生命周期与 run_polling 一致：initialize → post_init → start → stop → post_stop → shutdown → post_shutdown。
+    """
+    server = server or WebhookServer(application)
+    register_stats("webhook", "webhook 服务", lambda: {
+        **server.counters, 'update_queue': application.update_queue.qsize()
+    })
+    if not server.secret_token:
+        logging.warning("WEBHOOK_SECRET_TOKEN 未设置，webhook 将接受任何来源的请求")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + server.path,
+                secret_token=server.secret_token or None,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logging.info(f"Webhook registered: {WEBHOOK_URL.rstrip('/')}{server.path}")
+        await application.start()
+        await server.start()
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -2,9 +2,13 @@
 CREATE TABLE IF NOT EXISTS todos
 (
     todo_id
-    SERIAL
-    PRIMARY
-    KEY,
+    INTEGER
+    NOT
+    NULL,              -- 会话内的待办编号，由 todo_counters 分配
+    chat_id
+    BIGINT
+    NOT
+    NULL,              -- Telegram 会话ID
     todo_name
     TEXT
     NOT
@@ -13,6 +17,11 @@ CREATE TABLE IF NOT EXISTS todos
     BOOLEAN
     DEFAULT
     FALSE,
+    status
+    VARCHAR
+(
+    20
+) DEFAULT 'pending',
     create_time
     TIMESTAMP
     WITH
@@ -24,7 +33,26 @@ CREATE TABLE IF NOT EXISTS todos
     TIMESTAMP
     WITH
     TIME
-    ZONE
+    ZONE,
+    PRIMARY
+    KEY
+(
+    chat_id,
+    todo_id
+)
+);
+
+-- 每个会话已分配的最大待办编号
+CREATE TABLE IF NOT EXISTS todo_counters
+(
+    chat_id
+    BIGINT
+    PRIMARY
+    KEY,
+    last_id
+    INTEGER
+    NOT
+    NULL
 );
 
 -- 创建链接管理表
@@ -64,9 +92,17 @@ CREATE TABLE IF NOT EXISTS links
     ZONE               -- 阅读时间
 );
 
+-- 为待办事项表创建索引（均以会话开头：按截止时间范围查询未完成待办、keyset 分页）
+CREATE INDEX IF NOT EXISTS idx_todos_chat_pending_end_time ON todos(chat_id, end_time) WHERE status = 'pending' AND end_time IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_todos_chat_status_create_time ON todos(chat_id, status, create_time, todo_id);
+
+-- 截止提醒定时器跨会话按截止时间加载
+CREATE INDEX IF NOT EXISTS idx_todos_pending_end_time ON todos(end_time) WHERE status = 'pending' AND end_time IS NOT NULL;
+
 -- 为链接表创建索引
 CREATE INDEX IF NOT EXISTS idx_links_user_id ON links(user_id);
-CREATE INDEX IF NOT EXISTS idx_links_is_read ON links(is_read);
+CREATE INDEX IF NOT EXISTS idx_links_user_unread_created ON links(user_id, created_at DESC, id DESC) WHERE NOT is_read;
 CREATE INDEX IF NOT EXISTS idx_links_created_at ON links(created_at);
 
 -- 为链接表添加注释
@@ -87,4 +123,124 @@ ON COLUMN links.summary IS 'AI生成的摘要';
 COMMENT
 ON COLUMN links.created_at IS '创建时间';
 COMMENT
-ON COLUMN links.read_at IS '阅读时间';
\ No newline at end of file
+ON COLUMN links.read_at IS '阅读时间';
+
+-- 创建 AI 结果缓存表
+CREATE TABLE IF NOT EXISTS ai_results
+(
+    id
+    SERIAL
+    PRIMARY
+    KEY,
+    task
+    VARCHAR
+(
+    20
+) NOT NULL, -- 任务类型：title / summary / explain
+    model VARCHAR
+(
+    100
+) NOT NULL, -- 模型名称
+    prompt_version VARCHAR
+(
+    20
+) NOT NULL, -- 提示词版本
+    content_hash VARCHAR
+(
+    64
+) NOT NULL, -- 提取后内容的 SHA-256
+    url TEXT,   -- 来源链接
+    result TEXT NOT NULL, -- 生成结果
+    created_at TIMESTAMP
+    WITH
+    TIME
+    ZONE
+    DEFAULT
+    CURRENT_TIMESTAMP,
+    CONSTRAINT uq_ai_results_key UNIQUE
+(
+    task,
+    model,
+    prompt_version,
+    content_hash
+)
+    );
+
+CREATE INDEX IF NOT EXISTS idx_ai_results_task_url ON ai_results(task, url);
+
+COMMENT
+ON TABLE ai_results IS 'AI 生成结果缓存表';
+
+
+-- 创建链接后台补全任务表
+CREATE TABLE IF NOT EXISTS link_jobs
+(
+    id
+    SERIAL
+    PRIMARY
+    KEY,
+    link_id
+    INTEGER
+    NOT
+    NULL,              -- 关联的链接ID
+    kind
+    VARCHAR
+(
+    20
+) NOT NULL DEFAULT 'enrich', -- 任务类型
+    status VARCHAR
+(
+    20
+) NOT NULL DEFAULT 'pending', -- pending / running / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0, -- 已尝试次数
+    run_at TIMESTAMP
+    WITH
+    TIME
+    ZONE
+    NOT
+    NULL,              -- 最早可执行时间
+    locked_at
+    TIMESTAMP
+    WITH
+    TIME
+    ZONE,              -- 被领取的时间
+    last_error
+    TEXT,              -- 最近一次失败原因
+    created_at
+    TIMESTAMP
+    WITH
+    TIME
+    ZONE
+    NOT
+    NULL,
+    updated_at
+    TIMESTAMP
+    WITH
+    TIME
+    ZONE
+    NOT
+    NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_link_jobs_status_run_at ON link_jobs(status, run_at);
+
+COMMENT
+ON TABLE link_jobs IS '链接后台补全任务表';
+
+CREATE TABLE IF NOT EXISTS reminders
+(
+    chat_id BIGINT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    local_time TIME NOT NULL,
+    timezone VARCHAR(64) NOT NULL,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    next_fire_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (chat_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reminders_next_fire_at ON reminders(next_fire_at) WHERE enabled;
+
+COMMENT
+ON TABLE reminders IS '会话定时提醒表';
+
+-- 表结构变更以 modules/migrations/versions 下的迁移为准，启动时由 init_db 自动执行
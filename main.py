@@ -5,16 +5,17 @@ from modules.database import init_db
 nest_asyncio.apply()
 
 import logging
-import os
 from telegram import Update
 from telegram.ext import Application
 import asyncio
 from contextlib import suppress
 
+from bot.commands import get_command_registry
 from bot.handler import register_handlers as register_todo_handlers
 from modules.link.handler import LinkHandler
 from bot.scheduler import start_scheduler
-from bot.config import TELEGRAM_BOT_TOKEN, REMINDER_TIME, TIMEZONE
+from bot.config import TELEGRAM_BOT_TOKEN, TIMEZONE, RUN_MODE
+from bot.webhook import run_webhook
 from utils.logger import init_logger
 
 from bot import setup_bot
@@ -53,17 +54,19 @@ async def main():
         # 注册待办事项处理器
         register_todo_handlers(application)
 
-        # 启动定时任务
-        CHAT_ID = os.getenv("CHAT_ID")
-        if CHAT_ID:
-            start_scheduler(application.bot, int(CHAT_ID), REMINDER_TIME)
-            logging.info(f"Scheduler started. Reminder time: {REMINDER_TIME}")
-        else:
-            logging.warning("CHAT_ID not set in environment variables!")
+        # 文本指令和斜杠命令统一由指令注册表分派，放在链接识别之后
+        get_command_registry().install(application)
+
+        # 启动定时任务：各会话的提醒时间保存在数据库中，由每分钟一次的提醒引擎统一处理
+        start_scheduler(application.bot)
+        logging.info("Scheduler started.")
 
         # 启动机器人并保持运行
-        logging.info("Bot is running...")
-        await application.run_polling(allowed_updates=Update.ALL_TYPES)
+        logging.info(f"Bot is running... (Mode: {RUN_MODE})")
+        if RUN_MODE == "webhook":
+            await run_webhook(application)
+        else:
+            await application.run_polling(allowed_updates=Update.ALL_TYPES)
 
     except Exception as e:
         logging.error(f"Error occurred: {e}")
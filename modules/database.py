@@ -2,24 +2,17 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 import os
 import logging
+import time
 
-# 配置日志
-logging.basicConfig()
-# 创建一个文件处理器
-sql_handler = logging.FileHandler('sql.log')
-sql_handler.setLevel(logging.INFO)
-# 设置日志格式
-formatter = logging.Formatter('%(asctime)s - %(message)s')
-sql_handler.setFormatter(formatter)
-
-# 获取 SQLAlchemy 的日志记录器
-sql_logger = logging.getLogger('sqlalchemy.engine')
-sql_logger.setLevel(logging.INFO)
-sql_logger.addHandler(sql_handler)
+from utils.logger import SLOW_QUERY_LOGGER, truncate
+from utils.metrics import DB_QUERY_SECONDS, register_stats
+from utils.tracing import add_span
 
 # PostgreSQL 配置
 DB_USER = os.environ.get("DB_USER", "postgres")
@@ -28,19 +21,91 @@ DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = os.environ.get("DB_PORT", "5432")
 DB_NAME = os.environ.get("DB_NAME", "todobot")
 
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+# 执行时间超过该值（毫秒）的语句写入慢查询日志；0 表示记录所有语句，负数关闭（耗时指标不受影响）
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "200"))
+
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# 异步驱动（asyncpg），供 handler 和定时任务使用
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # 创建引擎
-engine = create_engine(
-    DATABASE_URL,
-    echo=True,
-    echo_pool=True
-)
+engine = create_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步引擎：数据库 I/O 不再阻塞事件循环
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True
+)
+
+slow_query_logger = logging.getLogger(SLOW_QUERY_LOGGER)
+# 按语句类型统计耗时，其余归为 OTHER，避免标签基数失控
+_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+
+def _install_query_timing(target: Engine, name: str):
+    """
+    替代 echo=True：每条语句的耗时计入 db_query_seconds 和当前更新的追踪，
+    超过 DB_SLOW_QUERY_MS 的语句截断后写入慢查询日志。
+    计时在驱动执行前后，异步引擎挂在其 sync_engine 上
+    """
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start'].pop()
+        elapsed = time.perf_counter() - start
+        operation = statement.lstrip()[:6].upper()
+        operation = operation if operation in _OPERATIONS else 'OTHER'
+        DB_QUERY_SECONDS.observe(elapsed, engine=name, operation=operation)
+        add_span('sql', f"sql {operation}", start, elapsed)
+        if 0 <= DB_SLOW_QUERY_MS <= elapsed * 1000:
+            slow_query_logger.warning("慢查询 %.1fms: %s | 参数: %s",
+                                      elapsed * 1000, truncate(statement), truncate(parameters))
+
+    @event.listens_for(target, "handle_error")
+    def handle_error(context):
+        # 执行失败时不会触发 after_cursor_execute，弹出对应的开始时间
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+
+def _pool_stats(target: Engine):
+    pool = target.pool
+    return lambda: {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+    }
+
+
+_install_query_timing(engine, 'sync')
+_install_query_timing(async_engine.sync_engine, 'async')
+register_stats('db_pool_sync', '同步数据库连接池', _pool_stats(engine))
+register_stats('db_pool_async', '异步数据库连接池', _pool_stats(async_engine.sync_engine))
+
+# expire_on_commit=False：提交后对象属性仍可访问，避免在会话关闭后触发隐式加载
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 
 def init_db():
-    """ 初始化数据库表（第一次启动时执行） """
-    from modules.base_model import Base
-    Base.metadata.create_all(bind=engine)
+    """ 执行未完成的数据库迁移（每次启动时执行，已执行的迁移会被跳过） """
+    from modules.migrations import run_migrations
+    run_migrations(engine)
+
+
+async def close_async_engine():
+    """ 关闭异步连接池（应用退出时调用） """
+    await async_engine.dispose()
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from bot.config import AI_CACHE_MEMORY_ENTRIES
+from modules.database import AsyncSessionLocal
+from modules.link.models import AIResult
+
+# (task, model, prompt_version, content_hash)
+CacheKey = Tuple[str, str, str, str]
+
+
+def content_hash(content: str) -> str:
+    """计算提取后内容的哈希，内容变化即产生新的缓存键"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class AIResultCache:
+    """
+    AI 结果缓存：进程内 LRU + PostgreSQL 持久化。
+    键为 (任务, 模型, 提示词版本, 内容哈希)，任何一项变化都会自然失效；
+    写入新结果时会删除同一链接、同一任务下内容哈希不同的旧结果。
+    """
+
+    def __init__(self, max_entries: int = AI_CACHE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self.counters = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def make_key(task: str, model: str, prompt_version: str, content: str) -> CacheKey:
+        return task, model, prompt_version, content_hash(content)
+
+    def _remember(self, key: CacheKey, result: str):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: CacheKey) -> Optional[str]:
+        """查询缓存，先内存后数据库"""
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+            self.counters['memory_hits'] += 1
+            return result
+
+        task, model, prompt_version, digest = key
+        try:
+            async with AsyncSessionLocal() as db:
+                row = await db.execute(
+                    select(AIResult.result).where(
+                        AIResult.task == task,
+                        AIResult.model == model,
+                        AIResult.prompt_version == prompt_version,
+                        AIResult.content_hash == digest
+                    )
+                )
+                result = row.scalar()
+        except Exception as e:
+            logging.warning(f"读取 AI 结果缓存失败: {e}")
+            return None
+
+        if result is None:
+            self.counters['misses'] += 1
+            return None
+        self.counters['db_hits'] += 1
+        self._remember(key, result)
+        return result
+
+    async def put(self, key: CacheKey, result: str, url: Optional[str] = None):
+        """写入缓存，并清理同一链接下内容已变化的旧结果"""
+        self._remember(key, result)
+        task, model, prompt_version, digest = key
+        try:
+            async with AsyncSessionLocal() as db:
+                stmt = insert(AIResult).values(
+                    task=task,
+                    model=model,
+                    prompt_version=prompt_version,
+                    content_hash=digest,
+                    url=url,
+                    result=result
+                ).on_conflict_do_update(
+                    constraint='uq_ai_results_key',
+                    set_={'result': result, 'url': url}
+                )
+                await db.execute(stmt)
+                if url:
+                    await db.execute(
+                        delete(AIResult).where(
+                            AIResult.task == task,
+                            AIResult.url == url,
+                            AIResult.content_hash != digest
+                        )
+                    )
+                await db.commit()
+        except Exception as e:
+            logging.warning(f"写入 AI 结果缓存失败: {e}")
+
+
+_shared_cache: Optional[AIResultCache] = None
+
+
+def get_ai_cache() -> AIResultCache:
+    """获取进程共享的 AI 结果缓存"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = AIResultCache()
+    return _shared_cache
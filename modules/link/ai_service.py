@@ -1,20 +1,36 @@
+import asyncio
+import json
 import logging
+import re
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-import aiohttp
+from bot.config import LLM_MODEL, LLM_BATCH_TOKEN_BUDGET, LLM_BATCH_MAX_ITEMS
+from modules.link.ai_cache import AIResultCache, get_ai_cache
+from modules.link.extractor import estimate_tokens
+from modules.link.llm_client import LLMClient, get_llm_client
+from utils.logger import truncate
+from utils.singleflight import SingleFlight
+from utils.tracing import traced
 
-from bot.config import API_KEY, API_URL
+# 提示词版本：修改对应任务的提示词时需要递增，旧的缓存结果随之失效
+PROMPT_VERSIONS = {
+    'title': 'v1',
+    'summary': 'v1',
+    'explain': 'v1',
+}
+
+# 所有 AIService 实例共享：相同任务、模型、提示词版本和内容的并发调用只请求一次
+_flights = SingleFlight()
 
 
 class AIService:
-    def __init__(self):
-        self.api_key = API_KEY
-        self.api_url = API_URL
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+    def __init__(self, client: Optional[LLMClient] = None, cache: Optional[AIResultCache] = None):
+        # 标题、摘要、解释共用同一个长连接客户端
+        self.client = client or get_llm_client()
+        self.cache = cache or get_ai_cache()
+        self.model = LLM_MODEL
 
-    async def _make_request(self, messages: list, temperature: float = 0.5) -> str:
+    async def _make_request(self, messages: list, temperature: float = 0.5, max_tokens: int = 1688) -> str:
         """
         发送请求到 API
         请求格式：
@@ -26,28 +42,88 @@ class AIService:
           "stream": false
         }
         """
-        payload = {
-            "model": "gpt-4o",
+        payload = self._build_payload(messages, temperature, max_tokens)
+
+        self._log_payload("发送请求到 API", payload)
+        result = await self.client.post_json(payload)
+        content = result['choices'][0]['message']['content']
+        return content
+
+    def _build_payload(self, messages: list, temperature: float = 0.5, max_tokens: int = 1688,
+                       stream: bool = False) -> dict:
+        return {
+            "model": self.model,
             "messages": messages,
-            "max_tokens": 1688,
+            "max_tokens": max_tokens,
             "temperature": temperature,
-            "stream": False
+            "stream": stream
         }
 
-        logging.info("发送请求到 API, payload: %s", payload)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"API 请求失败: 状态码 {response.status}, 错误信息: {error_text}")
-                result = await response.json()
-                content = result['choices'][0]['message']['content']
-                return content
+    @staticmethod
+    def _log_payload(action: str, payload: dict):
+        """
+        INFO 只记录模型和大小；完整请求体包含网页正文，只在 DEBUG 时截断后记录
+        """
+        messages = payload.get("messages", [])
+        logging.info("%s: model=%s, 消息数=%d, 字符数=%d", action, payload.get("model"), len(messages),
+                     sum(len(m.get("content") or "") for m in messages))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("%s, payload: %s", action, truncate(payload))
+
+    async def _generate(self, task: str, url: str, content: str, messages: list) -> str:
+        """
+        带缓存的生成：相同任务、模型、提示词版本和内容直接返回已有结果，
+        正在进行中的相同调用会被合并
+        """
+        key = self.cache.make_key(task, self.model, PROMPT_VERSIONS[task], content)
+        return await _flights.do(key, lambda: self._generate_once(key, url, messages))
+
+    async def _generate_once(self, key: tuple, url: str, messages: list) -> str:
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self._make_request(messages)
+        await self.cache.put(key, result, url)
+        return result
+
+    async def _stream(self, task: str, url: str, content: str, messages: list) -> AsyncIterator[str]:
+        """
+        带缓存的流式生成，每收到新内容就产出一次累计文本；
+        命中缓存时一次性产出完整结果，完整结果生成后写入缓存。
+        已有相同调用在进行中时不再单独请求，等待其完成后一次性产出结果。
+        """
+        key = self.cache.make_key(task, self.model, PROMPT_VERSIONS[task], content)
+        progress: asyncio.Queue = asyncio.Queue()
+
+        async def run() -> str:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+            payload = self._build_payload(messages, stream=True)
+            self._log_payload("发送流式请求到 API", payload)
+            text = ""
+            async for delta in self.client.stream_chat(payload):
+                text += delta
+                progress.put_nowait(text)
+            if text:
+                await self.cache.put(key, text, url)
+            return text
+
+        # 只有本调用是发起者时 run 才会执行，progress 才会收到增量
+        result = asyncio.ensure_future(_flights.do(key, run))
+        try:
+            while not result.done():
+                getter = asyncio.ensure_future(progress.get())
+                await asyncio.wait({result, getter}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            yield result.result()
+        finally:
+            result.cancel()
 
+    @traced()
     async def generate_title(self, url: str, content: str) -> str:
         """根据链接和内容生成标题"""
         messages = [
@@ -61,13 +137,13 @@ class AIService:
             }
         ]
         try:
-            return await self._make_request(messages)
+            return await self._generate('title', url, content, messages)
         except Exception as e:
             raise Exception(f"生成标题时发生错误: {str(e)}")
 
-    async def generate_summary(self, url: str, content: str) -> str:
-        """生成内容摘要"""
-        messages = [
+    @staticmethod
+    def _summary_messages(url: str, content: str) -> list:
+        return [
             {
                 "role": "system",
                 "content": "你是一个专业的文章摘要生成助手。请生成简洁的中文摘要，使用纯文本格式，避免使用 markdown。"
@@ -77,24 +153,220 @@ class AIService:
                 "content": f"请为以下链接内容生成一个简洁的中文摘要：\n链接：{url}\n内容：{content}\n要求：摘要长度控制在200字以内，保留关键信息，使用简洁明了的语言。"
             }
         ]
+
+    @staticmethod
+    def _explanation_messages(url: str, content: str) -> list:
+        return [
+            {
+                "role": "system",
+                "content": "你是一个专业的内容解释助手。请用通俗易懂的方式解释内容，使用纯文本格式，避免使用 markdown。"
+            },
+            {
+                "role": "user",
+                "content": f"请为以下链接内容生成一个详细的解释：\n链接：{url}\n内容：{content}\n要求：解释主要概念和术语，分析内容的重点，使用通俗易懂的语言。"
+            }
+        ]
+
+    @traced()
+    async def generate_summary(self, url: str, content: str) -> str:
+        """生成内容摘要"""
         try:
-            return await self._make_request(messages)
+            return await self._generate('summary', url, content, self._summary_messages(url, content))
         except Exception as e:
             raise Exception(f"生成摘要时发生错误: {str(e)}")
 
+    @traced()
     async def generate_explanation(self, url: str, content: str) -> str:
         """生成详细解释"""
+        try:
+            return await self._generate('explain', url, content, self._explanation_messages(url, content))
+        except Exception as e:
+            raise Exception(f"生成解释时发生错误: {str(e)}")
+
+    async def stream_summary(self, url: str, content: str) -> AsyncIterator[str]:
+        """流式生成内容摘要，逐次产出累计文本"""
+        async for text in self._stream('summary', url, content, self._summary_messages(url, content)):
+            yield text
+
+    async def stream_explanation(self, url: str, content: str) -> AsyncIterator[str]:
+        """流式生成详细解释，逐次产出累计文本"""
+        async for text in self._stream('explain', url, content, self._explanation_messages(url, content)):
+            yield text
+
+    @staticmethod
+    def _pack_batches(items: List[Tuple[int, str, str]]) -> List[List[Tuple[int, str, str]]]:
+        """按 token 预算和数量上限把文档分组"""
+        batches = []
+        current = []
+        used = 0
+        for item in items:
+            cost = estimate_tokens(item[2]) + 50
+            if current and (used + cost > LLM_BATCH_TOKEN_BUDGET or len(current) >= LLM_BATCH_MAX_ITEMS):
+                batches.append(current)
+                current, used = [], 0
+            current.append(item)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _parse_batch_response(text: str) -> Dict[int, str]:
+        """解析批量请求的 JSON 输出，返回 {文档ID: 摘要}，格式错误时抛出 ValueError"""
+        # 兼容模型用代码块包裹 JSON 的情况
+        match = re.search(r'\{.*\}', text, re.S)
+        if not match:
+            raise ValueError("批量摘要响应中没有 JSON")
+        data = json.loads(match.group())
+        if not isinstance(data, dict) or not isinstance(data.get('summaries', []), list):
+            raise ValueError("批量摘要响应格式错误")
+        results = {}
+        for entry in data.get('summaries', []):
+            # 格式不对的条目跳过，缺少的条目由调用方逐条重试
+            if not isinstance(entry, dict):
+                continue
+            summary = entry.get('summary')
+            if not isinstance(summary, str) or not summary.strip():
+                continue
+            try:
+                item_id = int(entry.get('id'))
+            except (TypeError, ValueError):
+                continue
+            results[item_id] = summary.strip()
+        return results
+
+    @traced()
+    async def _summarize_batch(self, batch: List[Tuple[int, str, str]]) -> Dict[int, str]:
+        """对一组文档发出一次请求；响应格式错误或缺少条目时逐条重试"""
+        if len(batch) == 1:
+            item_id, url, content = batch[0]
+            return {item_id: await self._summary_once(url, content)}
+
+        documents = "\n\n".join(
+            f"### 文档 {item_id}\n链接：{url}\n内容：{content}"
+            for item_id, url, content in batch
+        )
         messages = [
             {
                 "role": "system",
-                "content": "你是一个专业的内容解释助手。请用通俗易懂的方式解释内容，使用纯文本格式，避免使用 markdown。"
+                "content": "你是一个专业的文章摘要生成助手。请为每篇文档分别生成简洁的中文摘要，使用纯文本格式，避免使用 markdown。"
+                           "只输出 JSON，格式为 {\"summaries\": [{\"id\": 文档编号, \"summary\": \"摘要\"}]}。"
             },
             {
                 "role": "user",
-                "content": f"请为以下链接内容生成一个详细的解释：\n链接：{url}\n内容：{content}\n要求：解释主要概念和术语，分析内容的重点，使用通俗易懂的语言。"
+                "content": f"请为以下 {len(batch)} 篇文档分别生成摘要：\n\n{documents}\n\n"
+                           f"要求：每篇摘要长度控制在200字以内，保留关键信息，使用简洁明了的语言。"
             }
         ]
+
+        results = {}
         try:
-            return await self._make_request(messages)
-        except Exception as e:
-            raise Exception(f"生成解释时发生错误: {str(e)}")
+            text = await self._make_request(messages, max_tokens=min(400 * len(batch), 4000))
+            results = self._parse_batch_response(text)
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"批量摘要响应格式错误，改为逐条生成: {e}")
+
+        for item_id, url, content in batch:
+            if item_id in results:
+                key = self.cache.make_key('summary', self.model, PROMPT_VERSIONS['summary'], content)
+                await self.cache.put(key, results[item_id], url)
+
+        missing = [item for item in batch if item[0] not in results]
+        if missing:
+            retried = await asyncio.gather(
+                *(self._summary_once(url, content) for _, url, content in missing),
+                return_exceptions=True
+            )
+            for (item_id, _, _), summary in zip(missing, retried):
+                if isinstance(summary, Exception):
+                    logging.error(f"生成摘要失败 (ID: {item_id}): {summary}")
+                else:
+                    results[item_id] = summary
+        return {item_id: results[item_id] for item_id, _, _ in batch if item_id in results}
+
+    async def _summary_once(self, url: str, content: str) -> str:
+        """
+        不经过合并直接生成单条摘要。
+        批量任务的条目已登记为进行中的调用，再走 _generate 会等待自己而死锁
+        """
+        key = self.cache.make_key('summary', self.model, PROMPT_VERSIONS['summary'], content)
+        return await self._generate_once(key, url, self._summary_messages(url, content))
+
+    @traced()
+    async def generate_summaries(self, items: List[Tuple[int, str, str]],
+                                 timeout: Optional[float] = None) -> Dict[int, str]:
+        """
+        批量生成摘要，减少请求次数和总耗时。
+        已在进行中的相同摘要（例如用户手动 /summarize）会被直接复用。
+
+        Args:
+            items: [(ID, 链接, 提取后的内容), ...]，ID 通常为链接 ID
+            timeout: 等待的最长秒数，到时后返回已完成的条目，其余条目取消
+
+        Returns:
+            {ID: 摘要}，生成失败或超时的条目不包含在结果中
+        """
+        results = {}
+        joined = {}
+        pending = []
+        for item_id, url, content in items:
+            key = self.cache.make_key('summary', self.model, PROMPT_VERSIONS['summary'], content)
+            if _flights.in_flight(key):
+                # 走正常的合并路径：等待期间对方若已结束，会退回缓存或重新请求
+                joined[item_id] = self.generate_summary(url, content)
+                continue
+            cached = await self.cache.get(key)
+            if cached is not None:
+                results[item_id] = cached
+            else:
+                pending.append((item_id, url, content))
+
+        # 批量任务中的每个条目也登记为进行中的调用，供其他调用者合并
+        waiters = {item_id: asyncio.ensure_future(waiter) for item_id, waiter in joined.items()}
+        batch_tasks = []
+        for batch in self._pack_batches(pending):
+            batch_task = asyncio.ensure_future(self._summarize_batch(batch))
+            keys = []
+            for item_id, url, content in batch:
+                key = self.cache.make_key('summary', self.model, PROMPT_VERSIONS['summary'], content)
+                keys.append(key)
+                waiters[item_id] = asyncio.ensure_future(
+                    _flights.do(key, lambda t=batch_task, i=item_id: self._pick(t, i))
+                )
+            batch_tasks.append((batch_task, keys))
+        if not waiters:
+            return results
+
+        done = set()
+        try:
+            done, _ = await asyncio.wait(waiters.values(), timeout=timeout)
+        finally:
+            # 超时或调用方被取消时放弃未完成的条目
+            unfinished = [waiter for waiter in waiters.values() if not waiter.done()]
+            for waiter in unfinished:
+                waiter.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+            # _pick 用 shield 等待批量任务；条目都没有其他调用者合并时才取消批量请求
+            for batch_task, keys in batch_tasks:
+                if not batch_task.done() and not any(_flights.in_flight(key) for key in keys):
+                    batch_task.cancel()
+
+        timed_out = []
+        for item_id, waiter in waiters.items():
+            if waiter not in done or waiter.cancelled():
+                timed_out.append(item_id)
+            elif waiter.exception() is not None:
+                logging.error(f"生成摘要失败 (ID: {item_id}): {waiter.exception()}")
+            elif waiter.result():
+                results[item_id] = waiter.result()
+        if timed_out:
+            logging.warning(f"批量生成摘要超时，{len(timed_out)} 条未完成: {timed_out}")
+        return results
+
+    @staticmethod
+    async def _pick(batch_task: asyncio.Future, item_id: int) -> str:
+        """从批量结果中取出单个条目，缺失时抛出异常"""
+        batch_result = await asyncio.shield(batch_task)
+        if item_id not in batch_result:
+            raise ValueError(f"批量结果中缺少条目 {item_id}")
+        return batch_result[item_id]
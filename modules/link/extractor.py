@@ -0,0 +1,174 @@
+import math
+import re
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+from bot.config import TOKEN_BUDGET_TITLE, TOKEN_BUDGET_SUMMARY, TOKEN_BUDGET_EXPLAIN
+
+# 各任务送入 LLM 的 token 预算
+TOKEN_BUDGETS = {
+    'title': TOKEN_BUDGET_TITLE,
+    'summary': TOKEN_BUDGET_SUMMARY,
+    'explain': TOKEN_BUDGET_EXPLAIN,
+}
+
+# 与正文无关、直接删除的标签；按 class / id 判断的边角内容只在计分时扣分
+_DROP_TAGS = [
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "nav", "header", "footer", "aside", "form", "button", "input", "select", "textarea"
+]
+# 计分时视为段落的标签
+_PARAGRAPH_TAGS = ["p", "pre", "td", "blockquote", "li", "h2", "h3"]
+# 输出文本时在前后换行的块级标签
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "pre", "blockquote", "li", "ul", "ol",
+    "table", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr"
+}
+
+_NEGATIVE = re.compile(
+    r"comment|footer|sidebar|side-bar|nav|menu|share|social|advert|\bads?\b|banner|cookie|"
+    r"popup|modal|related|recommend|breadcrumb|subscribe|newsletter|sponsor|widget",
+    re.I
+)
+_POSITIVE = re.compile(r"article|content|main|post|entry|story|body|text|rich", re.I)
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+_INLINE_SPACE = re.compile(r"[ \t\r\f\v 　]+")
+
+
+def _class_weight(tag) -> int:
+    """根据 class / id 判断元素更像正文还是边角内容"""
+    attrs = " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+    if not attrs.strip():
+        return 0
+    weight = 0
+    if _NEGATIVE.search(attrs):
+        weight -= 25
+    if _POSITIVE.search(attrs):
+        weight += 25
+    return weight
+
+
+def _link_density(tag) -> float:
+    text_length = len(tag.get_text(" ", strip=True))
+    if not text_length:
+        return 0.0
+    link_length = sum(len(a.get_text(" ", strip=True)) for a in tag.find_all("a"))
+    return link_length / text_length
+
+
+def _clean_main(main):
+    """
+    删除正文节点内 class / id 像边角内容（分享、相关推荐等）的元素：
+    链接密集或只占正文一小部分时才删除，包住大部分正文的容器（例如 class="has-sidebar" 的外层）保留
+    """
+    total = len(main.get_text(" ", strip=True))
+    for tag in main.find_all(True):
+        if tag.decomposed or _class_weight(tag) >= 0:
+            continue
+        length = len(tag.get_text(" ", strip=True))
+        if _link_density(tag) > 0.25 or length < total * 0.25:
+            tag.decompose()
+
+
+def _block_text(tag) -> str:
+    """按块级标签换行输出文本，并规范化空白"""
+    for br in tag.find_all(["br", "hr"]):
+        br.replace_with("\n")
+    for block in tag.find_all(_BLOCK_TAGS):
+        block.insert_before("\n")
+        block.insert_after("\n")
+    return normalize_whitespace(tag.get_text())
+
+
+def normalize_whitespace(text: str) -> str:
+    """合并行内空白，去掉空行"""
+    lines = (_INLINE_SPACE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _pick_main_node(body):
+    """Readability 风格的正文定位：按段落给父节点计分，取得分最高的节点"""
+    # 语义标签优先
+    semantic = [node for node in body.find_all(["article", "main"])
+                if len(node.get_text(" ", strip=True)) >= 200]
+    if semantic:
+        return max(semantic, key=lambda node: len(node.get_text(" ", strip=True)))
+
+    scores = {}
+    nodes = {}
+    for paragraph in body.find_all(_PARAGRAPH_TAGS):
+        text = paragraph.get_text(" ", strip=True)
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(",") + text.count("，") + text.count("。") + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        grandparent = parent.parent if parent is not None else None
+        for node, share in ((parent, 1.0), (grandparent, 0.5)):
+            if node is None or node.name in (None, "[document]"):
+                continue
+            key = id(node)
+            if key not in scores:
+                nodes[key] = node
+                scores[key] = float(_class_weight(node))
+            scores[key] += score * share
+
+    if not scores:
+        return None
+    best_key = max(scores, key=lambda key: scores[key] * (1 - _link_density(nodes[key])))
+    return nodes[best_key]
+
+
+def extract_main_text(html_content: str) -> str:
+    """
+    从网页 HTML 中提取正文：
+    删除脚本、导航等无关标签，按段落计分定位正文节点（class / id 像边角内容的扣分），
+    清理正文节点内的边角内容，并规范化空白。
+    找不到明显正文时退回整个 body 的文本。
+    """
+    soup = BeautifulSoup(html_content, "lxml")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+
+    for tag in soup(_DROP_TAGS):
+        tag.decompose()
+
+    body = soup.body or soup
+    main = _pick_main_node(body) or body
+    _clean_main(main)
+    text = _block_text(main)
+    if title and not text.startswith(title):
+        text = f"{title}\n{text}"
+    return text
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符约 1 token/字，其余约 4 字符/token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def fit_to_budget(text: str, max_tokens: int) -> str:
+    """按段落截断文本，使估算的 token 数不超过预算"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line) + 1
+        if used + cost <= max_tokens:
+            kept.append(line)
+            used += cost
+            continue
+        # 最后一段按比例截取
+        remaining = max_tokens - used
+        if remaining > 16:
+            ratio = remaining / cost
+            kept.append(line[:int(len(line) * ratio)].rstrip() + "…")
+        break
+    return "\n".join(kept)
+
+
+def prepare_content(html_content: str, task: str, max_tokens: Optional[int] = None) -> str:
+    """所有 AI 调用共用的提取阶段：提取正文并裁剪到任务的 token 预算"""
+    budget = max_tokens or TOKEN_BUDGETS[task]
+    return fit_to_budget(extract_main_text(html_content), budget)
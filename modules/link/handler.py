@@ -1,84 +1,96 @@
 import logging
-import re
-import ssl
+from typing import Optional, Tuple
 
-import aiohttp
-import certifi
 from telegram import Update
 from telegram.constants import ParseMode
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
-
-from modules.link.ai_service import AIService
+from telegram.ext import CallbackQueryHandler, ContextTypes, MessageHandler, filters
+
+from bot.commands import Arg, Int, get_command_registry
+from bot.config import ENRICH_DONE_RETENTION, LLM_STREAMING
+from bot.keyboards import page_keyboard, parse_page_callback
+from bot.messaging import edit_chunks, reply_chunks
+from modules.link.models import Link
+from modules.link.page_cache import get_page_cache
 from modules.link.service import LinkService
 from modules.link.sanitizer import sanitize_telegram_html
+from modules.link.streaming import StreamingReply
+from modules.reminder import service as reminder_service
+from utils.metrics import HANDLER_SECONDS
+from utils.tracing import span
+from utils.render import render_link_list, split_html
 
 
 class LinkHandler:
     def __init__(self):
         self.service = LinkService()
-        self.ai_service = AIService()
-        self.ssl_context = ssl.create_default_context(cafile=certifi.where())
 
     async def handle_url(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理用户发送的URL"""
         user_id = update.effective_user.id
         message_text = update.message.text
         
-        response = await self.service.save_link(user_id, message_text)
-        await update.message.reply_text(response, parse_mode=ParseMode.HTML)
-
-    async def handle_summarize(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """处理 /summarize 命令"""
+        with HANDLER_SECONDS.track(command="<url>"), span("handler <url>"):
+            response = await self.service.save_link(user_id, message_text)
+            await update.message.reply_text(response, parse_mode=ParseMode.HTML)
+        # 未读链接按用户保存，摘要也推送给用户本人
+        await reminder_service.ensure_reminders(user_id, [reminder_service.DIGEST])
+
+    async def _resolve_target(self, update: Update, url: Optional[str]) -> Tuple[Optional[str], Optional[Link]]:
+        """
+        解析命令参数中的 URL；未提供时使用最新的未读链接。
+        返回 (url, link)，无法确定 URL 时已回复用户并返回 (None, None)。
+        """
         chat_id = update.effective_chat.id
 
+        if url:
+            if not url.startswith(('http://', 'https://')):
+                await update.message.reply_text(
+                    "❌ 请提供有效的URL（以 http:// 或 https:// 开头）",
+                    parse_mode=ParseMode.HTML
+                )
+                return None, None
+            # 如果该链接已保存，则生成结果后写回
+            link = await self.service.async_repository.get_by_url(update.effective_user.id, url)
+            return url, link
+
+        link = await self.service.async_repository.get_latest_unread_link(chat_id)
+        if not link:
+            await update.message.reply_text("📭 没有未读的链接")
+            return None, None
+        return link.url, link
+
+    async def handle_summarize(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               url: Optional[str] = None) -> None:
+        """处理 /summarize [链接] 命令"""
         try:
-            url = context.args[0] if context.args else None
-
-            if url:
-                if not url.startswith(('http://', 'https://')):
-                    await update.message.reply_text(
-                        "❌ 请提供有效的URL（以 http:// 或 https:// 开头）",
-                        parse_mode=ParseMode.HTML
-                    )
-                    return
-            else:
-                link_info = self.service.get_latest_unread_link(chat_id)
-                if isinstance(link_info, str) and "没有未读的链接" in link_info:
-                    await update.message.reply_text(link_info)
-                    return
-
-                if hasattr(link_info, 'url'):
-                    url = link_info.url
-                else:
-                    url_match = re.search(r'🌐 URL: (https?://[^\n]+)', link_info)
-                    if url_match:
-                        url = url_match.group(1)
-                    else:
-                        await update.message.reply_text("❌ 无法获取有效的URL")
-                        return
+            url, link = await self._resolve_target(update, url)
+            if not url:
+                return
 
-            await update.message.reply_text(
+            status_message = await update.message.reply_text(
                 "🤖 正在生成摘要，请稍候...",
                 parse_mode=ParseMode.HTML
             )
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        summary = await self.ai_service.generate_summary(url, content)
-                        # 统一调用清理函数，清理不支持的HTML标签
-                        safe_summary = sanitize_telegram_html(summary)
-                        await update.message.reply_text(
-                            safe_summary,
-                            parse_mode=ParseMode.HTML
-                        )
-                    else:
-                        await update.message.reply_text(
-                            f"❌ 无法访问链接，状态码：{response.status}",
-                            parse_mode=ParseMode.HTML
-                        )
-
+            if LLM_STREAMING:
+                # 边生成边更新同一条消息
+                reply = StreamingReply(status_message)
+                summary = ""
+                async for summary in self.service.stream_summary(url, link):
+                    await reply.update(summary)
+                await reply.finish(sanitize_telegram_html(summary))
+                return
+
+            summary = await self.service.summarize(url, link)
+            # 统一调用清理函数，清理不支持的HTML标签
+            safe_summary = sanitize_telegram_html(summary)
+            await reply_chunks(update.message, split_html(safe_summary))
+
+        except ValueError as e:
+            await update.message.reply_text(
+                f"❌ {str(e)}",
+                parse_mode=ParseMode.HTML
+            )
         except Exception as e:
             logging.error(f"生成摘要时发生错误: {str(e)}")
             await update.message.reply_text(
@@ -86,57 +98,37 @@ class LinkHandler:
                 parse_mode=ParseMode.HTML
             )
 
-    async def handle_explain(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """处理 /explain 命令"""
-        chat_id = update.effective_chat.id
-
+    async def handle_explain(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                             url: Optional[str] = None) -> None:
+        """处理 /explain [链接] 命令"""
         try:
-            url = context.args[0] if context.args else None
-
-            if url:
-                if not url.startswith(('http://', 'https://')):
-                    await update.message.reply_text(
-                        "❌ 请提供有效的URL（以 http:// 或 https:// 开头）",
-                        parse_mode=ParseMode.HTML
-                    )
-                    return
-            else:
-                link_info = self.service.get_latest_unread_link(chat_id)
-                if isinstance(link_info, str) and "没有未读的链接" in link_info:
-                    await update.message.reply_text(link_info)
-                    return
-
-                if hasattr(link_info, 'url'):
-                    url = link_info.url
-                else:
-                    url_match = re.search(r'🌐 URL: (https?://[^\n]+)', link_info)
-                    if url_match:
-                        url = url_match.group(1)
-                    else:
-                        await update.message.reply_text("❌ 无法获取有效的URL")
-                        return
+            url, _ = await self._resolve_target(update, url)
+            if not url:
+                return
 
-            await update.message.reply_text(
+            status_message = await update.message.reply_text(
                 "🤖 正在生成解释，请稍候...",
                 parse_mode=ParseMode.HTML
             )
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        explanation = await self.ai_service.generate_explanation(url, content)
-                        safe_explanation = sanitize_telegram_html(explanation)
-                        await update.message.reply_text(
-                            safe_explanation,
-                            parse_mode=ParseMode.HTML
-                        )
-                    else:
-                        await update.message.reply_text(
-                            f"❌ 无法访问链接，状态码：{response.status}",
-                            parse_mode=ParseMode.HTML
-                        )
+            if LLM_STREAMING:
+                # 边生成边更新同一条消息
+                reply = StreamingReply(status_message)
+                explanation = ""
+                async for explanation in self.service.stream_explanation(url):
+                    await reply.update(explanation)
+                await reply.finish(sanitize_telegram_html(explanation))
+                return
 
+            explanation = await self.service.explain(url)
+            safe_explanation = sanitize_telegram_html(explanation)
+            await reply_chunks(update.message, split_html(safe_explanation))
+
+        except ValueError as e:
+            await update.message.reply_text(
+                f"❌ {str(e)}",
+                parse_mode=ParseMode.HTML
+            )
         except Exception as e:
             logging.error(f"生成解释时发生错误: {str(e)}")
             await update.message.reply_text(
@@ -144,53 +136,79 @@ class LinkHandler:
                 parse_mode=ParseMode.HTML
             )
 
+    async def _render_unread_page(self, user_id: int, cursor: Optional[str] = None, forward: bool = True):
+        """获取一页未读链接，返回 (消息列表, 翻页按钮)；没有链接时消息列表为空"""
+        page = await self.service.get_unread_page_async(user_id, cursor, forward)
+        if not page.items:
+            return [], None
+        markup = page_keyboard("links:unread", page, self.service.encode_unread_cursor)
+        return render_link_list(page.items, header="📚 最近未读的链接："), markup
+
     async def handle_unread(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """处理 /unread 命令，显示最近5条未读链接"""
+        """处理 /unread 命令，分页显示未读链接"""
         user_id = update.effective_user.id
-        # 调用修改后的服务方法，获取当前用户的最近 5 条未读链接
-        unread_links = self.service.get_unread_links(user_id, limit=5)
-        
-        if not unread_links:
+        messages, markup = await self._render_unread_page(user_id)
+
+        if not messages:
             await update.message.reply_text("📭 您现在没有未读的链接", parse_mode=ParseMode.HTML)
             return
 
-        # 拼接所有链接的信息，每个链接调用已有的格式化方法
-        message_lines = ["📚 最近未读的链接："]
-        for link in unread_links:
-            info = self.service.format_link_info(link)
-            message_lines.append(info)
-            message_lines.append("")  # 添加空行分隔
+        await reply_chunks(update.message, messages, reply_markup=markup)
 
-        message = "\n".join(message_lines)
-        await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+    async def handle_unread_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理 /unread 列表的翻页按钮"""
+        query = update.callback_query
+        try:
+            _, forward, cursor = parse_page_callback(query.data)
+            messages, markup = await self._render_unread_page(update.effective_user.id, cursor, forward)
+        except ValueError as e:
+            await query.answer(f"❌ {str(e)}")
+            return
 
-    async def handle_mark_read(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """处理 /read 命令，将链接标记为已读"""
-        if not context.args:
-            await update.message.reply_text(
-                "❌ 请提供链接ID\n例如：/read 1",
-                parse_mode=ParseMode.HTML
-            )
+        if not messages:
+            await query.answer("没有更多未读链接了")
             return
+        await query.answer()
+        await edit_chunks(query, messages, reply_markup=markup)
 
+    async def handle_mark_read(self, update: Update, context: ContextTypes.DEFAULT_TYPE, link_id: int) -> None:
+        """处理 /read <链接ID> 命令，将链接标记为已读"""
         try:
-            link_id = int(context.args[0])
-            response = self.service.mark_as_read(link_id)
+            response = await self.service.mark_as_read_async(link_id)
             await update.message.reply_text(response, parse_mode=ParseMode.HTML)
         except ValueError:
             await update.message.reply_text("❌ 无效的链接ID", parse_mode=ParseMode.HTML)
 
-    def register_handlers(self, application):
-        """注册所有处理器"""
-        # 处理URL消息
-        url_handler = MessageHandler(
-            filters.TEXT & filters.Regex(r'https?://'),
-            self.handle_url
+    async def handle_cache_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理 /cachestats 命令，显示网页缓存命中情况"""
+        await update.message.reply_text(get_page_cache().format_stats())
+
+    async def handle_jobs(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理 /jobs 命令，显示后台补全队列的积压情况"""
+        depth = await self.service.job_queue.depth()
+        await update.message.reply_text(
+            f"🧵 后台补全队列\n"
+            f"等待中: {depth.get('pending', 0)}\n"
+            f"执行中: {depth.get('running', 0)}\n"
+            f"已完成（保留 {ENRICH_DONE_RETENTION / 86400:g} 天）: {depth.get('done', 0)}\n"
+            f"已失败: {depth.get('failed', 0)}"
         )
 
-        # 注册命令处理器
-        application.add_handler(CommandHandler("summarize", self.handle_summarize))
-        application.add_handler(CommandHandler("explain", self.handle_explain))
-        application.add_handler(CommandHandler("unread", self.handle_unread))
-        application.add_handler(CommandHandler("read", self.handle_mark_read))
-        application.add_handler(url_handler)
+    def register_handlers(self, application):
+        """注册所有处理器；斜杠命令登记到指令注册表，由 main 统一 install"""
+        registry = get_command_registry()
+        registry.register("/summarize", self.handle_summarize, Arg("url", "链接", optional=True),
+                          description="AI 总结链接")
+        registry.register("/explain", self.handle_explain, Arg("url", "链接", optional=True),
+                          description="AI 解释链接")
+        registry.register("/unread", self.handle_unread, description="查看未读链接")
+        registry.register("/read", self.handle_mark_read, Int("link_id", "链接ID"), description="标记链接已读")
+        registry.register("/cachestats", self.handle_cache_stats, description="网页缓存命中情况")
+        registry.register("/jobs", self.handle_jobs, description="后台补全队列积压")
+
+        # 处理URL消息；需在指令注册表之前注册，斜杠命令中的链接交给对应命令处理
+        application.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND & filters.Regex(r'https?://'),
+            self.handle_url
+        ))
+        application.add_handler(CallbackQueryHandler(self.handle_unread_page, pattern=r"^links:unread:"))
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from bot.config import (
+    ENRICH_WORKERS, ENRICH_MAX_ATTEMPTS, ENRICH_BACKOFF_BASE, ENRICH_BACKOFF_MAX,
+    ENRICH_VISIBILITY_TIMEOUT, ENRICH_POLL_INTERVAL, ENRICH_DONE_RETENTION, ENRICH_PRUNE_INTERVAL
+)
+from modules.database import AsyncSessionLocal
+from modules.link.models import LinkJob
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def retry_delay(attempts: int) -> float:
+    """第 attempts 次失败后的重试等待秒数：指数退避，取上限后在 [一半, 全部] 之间随机"""
+    delay = min(ENRICH_BACKOFF_MAX, ENRICH_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return random.uniform(delay / 2, delay)
+
+
+def new_job(link_id: int, kind: str = 'enrich') -> LinkJob:
+    """构造一个立即可执行的任务，由调用方加入会话，和其他写入一起提交"""
+    now = _utcnow()
+    return LinkJob(
+        link_id=link_id,
+        kind=kind,
+        status='pending',
+        attempts=0,
+        run_at=now,
+        created_at=now,
+        updated_at=now
+    )
+
+
+class EnrichmentQueue:
+    """
+    基于 PostgreSQL 的持久化任务队列。
+    任务在保存链接时入队，进程重启后仍然存在；
+    worker 用 FOR UPDATE SKIP LOCKED 领取，多个 worker / 进程之间不会重复领取。
+    领取后超过可见性超时仍未完成的任务会被重新领取，已用完尝试次数的直接标记为 failed；
+    已完成的任务保留 ENRICH_DONE_RETENTION 秒后由 prune() 删除。
+    """
+
+    def __init__(self):
+        # 同进程内入队时唤醒空闲 worker，减少等待
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, link_id: int, kind: str = 'enrich') -> int:
+        """入队一个任务，返回任务 ID；与其他写入需要在同一事务中时用 new_job"""
+        async with AsyncSessionLocal() as db:
+            job = new_job(link_id, kind)
+            db.add(job)
+            await db.commit()
+            job_id = job.id
+        self.notify()
+        return job_id
+
+    def notify(self):
+        """唤醒空闲 worker，在调用方自行提交的任务之后调用"""
+        self._wakeup.set()
+
+    async def claim(self) -> Optional[LinkJob]:
+        """领取一个到期任务，没有可执行的任务时返回 None"""
+        now = _utcnow()
+        stale_before = now - timedelta(seconds=ENRICH_VISIBILITY_TIMEOUT)
+        async with AsyncSessionLocal() as db:
+            # 超时未完成且尝试次数已用完（例如每次都让进程崩溃）的任务不再领取
+            expired = await db.execute(
+                update(LinkJob)
+                .where(LinkJob.status == 'running', LinkJob.locked_at < stale_before,
+                       LinkJob.attempts >= ENRICH_MAX_ATTEMPTS)
+                .values(status='failed', locked_at=None, updated_at=now,
+                        last_error=f"领取后超过 {ENRICH_VISIBILITY_TIMEOUT:.0f}s 未完成")
+                .returning(LinkJob.id)
+            )
+            expired_ids = expired.scalars().all()
+            if expired_ids:
+                logging.error(f"链接补全任务 {expired_ids} 已尝试 {ENRICH_MAX_ATTEMPTS} 次且超时未完成，放弃重试")
+
+            result = await db.execute(
+                select(LinkJob)
+                .where(or_(
+                    and_(LinkJob.status == 'pending', LinkJob.run_at <= now),
+                    and_(LinkJob.status == 'running', LinkJob.locked_at < stale_before)
+                ))
+                .order_by(LinkJob.run_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = result.scalars().first()
+            if job is None:
+                await db.commit()
+                return None
+            job.status = 'running'
+            job.attempts += 1
+            job.locked_at = now
+            job.updated_at = now
+            await db.commit()
+            return job
+
+    @staticmethod
+    def _leased(job: LinkJob):
+        """
+        任务仍由本次领取持有：超过可见性超时后被其他 worker 重新领取时 attempts 会加一，
+        旧的持有者不能再覆盖新持有者的状态
+        """
+        return and_(LinkJob.id == job.id, LinkJob.status == 'running', LinkJob.attempts == job.attempts)
+
+    async def _finish(self, job: LinkJob, **values) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(update(LinkJob).where(self._leased(job)).values(locked_at=None, **values))
+            await db.commit()
+        if result.rowcount == 0:
+            logging.warning(f"链接补全任务 {job.id} 的租约已失效（超时后被重新领取），忽略本次结果")
+            return False
+        return True
+
+    async def complete(self, job: LinkJob) -> bool:
+        """标记任务完成；租约已失效时不做修改并返回 False"""
+        return await self._finish(job, status='done', last_error=None, updated_at=_utcnow())
+
+    async def fail(self, job: LinkJob, error: str) -> bool:
+        """
+        记录失败：未达到最大次数时按指数退避（带抖动）重新排队，否则标记为 failed；
+        租约已失效时不做修改并返回 False
+        """
+        now = _utcnow()
+        if job.attempts >= ENRICH_MAX_ATTEMPTS:
+            values = {'status': 'failed'}
+            logging.error(f"链接补全任务 {job.id} 已失败 {job.attempts} 次，放弃重试: {error}")
+        else:
+            delay = retry_delay(job.attempts)
+            values = {'status': 'pending', 'run_at': now + timedelta(seconds=delay)}
+            logging.warning(f"链接补全任务 {job.id} 第 {job.attempts} 次失败，{delay:.0f}s 后重试: {error}")
+        return await self._finish(job, last_error=error[:1000], updated_at=now, **values)
+
+    async def prune(self, retention: float = ENRICH_DONE_RETENTION) -> int:
+        """删除完成时间早于 retention 秒之前的任务，返回删除的数量；失败的任务保留以便排查"""
+        cutoff = _utcnow() - timedelta(seconds=retention)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(LinkJob).where(LinkJob.status == 'done', LinkJob.updated_at < cutoff)
+            )
+            await db.commit()
+            return result.rowcount
+
+    async def depth(self) -> Dict[str, int]:
+        """按状态统计任务数量"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(LinkJob.status, func.count(LinkJob.id)).group_by(LinkJob.status)
+            )
+            return {status: count for status, count in result.all()}
+
+    async def wait_for_work(self, timeout: float):
+        """等待新任务入队或超时"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+class EnrichmentWorkerPool:
+    """一组异步 worker，循环领取并执行链接补全任务"""
+
+    def __init__(self, queue: EnrichmentQueue, handler: Callable[[LinkJob], Awaitable[None]],
+                 concurrency: int = ENRICH_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"enrich-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._pruner(), name="enrich-pruner"))
+        logging.info(f"链接补全 worker 已启动，数量: {self.concurrency}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                job = await self.queue.claim()
+                if job is None:
+                    await self.queue.wait_for_work(ENRICH_POLL_INTERVAL)
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                # 进程退出时未完成的任务保持 running，超时后会被重新领取
+                raise
+            except Exception as e:
+                logging.error(f"链接补全 worker {index} 出错: {e}")
+                await asyncio.sleep(ENRICH_POLL_INTERVAL)
+
+    async def _pruner(self):
+        """定期删除过期的已完成任务"""
+        while True:
+            try:
+                pruned = await self.queue.prune()
+                if pruned:
+                    logging.info(f"已删除 {pruned} 个过期的链接补全任务")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"清理链接补全任务失败: {e}")
+            await asyncio.sleep(ENRICH_PRUNE_INTERVAL)
+
+    async def _run(self, job: LinkJob):
+        try:
+            await self.handler(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self.queue.fail(job, f"{type(e).__name__}: {e}")
+        else:
+            await self.queue.complete(job)
+
+
+_shared_queue: Optional[EnrichmentQueue] = None
+
+
+def get_enrichment_queue() -> EnrichmentQueue:
+    """获取进程共享的链接补全队列"""
+    global _shared_queue
+    if _shared_queue is None:
+        _shared_queue = EnrichmentQueue()
+    return _shared_queue
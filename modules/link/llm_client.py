@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from bot.config import (
+    API_KEY, API_URL,
+    LLM_POOL_SIZE, LLM_CONNECT_TIMEOUT, LLM_REQUEST_TIMEOUT, LLM_TOTAL_TIMEOUT,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+    LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET
+)
+from utils.metrics import LLM_REQUEST_SECONDS
+from utils.tracing import add_span
+
+# 这些状态码视为临时故障，可以重试
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class LLMError(Exception):
+    """LLM 请求失败"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    """熔断器打开，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    简单的熔断器：
+    - closed：正常放行，连续失败达到阈值后进入 open
+    - open：直接拒绝，经过 reset_timeout 后进入 half_open
+    - half_open：只放行一个试探请求，成功则 closed，失败则重新 open
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """判断当前是否允许发出请求"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self._probing = False
+        # half_open：同一时间只放行一个试探请求
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release_probe(self):
+        """试探请求没有得出结论（被取消或出现意料外的异常）时归还名额，下一个请求可以继续试探"""
+        if self.state == "half_open":
+            self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.warning(f"LLM 熔断器打开，连续失败 {self.failures} 次")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    长生命周期的 LLM 客户端，由应用持有并在所有 AI 调用间共享。
+    复用 keep-alive 连接，设置超时，对 429/5xx 做带抖动的指数退避重试，
+    上游持续故障时由熔断器快速失败。
+    """
+
+    def __init__(self, api_url: str = API_URL, api_key: str = API_KEY):
+        self.api_url = api_url
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        self.max_retries = LLM_MAX_RETRIES
+        self.total_timeout = LLM_TOTAL_TIMEOUT
+        self.request_timeout = aiohttp.ClientTimeout(
+            total=LLM_REQUEST_TIMEOUT,
+            connect=LLM_CONNECT_TIMEOUT
+        )
+        # 流式响应可能持续较久：限制总时长和两次数据之间的间隔
+        self.stream_timeout = aiohttp.ClientTimeout(
+            total=LLM_TOTAL_TIMEOUT,
+            connect=LLM_CONNECT_TIMEOUT,
+            sock_read=LLM_REQUEST_TIMEOUT
+        )
+        self.breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """懒加载会话，保证在运行中的事件循环里创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=LLM_POOL_SIZE,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=self.request_timeout
+            )
+        return self._session
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        """计算退避时间：优先使用 Retry-After，否则使用 full jitter 指数退避"""
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    @staticmethod
+    @asynccontextmanager
+    async def _timed(mode: str):
+        """统计单次请求（每次重试单独计）的耗时，status 为状态码、timeout 或异常类型"""
+        start = time.perf_counter()
+        status = "200"
+        try:
+            yield
+        except LLMError as e:
+            status = str(e.status) if e.status else "error"
+            raise
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # 单次请求被 _with_retries 的剩余时限取消
+            status = "timeout"
+            raise
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            LLM_REQUEST_SECONDS.observe(elapsed, mode=mode, status=status)
+            add_span('llm', f"llm {mode} {status}", start, elapsed)
+
+    async def _post_once(self, payload: dict) -> dict:
+        """发出单次请求，失败时抛出 LLMError"""
+        session = self._get_session()
+        async with self._timed("json"):
+            async with session.post(self.api_url, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise LLMError(
+                        f"API 请求失败: 状态码 {response.status}, 错误信息: {error_text}",
+                        status=response.status,
+                        retry_after=response.headers.get("Retry-After")
+                    )
+                return await response.json()
+
+    async def _open_stream(self, payload: dict) -> aiohttp.ClientResponse:
+        """打开流式请求，返回尚未读取正文的响应；状态码异常时抛出 LLMError"""
+        session = self._get_session()
+        async with self._timed("stream"):
+            response = await session.post(self.api_url, json=payload, timeout=self.stream_timeout)
+            if response.status != 200:
+                try:
+                    error_text = await response.text()
+                finally:
+                    response.release()
+                raise LLMError(
+                    f"API 请求失败: 状态码 {response.status}, 错误信息: {error_text}",
+                    status=response.status,
+                    retry_after=response.headers.get("Retry-After")
+                )
+            return response
+
+    async def _with_retries(self, request_factory: Callable[[], Awaitable[T]]) -> T:
+        """执行请求，带重试、总超时与熔断"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("AI 服务暂时不可用，请稍后再试")
+        probe = self.breaker.state == "half_open"
+
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        try:
+            while True:
+                try:
+                    remaining = deadline - time.monotonic()
+                    result = await asyncio.wait_for(request_factory(), timeout=max(remaining, 0.1))
+                    self.breaker.record_success()
+                    return result
+                except (LLMError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status = getattr(e, "status", None)
+                    retryable = not isinstance(e, LLMError) or status in RETRYABLE_STATUS
+                    if not retryable:
+                        # 4xx 等请求本身的错误不计入熔断
+                        self.breaker.record_success()
+                        raise
+                    delay = self._backoff(attempt, getattr(e, "retry_after", None))
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        self.breaker.record_failure()
+                        if isinstance(e, LLMError):
+                            raise
+                        raise LLMError(f"API 请求失败: {type(e).__name__} {e}") from e
+                    logging.warning(
+                        f"LLM 请求失败（第 {attempt + 1} 次），{delay:.2f}s 后重试: {type(e).__name__} {e}"
+                    )
+                    await asyncio.sleep(delay)
+                    attempt += 1
+        finally:
+            # 试探请求被取消或抛出其他异常时既没有记录成功也没有记录失败，归还名额，否则熔断器会一直拒绝
+            if probe:
+                self.breaker.release_probe()
+
+    async def post_json(self, payload: dict) -> dict:
+        """发送请求并返回 JSON 结果"""
+        return await self._with_retries(lambda: self._post_once(payload))
+
+    async def stream_chat(self, payload: dict) -> AsyncIterator[str]:
+        """
+        以流式（SSE）方式发送请求，逐个产出增量文本。
+        只在收到首个字节之前重试；读取过程中出错直接抛出。
+        """
+        payload = dict(payload, stream=True)
+        response = await self._with_retries(lambda: self._open_stream(payload))
+        try:
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8", errors="ignore").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure()
+            raise LLMError(f"流式读取失败: {type(e).__name__} {e}") from e
+        finally:
+            response.release()
+
+    async def close(self):
+        """关闭底层连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_shared_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """获取应用共享的 LLM 客户端"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = LLMClient()
+    return _shared_client
+
+
+async def close_llm_client():
+    """应用退出时关闭共享客户端"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
@@ -1,12 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
-from sqlalchemy import Column, Integer, Text, Boolean, DateTime, BigInteger
+from sqlalchemy import Column, Integer, Text, Boolean, DateTime, BigInteger, String, UniqueConstraint, Index, text
 
 from modules.base_model import Base
 
 
 class Link(Base):
     __tablename__ = 'links'
+    __table_args__ = (
+        # 由迁移 0004 创建，供按用户 keyset 分页列出未读链接使用
+        Index('idx_links_user_unread_created', 'user_id', text('created_at DESC'), text('id DESC'),
+              postgresql_where=text('NOT is_read')),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)  # 确保有主键
     user_id = Column(BigInteger, nullable=False)  # Telegram 用户 ID
@@ -14,8 +19,8 @@ class Link(Base):
     title = Column(Text)  # 链接标题（可选）
     is_read = Column(Boolean, default=False)  # 是否已读
     summary = Column(Text)  # AI 生成的摘要（可选）
-    created_at = Column(DateTime, default=datetime.utcnow)  # 创建时间
-    read_at = Column(DateTime)  # 阅读时间
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))  # 创建时间
+    read_at = Column(DateTime(timezone=True))  # 阅读时间
 
     def __repr__(self):
         return f"<Link(id={self.id}, url={self.url}, is_read={self.is_read})>"
@@ -32,3 +37,47 @@ class Link(Base):
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
             'read_at': self.read_at.strftime('%Y-%m-%d %H:%M:%S') if self.read_at else None
         }
+
+
+class AIResult(Base):
+    """AI 生成结果缓存，按 (任务, 模型, 提示词版本, 内容哈希) 唯一"""
+    __tablename__ = 'ai_results'
+    __table_args__ = (
+        UniqueConstraint('task', 'model', 'prompt_version', 'content_hash', name='uq_ai_results_key'),
+        Index('idx_ai_results_task_url', 'task', 'url'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task = Column(String(20), nullable=False)  # title / summary / explain
+    model = Column(String(100), nullable=False)  # 模型名称
+    prompt_version = Column(String(20), nullable=False)  # 提示词版本
+    content_hash = Column(String(64), nullable=False)  # 提取后内容的 SHA-256
+    url = Column(Text)  # 来源链接，用于内容变化时清理旧结果
+    result = Column(Text, nullable=False)  # 生成结果
+    # 由迁移 0010 改为 timestamptz，与 links 一致
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<AIResult(task={self.task}, model={self.model}, hash={self.content_hash[:8]})>"
+
+
+class LinkJob(Base):
+    """链接后台补全任务，worker 通过 SELECT ... FOR UPDATE SKIP LOCKED 领取"""
+    __tablename__ = 'link_jobs'
+    __table_args__ = (
+        Index('idx_link_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    link_id = Column(Integer, nullable=False)  # 关联的链接 ID
+    kind = Column(String(20), nullable=False, default='enrich')  # 任务类型
+    status = Column(String(20), nullable=False, default='pending')  # pending / running / done / failed
+    attempts = Column(Integer, nullable=False, default=0)  # 已尝试次数
+    run_at = Column(DateTime(timezone=True), nullable=False)  # 最早可执行时间
+    locked_at = Column(DateTime(timezone=True))  # 被领取的时间
+    last_error = Column(Text)  # 最近一次失败原因
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<LinkJob(id={self.id}, link_id={self.link_id}, status={self.status}, attempts={self.attempts})>"
@@ -0,0 +1,406 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+
+import aiohttp
+import certifi
+
+from bot.config import (
+    PAGE_CACHE_DIR, PAGE_CACHE_MEMORY_BYTES, PAGE_CACHE_DISK_BYTES,
+    PAGE_CACHE_DEFAULT_TTL, PAGE_FETCH_TIMEOUT
+)
+from utils.metrics import PAGE_FETCH_BYTES, PAGE_FETCH_SECONDS
+from utils.singleflight import SingleFlight
+from utils.tracing import add_span
+
+# 单个网页最多占磁盘预算的比例，更大的正文只放内存层，避免一次写入就淘汰大半个缓存
+DISK_ENTRY_MAX_RATIO = 0.1
+
+
+class CachedPage:
+    """一次网页抓取的结果及其缓存元数据"""
+
+    def __init__(self, url: str, status: int, text: str = "",
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 expires_at: float = 0.0, no_cache: bool = False):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+        self.no_cache = no_cache  # 每次使用前都必须重新验证
+        self.size = len(text.encode("utf-8"))
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+    def is_fresh(self, now: float) -> bool:
+        return not self.no_cache and now < self.expires_at
+
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'status': self.status,
+            'text': self.text,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'expires_at': self.expires_at,
+            'no_cache': self.no_cache
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CachedPage":
+        return cls(**data)
+
+
+def parse_cache_control(value: Optional[str]) -> dict:
+    """解析 Cache-Control 头，返回 {指令: 值}"""
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if "=" in part:
+            key, _, val = part.partition("=")
+            directives[key.strip()] = val.strip().strip('"')
+        else:
+            directives[part] = None
+    return directives
+
+
+def _freshness_lifetime(headers, now: float) -> Optional[float]:
+    """
+    根据响应头计算新鲜期（秒）。
+    返回 None 表示不可缓存（no-store）。
+    """
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives:
+        return None
+    if "max-age" in directives:
+        try:
+            return max(float(directives["max-age"]), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return max(parsedate_to_datetime(expires).timestamp() - now, 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+    # 未声明缓存策略时使用启发式新鲜期
+    last_modified = headers.get("Last-Modified")
+    if last_modified:
+        try:
+            age = now - parsedate_to_datetime(last_modified).timestamp()
+            return min(max(age * 0.1, 0.0), float(PAGE_CACHE_DEFAULT_TTL))
+        except (TypeError, ValueError):
+            pass
+    return float(PAGE_CACHE_DEFAULT_TTL)
+
+
+class PageCache:
+    """
+    网页缓存：
+    - 内存层：按字节预算淘汰的 LRU
+    - 磁盘层：每个 URL 一个 JSON 文件，超出预算时删除最旧的文件
+    遵循 Cache-Control / Expires，过期后使用 ETag / Last-Modified 做条件请求，
+    命中 304 时只更新元数据，不再下载正文。
+    """
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR,
+                 memory_bytes: int = PAGE_CACHE_MEMORY_BYTES,
+                 disk_bytes: int = PAGE_CACHE_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, CachedPage]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used: Optional[int] = None
+        # 磁盘读写在线程池中执行，占用计数和淘汰需要加锁
+        self._disk_lock = threading.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._flights = SingleFlight()
+        self.counters = {
+            'hits': 0,  # 新鲜命中，没有发出请求
+            'misses': 0,  # 完整下载
+            'revalidated': 0,  # 条件请求返回 304
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'evictions': 0,
+            'errors': 0
+        }
+
+    # ---------- 网络 ----------
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            ssl_context = ssl.create_default_context(cafile=certifi.where())
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=ssl_context, limit=20, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=PAGE_FETCH_TIMEOUT)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ---------- 内存层 ----------
+
+    def _memory_get(self, url: str) -> Optional[CachedPage]:
+        page = self._memory.get(url)
+        if page is not None:
+            self._memory.move_to_end(url)
+        return page
+
+    def _memory_put(self, page: CachedPage):
+        old = self._memory.pop(page.url, None)
+        if old is not None:
+            self._memory_used -= old.size
+        if page.size > self.memory_bytes:
+            return
+        self._memory[page.url] = page
+        self._memory_used += page.size
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.size
+            self.counters['evictions'] += 1
+
+    # ---------- 磁盘层 ----------
+
+    def _disk_path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def _disk_read(self, url: str) -> Optional[CachedPage]:
+        path = self._disk_path(url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('url') != url:
+            return None
+        return CachedPage.from_dict(data)
+
+    def _disk_write(self, page: CachedPage):
+        path = self._disk_path(page.url)
+        if page.size > self.disk_bytes * DISK_ENTRY_MAX_RATIO:
+            # 不写入过大的正文；删除旧版本，避免之后读到过期的内容
+            with self._disk_lock:
+                self._disk_replace(path, None)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 同一 URL 可能被两个线程同时写入，临时文件名按线程区分
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(page.to_dict(), f, ensure_ascii=False)
+        with self._disk_lock:
+            self._disk_replace(path, tmp_path)
+            if self._disk_used > self.disk_bytes:
+                self._prune_disk()
+
+    def _disk_replace(self, path: str, tmp_path: Optional[str]):
+        """用 tmp_path 替换 path（为 None 时删除 path），并更新占用计数；调用方持有 _disk_lock"""
+        if self._disk_used is None:
+            self._disk_used = self._scan_disk_usage()
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if tmp_path is None:
+            if old_size:
+                os.remove(path)
+            new_size = 0
+        else:
+            os.replace(tmp_path, path)
+            new_size = os.path.getsize(path)
+        self._disk_used += new_size - old_size
+
+    def _cache_files(self):
+        """缓存目录中的缓存文件，不含其他线程正在写入的临时文件"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(root, name)
+
+    def _scan_disk_usage(self) -> int:
+        total = 0
+        for path in self._cache_files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def _prune_disk(self):
+        """删除最久未更新的文件，直到占用降到预算的 90%；调用方持有 _disk_lock"""
+        entries = []
+        for path in self._cache_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        used = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if used <= target:
+                break
+            try:
+                os.remove(path)
+                used -= size
+            except OSError:
+                pass
+        self._disk_used = used
+
+    async def _run_io(self, func, *args):
+        """磁盘读写放到线程池中执行，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def _lookup(self, url: str) -> Optional[CachedPage]:
+        page = self._memory_get(url)
+        if page is not None:
+            self.counters['memory_hits'] += 1
+            return page
+        page = await self._run_io(self._disk_read, url)
+        if page is not None:
+            self.counters['disk_hits'] += 1
+            self._memory_put(page)
+        return page
+
+    async def _store(self, page: CachedPage):
+        self._memory_put(page)
+        try:
+            await self._run_io(self._disk_write, page)
+        except OSError as e:
+            logging.warning(f"写入网页磁盘缓存失败: {e}")
+
+    # ---------- 对外接口 ----------
+
+    async def fetch(self, url: str) -> CachedPage:
+        """
+        获取网页内容，优先使用缓存；同一 URL 的并发请求合并为一次。
+        非 200 响应不会被缓存，但同样以 CachedPage 返回，调用方检查 status 即可。
+        """
+        return await self._flights.do(('page', url), lambda: self._fetch(url))
+
+    async def _fetch(self, url: str) -> CachedPage:
+        start = time.perf_counter()
+        result = 'error'
+        try:
+            page, result = await self._fetch_page(url)
+            return page
+        finally:
+            elapsed = time.perf_counter() - start
+            PAGE_FETCH_SECONDS.observe(elapsed, result=result)
+            add_span('fetch', f"fetch {result}", start, elapsed)
+
+    async def _fetch_page(self, url: str) -> Tuple[CachedPage, str]:
+        """返回 (网页, 结果)，结果为 hit / revalidated / miss / not_ok，用于统计耗时"""
+        now = time.time()
+        cached = await self._lookup(url)
+        if cached is not None and cached.is_fresh(now):
+            self.counters['hits'] += 1
+            return cached, 'hit'
+
+        headers = {}
+        if cached is not None and cached.has_validators():
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        try:
+            async with self._get_session().get(url, headers=headers) as response:
+                now = time.time()
+                lifetime = _freshness_lifetime(response.headers, now)
+                directives = parse_cache_control(response.headers.get("Cache-Control"))
+                no_cache = "no-cache" in directives
+
+                if response.status == 304 and cached is not None:
+                    self.counters['revalidated'] += 1
+                    cached.expires_at = now + (lifetime or 0.0)
+                    cached.no_cache = no_cache
+                    cached.etag = response.headers.get("ETag", cached.etag)
+                    cached.last_modified = response.headers.get("Last-Modified", cached.last_modified)
+                    await self._store(cached)
+                    return cached, 'revalidated'
+
+                self.counters['misses'] += 1
+                if response.status != 200:
+                    return CachedPage(url, response.status), 'not_ok'
+
+                text = await response.text()
+                page = CachedPage(
+                    url, response.status, text,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    expires_at=now + (lifetime or 0.0),
+                    no_cache=no_cache
+                )
+                PAGE_FETCH_BYTES.observe(page.size)
+                if lifetime is not None and (lifetime > 0 or page.has_validators()):
+                    await self._store(page)
+                return page, 'miss'
+        except Exception:
+            self.counters['errors'] += 1
+            raise
+
+    def stats(self) -> dict:
+        """返回命中/未命中等计数及当前占用"""
+        result = dict(self.counters)
+        result['memory_entries'] = len(self._memory)
+        result['memory_bytes'] = self._memory_used
+        result['disk_bytes'] = self._disk_used or 0
+        result['coalesced'] = self._flights.counters['followers']
+        return result
+
+    def format_stats(self) -> str:
+        """格式化缓存统计，用于命令回复"""
+        s = self.stats()
+        total = s['hits'] + s['misses'] + s['revalidated']
+        hit_rate = (s['hits'] + s['revalidated']) / total * 100 if total else 0.0
+        return (
+            f"🗄 网页缓存统计\n"
+            f"命中: {s['hits']}（内存 {s['memory_hits']} / 磁盘 {s['disk_hits']}）\n"
+            f"304 重新验证: {s['revalidated']}\n"
+            f"未命中: {s['misses']}\n"
+            f"命中率: {hit_rate:.1f}%\n"
+            f"内存: {s['memory_entries']} 条 / {s['memory_bytes'] // 1024} KB\n"
+            f"磁盘: {s['disk_bytes'] // 1024} KB\n"
+            f"合并的并发请求: {s['coalesced']}\n"
+            f"错误: {s['errors']}"
+        )
+
+
+_shared_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    """获取进程共享的网页缓存"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = PageCache()
+    return _shared_cache
+
+
+async def close_page_cache():
+    """应用退出时关闭抓取会话"""
+    if _shared_cache is not None:
+        await _shared_cache.close()
@@ -1,11 +1,19 @@
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Optional, Tuple
 
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select
 from sqlalchemy.orm import Session
 
-from modules.database import SessionLocal
+from modules.database import SessionLocal, AsyncSessionLocal
+from modules.link.jobs import new_job
 from modules.link.models import Link
+from modules.pagination import Page, finish_page, keyset_query
+
+
+def _unread_page_query(user_id: int, cursor: Optional[Tuple], forward: bool, limit: int):
+    # 按 (created_at, id) 倒序，走 idx_links_user_unread_created 索引
+    query = select(Link).where(Link.user_id == user_id, Link.is_read == False)
+    return keyset_query(query, (Link.created_at, Link.id), cursor, forward, descending=True, limit=limit)
 
 
 class LinkRepository:
@@ -55,7 +63,7 @@ class LinkRepository:
             return False
 
         link.is_read = True
-        link.read_at = datetime.utcnow()
+        link.read_at = datetime.now(timezone.utc)
         self.db.commit()
         return True
 
@@ -81,3 +89,134 @@ class LinkRepository:
             .filter_by(user_id=user_id, is_read=False) \
             .order_by(desc(Link.created_at)) \
             .first()
+
+    def get_unread_page(self, user_id: int, cursor: Optional[Tuple] = None, forward: bool = True,
+                        limit: int = 5) -> Page:
+        """
+        keyset 分页获取未读链接，按保存时间倒序。
+        cursor 为当前页首条/末条的 (created_at, id)，None 表示第一页
+        """
+        rows = self.db.execute(_unread_page_query(user_id, cursor, forward, limit)).scalars().all()
+        return finish_page(rows, limit, forward, cursor is not None)
+
+
+class AsyncLinkRepository:
+    """LinkRepository 的异步版本，每次调用使用独立的 AsyncSession"""
+
+    async def create(self, user_id: int, url: str, title: Optional[str] = None,
+                     job_kind: Optional[str] = None) -> Link:
+        """创建新的链接记录；指定 job_kind 时在同一事务中入队该类型的后台任务"""
+        async with AsyncSessionLocal() as db:
+            link = Link(
+                user_id=user_id,
+                url=url,
+                title=title,
+                is_read=False
+            )
+            db.add(link)
+            if job_kind:
+                # 先 flush 取得链接 ID；链接和任务一起提交，不会出现没有任务的链接
+                await db.flush()
+                db.add(new_job(link.id, job_kind))
+            await db.commit()
+            await db.refresh(link)
+            return link
+
+    async def get_by_id(self, link_id: int) -> Optional[Link]:
+        """通过ID获取链接"""
+        async with AsyncSessionLocal() as db:
+            return await db.get(Link, link_id)
+
+    async def get_by_url(self, user_id: int, url: str) -> Optional[Link]:
+        """获取用户最近保存的指定 URL 的链接"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Link)
+                .where(Link.user_id == user_id, Link.url == url)
+                .order_by(desc(Link.created_at))
+                .limit(1)
+            )
+            return result.scalars().first()
+
+    async def get_unread_links(self, user_id: int, limit: int = None):
+        """获取未读链接列表，默认按创建时间倒序排列"""
+        query = select(Link) \
+            .where(Link.user_id == user_id, Link.is_read == False) \
+            .order_by(desc(Link.created_at))
+        if limit:
+            query = query.limit(limit)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            return result.scalars().all()
+
+    async def get_random_unread_link(self, user_id: int) -> Optional[Link]:
+        """随机获取一个未读链接"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Link)
+                .where(Link.user_id == user_id, Link.is_read == False)
+                .order_by(func.random())
+                .limit(1)
+            )
+            return result.scalars().first()
+
+    async def mark_as_read(self, link_id: int) -> bool:
+        """将链接标记为已读"""
+        async with AsyncSessionLocal() as db:
+            link = await db.get(Link, link_id)
+            if not link:
+                return False
+
+            link.is_read = True
+            link.read_at = datetime.now(timezone.utc)
+            await db.commit()
+            return True
+
+    async def update_title(self, link_id: int, title: str) -> bool:
+        """更新链接标题"""
+        async with AsyncSessionLocal() as db:
+            link = await db.get(Link, link_id)
+            if not link:
+                return False
+
+            link.title = title
+            await db.commit()
+            return True
+
+    async def update_summary(self, link_id: int, summary: str) -> bool:
+        """更新链接的AI摘要"""
+        async with AsyncSessionLocal() as db:
+            link = await db.get(Link, link_id)
+            if not link:
+                return False
+
+            link.summary = summary
+            await db.commit()
+            return True
+
+    async def get_unread_count(self, user_id: int) -> int:
+        """获取用户未读链接数量"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(func.count(Link.id))
+                .where(Link.user_id == user_id, Link.is_read == False)
+            )
+            return result.scalar()
+
+    async def get_latest_unread_link(self, user_id: int) -> Optional[Link]:
+        """获取最新添加的未读链接"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Link)
+                .filter_by(user_id=user_id, is_read=False)
+                .order_by(desc(Link.created_at))
+                .limit(1)
+            )
+            return result.scalars().first()
+
+    async def get_unread_page(self, user_id: int, cursor: Optional[Tuple] = None, forward: bool = True,
+                              limit: int = 5) -> Page:
+        """keyset 分页获取未读链接（异步），参数同 LinkRepository.get_unread_page"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(_unread_page_query(user_id, cursor, forward, limit))
+            return finish_page(result.scalars().all(), limit, forward, cursor is not None)
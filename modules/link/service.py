@@ -1,27 +1,32 @@
+import asyncio
 import logging
 import re
 import html
-from typing import Optional, Tuple, List
+from typing import AsyncIterator, Dict, Optional, Tuple, List
 
-import aiohttp
 from bs4 import BeautifulSoup
 
+from bot.config import DIGEST_BATCH_SIZE, UNREAD_PAGE_SIZE
 from modules.link.ai_service import AIService
-from modules.link.repository import LinkRepository
+from modules.link.extractor import prepare_content
+from modules.link.jobs import get_enrichment_queue
+from modules.link.page_cache import get_page_cache
+from modules.link.repository import LinkRepository, AsyncLinkRepository
 from modules.database import SessionLocal
-from modules.link.models import Link
+from modules.link.models import Link, LinkJob
+from modules.pagination import Page, decode_time, encode_time
+from utils.render import render_link_info
+from utils.tracing import traced
 
 
 async def fetch_title(url: str) -> Optional[str]:
     """通过网络请求获取网页的标题"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, "html.parser")
-                    if soup.title and soup.title.string:
-                        return soup.title.string.strip()
+        page = await get_page_cache().fetch(url)
+        if page.ok:
+            soup = BeautifulSoup(page.text, "html.parser")
+            if soup.title and soup.title.string:
+                return soup.title.string.strip()
     except Exception as e:
         # 可根据需要记录日志
         return None
@@ -30,7 +35,9 @@ async def fetch_title(url: str) -> Optional[str]:
 class LinkService:
     def __init__(self):
         self.repository = LinkRepository()
+        self.async_repository = AsyncLinkRepository()
         self.ai_service = AIService()
+        self.job_queue = get_enrichment_queue()
 
     def clean_html(self, text: str) -> str:
         """清理HTML标签并转义特殊字符"""
@@ -40,6 +47,7 @@ class LinkService:
         text = html.escape(text)
         return text
 
+    @traced()
     async def extract_url_and_title(self, text: str) -> Tuple[str, Optional[str]]:
         """
         从文本中提取 URL 和标题。
@@ -60,20 +68,18 @@ class LinkService:
         # 如果未提供标题，则尝试使用 AI 生成
         if not title:
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            content = await response.text()
-                            # 使用 AI 服务生成标题
-                            title = await self.ai_service.generate_title(url, content)
+                content = await self._fetch_text(url, 'title')
+                # 使用 AI 服务生成标题
+                title = await self.ai_service.generate_title(url, content)
             except Exception as e:
                 logging.error(f"生成标题时发生错误: {e}")
                 title = None
 
         return url, title
 
+    @traced()
     async def save_link(self, user_id: int, text: str) -> str:
-        """保存链接并返回提示信息"""
+        """保存链接并返回提示信息，标题和摘要由后台任务补全"""
         try:
             # 首先尝试从文本中提取URL和用户可能提供的标题
             url_pattern = r'https?://[^\s]+'
@@ -86,60 +92,43 @@ class LinkService:
             
             if user_title:
                 user_title = self.clean_html(user_title)  # 清理标题中的HTML
-            
-            db = SessionLocal()
-            try:
-                link = Link(
-                    user_id=user_id,
-                    url=url,
-                    title=user_title,
-                    is_read=False
-                )
-                db.add(link)
-                db.commit()
-                db.refresh(link)
-                link_id = link.id
-                
-                # 在后台异步生成标题
-                if not user_title:
-                    self._update_title_async(url, link_id)
-                
-                return f"✅ 链接已保存！\n🔗 ID: {link_id}\n📝 标题: {user_title if user_title else '生成中...'}"
-            finally:
-                db.close()
+
+            # 链接和后台补全任务（生成标题、抓取正文、预生成摘要）在同一事务中写入
+            link = await self.async_repository.create(user_id, url, user_title, job_kind='enrich')
+            link_id = link.id
+            self.job_queue.notify()
+
+            return f"✅ 链接已保存！\n🔗 ID: {link_id}\n📝 标题: {user_title if user_title else '生成中...'}"
         except Exception as e:
             logging.error(f"保存链接时发生错误: {e}")
             return "❌ 保存链接时发生错误"
-    
-    async def _update_title_async(self, url: str, link_id: int) -> None:
-        """异步更新链接标题"""
-        try:
-            # 尝试获取并生成标题
-            title = None
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            content = await response.text()
-                            # 使用 AI 服务生成标题
-                            title = await self.ai_service.generate_title(url, content)
-            except Exception as e:
-                logging.error(f"生成标题时发生错误: {e}")
-                return
-            
+
+    @traced()
+    async def enrich_link(self, link_id: int) -> None:
+        """
+        后台补全链接：抓取正文，缺少标题时生成标题，并预生成摘要。
+        已完成的步骤会被跳过，失败时抛出异常由任务队列重试。
+        """
+        link = await self.async_repository.get_by_id(link_id)
+        if not link:
+            logging.warning(f"补全链接时未找到链接 {link_id}")
+            return
+
+        if not link.title:
+            content = await self._fetch_text(link.url, 'title')
+            title = await self.ai_service.generate_title(link.url, content)
             if title:
-                title = self.clean_html(title)
-                # 更新数据库中的标题
-                db = SessionLocal()
-                try:
-                    link = db.query(Link).filter(Link.id == link_id).first()
-                    if link:
-                        link.title = title
-                        db.commit()
-                finally:
-                    db.close()
-        except Exception as e:
-            logging.error(f"异步更新标题时发生错误: {e}")
+                await self.async_repository.update_title(link_id, self.clean_html(title))
+
+        if not link.summary:
+            await self.summarize(link.url, link)
+
+    async def process_job(self, job: LinkJob) -> None:
+        """任务队列的处理入口"""
+        if job.kind == 'enrich':
+            await self.enrich_link(job.link_id)
+        else:
+            logging.warning(f"未知的链接任务类型: {job.kind}")
 
     def get_unread_summary(self, user_id: int) -> str:
         """获取未读链接统计信息"""
@@ -148,16 +137,16 @@ class LinkService:
             return "📚 您现在没有未读的链接"
         return f"📚 您还有 {count} 个链接未读"
 
+    async def get_unread_summary_async(self, user_id: int) -> str:
+        """获取未读链接统计信息（异步）"""
+        count = await self.async_repository.get_unread_count(user_id)
+        if count == 0:
+            return "📚 您现在没有未读的链接"
+        return f"📚 您还有 {count} 个链接未读"
+
     def format_link_info(self, link) -> str:
         """格式化链接信息"""
-        result = f"🔗 链接 {link.id}:\n"
-        if link.title:
-            result += f"📝 标题: {link.title}\n"
-        result += f"🌐 URL: {link.url}\n"
-        if link.summary:
-            result += f"📋 摘要: {link.summary}\n"
-        result += f"⏰ 保存时间: {link.created_at.strftime('%Y-%m-%d %H:%M')}"
-        return result
+        return render_link_info(link)
 
     def get_random_unread_link(self, user_id: int) -> str:
         """获取随机未读链接"""
@@ -166,18 +155,38 @@ class LinkService:
             return "📭 没有未读的链接"
         return self.format_link_info(link)
 
+    async def get_random_unread_link_async(self, user_id: int) -> str:
+        """获取随机未读链接（异步）"""
+        link = await self.async_repository.get_random_unread_link(user_id)
+        if not link:
+            return "📭 没有未读的链接"
+        return self.format_link_info(link)
+
     def mark_as_read(self, link_id: int) -> str:
         """将链接标记为已读"""
         if self.repository.mark_as_read(link_id):
             return f"✅ 链接 {link_id} 已标记为已读"
         return f"❌ 链接 {link_id} 不存在"
 
+    @traced()
+    async def mark_as_read_async(self, link_id: int) -> str:
+        """将链接标记为已读（异步）"""
+        if await self.async_repository.mark_as_read(link_id):
+            return f"✅ 链接 {link_id} 已标记为已读"
+        return f"❌ 链接 {link_id} 不存在"
+
     def update_summary(self, link_id: int, summary: str) -> str:
         """更新链接摘要"""
         if self.repository.update_summary(link_id, summary):
             return f"✅ 链接摘要已更新：\n\n{summary}"
         return f"❌ 更新摘要失败：链接 {link_id} 不存在"
 
+    async def update_summary_async(self, link_id: int, summary: str) -> str:
+        """更新链接摘要（异步）"""
+        if await self.async_repository.update_summary(link_id, summary):
+            return f"✅ 链接摘要已更新：\n\n{summary}"
+        return f"❌ 更新摘要失败：链接 {link_id} 不存在"
+
     def get_latest_unread_link(self, user_id: int) -> str:
         """获取最新添加的未读链接信息"""
         link = self.repository.get_latest_unread_link(user_id)
@@ -185,6 +194,13 @@ class LinkService:
             return "📭 没有未读的链接"
         return self.format_link_info(link)
 
+    async def get_latest_unread_link_async(self, user_id: int) -> str:
+        """获取最新添加的未读链接信息（异步）"""
+        link = await self.async_repository.get_latest_unread_link(user_id)
+        if not link:
+            return "📭 没有未读的链接"
+        return self.format_link_info(link)
+
     def get_unread_links(self, user_id: int, limit: int = 5) -> List[Link]:
         """
         获取指定用户的最近未读链接，最多返回 limit 条
@@ -200,37 +216,199 @@ class LinkService:
         finally:
             db.close()
 
-    async def generate_summary(self, url: str) -> str:
-        """生成链接内容的摘要"""
+    async def get_unread_links_async(self, user_id: int, limit: int = 5) -> List[Link]:
+        """
+        获取指定用户的最近未读链接（异步），最多返回 limit 条
+        """
+        return await self.async_repository.get_unread_links(user_id, limit=limit)
+
+    @staticmethod
+    def encode_unread_cursor(link: Link) -> str:
+        """把链接的分页排序键 (created_at, id) 编码为回调数据中的游标"""
+        return f"{encode_time(link.created_at)}:{link.id}"
+
+    @staticmethod
+    def decode_unread_cursor(value: str) -> Tuple:
+        """
+        encode_unread_cursor 的逆操作
+
+        Raises:
+            ValueError: 游标格式错误
+        """
+        parts = value.split(':')
+        if len(parts) != 2:
+            raise ValueError("无效的分页参数")
+        return decode_time(parts[0], aware=True), int(parts[1])
+
+    @traced()
+    async def get_unread_page_async(self, user_id: int, cursor: Optional[str] = None,
+                                    forward: bool = True) -> Page:
+        """分页获取未读链接，按保存时间倒序；cursor 为 None 时返回第一页"""
+        key = self.decode_unread_cursor(cursor) if cursor else None
+        return await self.async_repository.get_unread_page(user_id, key, forward, UNREAD_PAGE_SIZE)
+
+    @traced()
+    async def _fetch_text(self, url: str, task: str) -> str:
+        """
+        获取网页（优先使用缓存）并经过统一的提取阶段：
+        提取正文、规范化空白，并裁剪到该任务的 token 预算。
+        解析 HTML 较耗 CPU，放到线程池中执行。
+
+        Raises:
+            ValueError: 网页无法访问
+        """
+        page = await get_page_cache().fetch(url)
+        if not page.ok:
+            raise ValueError(f"无法访问链接，状态码：{page.status}")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, prepare_content, page.text, task)
+
+    @traced()
+    async def summarize(self, url: str, link: Optional[Link] = None) -> str:
+        """
+        生成链接内容的摘要，内容未变化时直接返回缓存结果。
+        传入 link 时会把摘要写回 Link.summary。
+
+        Raises:
+            ValueError: 网页无法访问
+        """
+        text = await self._fetch_text(url, 'summary')
+        summary = self._clean_summary(await self.ai_service.generate_summary(url, text))
+        await self._write_back_summary(link, summary)
+        return summary
+
+    @staticmethod
+    def _clean_summary(summary: str) -> str:
+        """确保摘要为纯文本"""
+        if summary:
+            # 移除所有可能的HTML标签
+            summary = re.sub(r'<[^>]+>', '', summary)
+            # 移除多余的空白字符
+            summary = ' '.join(summary.split())
+        return summary
+
+    async def _write_back_summary(self, link: Optional[Link], summary: str):
+        """摘要有变化时写回 Link.summary"""
+        if summary and link is not None and link.summary != summary:
+            await self.async_repository.update_summary(link.id, summary)
+            link.summary = summary
+
+    def start_summaries(self, links: List[Link], concurrency: int, timeout: float,
+                        batch_size: int) -> List[Tuple[List[Link], asyncio.Task]]:
+        """
+        按顺序把链接分成每组 batch_size 个，每组启动一个任务：
+        先抓取并提取正文（排队等待信号量的时间也计入单条时限），再合并为一次摘要请求（单独计时）。
+        各组并行运行，调用方可以按顺序等待，前面的组完成后立即使用其结果。
+
+        Returns:
+            [(该组链接, 任务)]，任务的结果为 {链接ID: 摘要}，抓取失败、超时或生成失败的链接不包含在结果中，
+            任务本身不会抛出异常（被取消除外）
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(link: Link) -> str:
+            async with semaphore:
+                return await self._fetch_text(link.url, 'summary')
+
+        async def summarize_group(group: List[Link]) -> Dict[int, str]:
+            texts = await asyncio.gather(
+                *(asyncio.wait_for(fetch(link), timeout=timeout) for link in group),
+                return_exceptions=True
+            )
+            items = []
+            for link, text in zip(group, texts):
+                if isinstance(text, Exception):
+                    logging.warning(f"抓取链接内容失败 (URL: {link.url}): {type(text).__name__} {text}")
+                    continue
+                items.append((link.id, link.url, text))
+            if not items:
+                return {}
+
+            try:
+                summaries = await self.ai_service.generate_summaries(items, timeout=timeout)
+            except Exception as e:
+                logging.error(f"批量生成摘要失败，共 {len(items)} 条: {e}")
+                return {}
+
+            results = {}
+            for link in group:
+                summary = self._clean_summary(summaries.get(link.id, ''))
+                if not summary:
+                    continue
+                results[link.id] = summary
+                try:
+                    await self._write_back_summary(link, summary)
+                except Exception as e:
+                    logging.error(f"写回链接摘要失败 (ID: {link.id}): {e}")
+            return results
+
+        size = max(1, batch_size)
+        groups = [links[i:i + size] for i in range(0, len(links), size)]
+        return [(group, asyncio.ensure_future(summarize_group(group))) for group in groups]
+
+    @traced()
+    async def summarize_many(self, links: List[Link], concurrency: int, timeout: float,
+                             batch_size: int = DIGEST_BATCH_SIZE) -> Dict[int, str]:
+        """
+        批量生成多个链接的摘要，分组方式见 start_summaries
+
+        Returns:
+            {链接ID: 摘要}，抓取失败、超时或生成失败的链接不包含在结果中
+        """
+        groups = self.start_summaries(links, concurrency, timeout, batch_size)
+        results = {}
         try:
-            # 获取网页内容
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        return "无法获取网页内容"
-                    html_content = await response.text()
-
-            # 解析网页内容
-            soup = BeautifulSoup(html_content, 'html.parser')
-            # 移除脚本和样式
-            for script in soup(["script", "style"]):
-                script.decompose()
-            # 获取纯文本
-            text = soup.get_text()
-            
-            # 清理文本：移除多余空白
-            lines = (line.strip() for line in text.splitlines())
-            text = ' '.join(line for line in lines if line)
-            
-            # 使用 AI 生成摘要，限制输入长度
-            summary = await self.ai_service.generate_summary(url, text[:5000])
-            # 确保返回纯文本
-            if summary:
-                # 移除所有可能的HTML标签
-                summary = re.sub(r'<[^>]+>', '', summary)
-                # 移除多余的空白字符
-                summary = ' '.join(summary.split())
-            return summary
+            for _, task in groups:
+                results.update(await task)
+        finally:
+            for _, task in groups:
+                task.cancel()
+        return results
+
+    async def stream_summary(self, url: str, link: Optional[Link] = None) -> AsyncIterator[str]:
+        """
+        流式生成摘要，每收到新内容产出一次累计文本；
+        最后一次产出的是清理后的最终摘要，并写回 Link.summary。
+
+        Raises:
+            ValueError: 网页无法访问
+        """
+        text = await self._fetch_text(url, 'summary')
+        summary = ""
+        async for summary in self.ai_service.stream_summary(url, text):
+            yield summary
+        summary = self._clean_summary(summary)
+        await self._write_back_summary(link, summary)
+        yield summary
+
+    async def stream_explanation(self, url: str) -> AsyncIterator[str]:
+        """
+        流式生成详细解释，每收到新内容产出一次累计文本。
+
+        Raises:
+            ValueError: 网页无法访问
+        """
+        text = await self._fetch_text(url, 'explain')
+        async for explanation in self.ai_service.stream_explanation(url, text):
+            yield explanation
+
+    @traced()
+    async def explain(self, url: str) -> str:
+        """
+        生成链接内容的详细解释，内容未变化时直接返回缓存结果。
+
+        Raises:
+            ValueError: 网页无法访问
+        """
+        text = await self._fetch_text(url, 'explain')
+        return await self.ai_service.generate_explanation(url, text)
+
+    async def generate_summary(self, url: str, link: Optional[Link] = None) -> str:
+        """生成链接内容的摘要，失败时返回提示文本"""
+        try:
+            return await self.summarize(url, link)
+        except ValueError:
+            return "无法获取网页内容"
         except Exception as e:
             logging.error(f"生成摘要失败: {e}")
             return "生成摘要时发生错误"
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import re
+import time
+
+from telegram import Message
+from telegram.constants import MessageLimit, ParseMode
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from bot.config import STREAM_EDIT_INTERVAL
+from utils.render import split_html
+
+# 模型没有生成任何可见内容时显示的文本
+EMPTY_RESULT_TEXT = "⚠️ 没有生成任何内容，请稍后重试"
+_TAG = re.compile(r"<[^>]*>")
+
+
+class StreamingReply:
+    """
+    把流式生成的文本渐进地编辑到同一条 Telegram 消息中。
+    生成过程中按纯文本显示并限制编辑频率，结束后替换为清理过的 HTML 最终结果。
+    """
+
+    def __init__(self, message: Message, interval: float = STREAM_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self._last_edit = 0.0
+        self._last_text = None
+
+    async def _edit(self, text: str, parse_mode=None, final: bool = False) -> bool:
+        """编辑消息，返回是否成功；final 为 True 时被限流会等待 retry_after 后重试一次"""
+        if text == self._last_text:
+            return True
+        try:
+            await self.message.edit_text(text, parse_mode=parse_mode, disable_web_page_preview=True)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True
+            if parse_mode is None:
+                logging.warning(f"编辑流式消息失败: {e}")
+            return False
+        except RetryAfter as e:
+            if final:
+                # 最终结果必须送达，否则消息停留在被截断的中间状态
+                logging.warning(f"编辑流式消息被限流，{e.retry_after}s 后重试最终结果")
+                await asyncio.sleep(float(e.retry_after))
+                return await self._edit(text, parse_mode)
+            # 触发限流时跳过本次中间更新
+            logging.warning(f"编辑流式消息被限流，{e.retry_after}s 内跳过更新")
+            self._last_edit = time.monotonic() + float(e.retry_after)
+            return False
+        except TelegramError as e:
+            logging.warning(f"编辑流式消息失败: {e}")
+            return False
+        self._last_text = text
+        return True
+
+    async def update(self, text: str):
+        """收到新的累计文本时调用，距上次编辑不足 interval 时忽略"""
+        now = time.monotonic()
+        if now - self._last_edit < self.interval or not text.strip():
+            return
+        self._last_edit = now
+        limit = MessageLimit.MAX_TEXT_LENGTH - 2
+        preview = text if len(text) <= limit else text[:limit - 1] + "…"
+        await self._edit(f"{preview} ▌")
+
+    async def finish(self, html_text: str, empty_text: str = EMPTY_RESULT_TEXT):
+        """
+        用最终结果替换消息；超过长度限制的部分作为新消息发送，切分处不会破坏标签。
+        结果没有可见文本时（Telegram 会拒绝空消息）改为显示 empty_text
+        """
+        if not _TAG.sub("", html_text).strip():
+            if not await self._edit(empty_text, final=True):
+                logging.warning("流式结果为空，且无法更新状态消息")
+            return
+        chunks = split_html(html_text)
+        if not await self._edit(chunks[0], parse_mode=ParseMode.HTML, final=True):
+            # HTML 解析失败时退回纯文本
+            await self._edit(chunks[0], final=True)
+        for chunk in chunks[1:]:
+            try:
+                await self.message.reply_text(chunk, parse_mode=ParseMode.HTML)
+            except BadRequest:
+                await self.message.reply_text(chunk)
@@ -0,0 +1,3 @@
+from modules.migrations.runner import run_migrations, pending_migrations
+
+__all__ = ['run_migrations', 'pending_migrations']
@@ -0,0 +1,101 @@
+import importlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), 'versions')
+# 文件名格式：0001_描述.sql 或 0001_描述.py（.py 文件需提供 upgrade(conn) 函数）
+_FILENAME = re.compile(r'^(\d{4})_([a-z0-9_]+)\.(sql|py)$')
+# 多个进程同时启动时只允许一个执行迁移
+_ADVISORY_LOCK_ID = 7468201
+
+
+@dataclass
+class Migration:
+    version: str
+    name: str
+    path: str
+
+    def apply(self, conn: Connection):
+        if self.path.endswith('.sql'):
+            with open(self.path, encoding='utf-8') as f:
+                conn.exec_driver_sql(f.read())
+        else:
+            module = importlib.import_module(f"modules.migrations.versions.{self.version}_{self.name}")
+            module.upgrade(conn)
+
+
+def discover_migrations() -> List[Migration]:
+    """按版本号列出 versions 目录下的所有迁移"""
+    migrations = []
+    for filename in os.listdir(VERSIONS_DIR):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(VERSIONS_DIR, filename)))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"迁移版本号重复: {versions}")
+    return migrations
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version VARCHAR(16) PRIMARY KEY,"
+        " name TEXT NOT NULL,"
+        " applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def _applied_versions(conn: Connection) -> set:
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    """返回尚未执行的迁移"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        applied = _applied_versions(conn)
+    return [m for m in discover_migrations() if m.version not in applied]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    按版本号依次执行未执行的迁移，每个迁移在独立事务中执行并记录到 schema_migrations。
+    某个迁移失败时回滚该迁移并抛出异常，后续迁移不会执行。
+
+    Returns:
+        本次执行的迁移版本号列表
+    """
+    executed = []
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {'id': _ADVISORY_LOCK_ID})
+        try:
+            with engine.begin() as conn:
+                _ensure_version_table(conn)
+                applied = _applied_versions(conn)
+
+            for migration in discover_migrations():
+                if migration.version in applied:
+                    continue
+                logging.info(f"执行数据库迁移 {migration.version}_{migration.name}")
+                with engine.begin() as conn:
+                    migration.apply(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                        {'version': migration.version, 'name': migration.name}
+                    )
+                executed.append(migration.version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': _ADVISORY_LOCK_ID})
+            lock_conn.commit()
+
+    if executed:
+        logging.info(f"数据库迁移完成: {', '.join(executed)}")
+    return executed
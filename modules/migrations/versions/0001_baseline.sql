@@ -0,0 +1,52 @@
+-- 基线：与迁移系统引入前 create_all / init.sql 建出的表结构一致，已存在的表保持不变
+
+CREATE TABLE IF NOT EXISTS todos (
+    todo_id SERIAL PRIMARY KEY,
+    create_time TIMESTAMP WITHOUT TIME ZONE,
+    end_time TIMESTAMP WITHOUT TIME ZONE,
+    todo_name TEXT NOT NULL,
+    status VARCHAR(20)
+);
+
+-- 由 init.sql 建出的 todos 表只有 is_completed，没有 status
+ALTER TABLE todos ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'pending';
+
+CREATE TABLE IF NOT EXISTS links (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    is_read BOOLEAN,
+    summary TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    read_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS ai_results (
+    id SERIAL PRIMARY KEY,
+    task VARCHAR(20) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    prompt_version VARCHAR(20) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    url TEXT,
+    result TEXT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE,
+    CONSTRAINT uq_ai_results_key UNIQUE (task, model, prompt_version, content_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_results_task_url ON ai_results (task, url);
+
+CREATE TABLE IF NOT EXISTS link_jobs (
+    id SERIAL PRIMARY KEY,
+    link_id INTEGER NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    attempts INTEGER NOT NULL,
+    run_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    locked_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_link_jobs_status_run_at ON link_jobs (status, run_at);
@@ -0,0 +1,29 @@
+"""
+todos 的时间列改为 TIMESTAMP WITH TIME ZONE。
+
+旧数据按 TIMEZONE 的本地时间写入（psycopg2 写入带时区的值时会丢掉偏移量），
+因此按 TIMEZONE 解释后转换；已经是 timestamptz 的列（init.sql 建表）保持不变。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from bot.config import TIMEZONE
+
+COLUMNS = ('create_time', 'end_time')
+
+
+def upgrade(conn: Connection):
+    for column in COLUMNS:
+        data_type = conn.execute(
+            text(
+                "SELECT data_type FROM information_schema.columns"
+                " WHERE table_name = 'todos' AND column_name = :column"
+            ),
+            {'column': column}
+        ).scalar()
+        if data_type != 'timestamp without time zone':
+            continue
+        conn.execute(text(
+            f"ALTER TABLE todos ALTER COLUMN {column} TYPE TIMESTAMP WITH TIME ZONE"
+            f" USING {column} AT TIME ZONE '{TIMEZONE.zone}'"
+        ))
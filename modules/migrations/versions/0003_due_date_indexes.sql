@@ -0,0 +1,12 @@
+-- 按截止时间范围查询未完成的待办（今日 / 明日提醒）
+CREATE INDEX IF NOT EXISTS idx_todos_pending_end_time
+    ON todos (end_time)
+    WHERE status = 'pending' AND end_time IS NOT NULL;
+
+-- 按用户列出未读链接，按保存时间倒序
+CREATE INDEX IF NOT EXISTS idx_links_user_unread_created
+    ON links (user_id, created_at DESC)
+    WHERE NOT is_read;
+
+-- 已被上面的部分索引覆盖
+DROP INDEX IF EXISTS idx_links_is_read;
@@ -0,0 +1,9 @@
+-- /demo、/demoz 按 (status, create_time, todo_id) keyset 分页
+CREATE INDEX IF NOT EXISTS idx_todos_status_create_time
+    ON todos (status, create_time, todo_id);
+
+-- /unread 按 (created_at, id) keyset 分页，id 用于同一时间的多条链接之间定序
+DROP INDEX IF EXISTS idx_links_user_unread_created;
+CREATE INDEX IF NOT EXISTS idx_links_user_unread_created
+    ON links (user_id, created_at DESC, id DESC)
+    WHERE NOT is_read;
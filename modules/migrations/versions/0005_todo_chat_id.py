@@ -0,0 +1,37 @@
+"""
+todos 增加 chat_id 列，待办事项按会话隔离。
+
+此前只有单个会话使用，已有数据归属于配置的 CHAT_ID；
+未配置 CHAT_ID 时归属于 0，需要手动 UPDATE 到实际的会话。
+索引改为以 chat_id 开头，替换 0003、0004 中不区分会话的索引。
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from bot.config import CHAT_ID
+
+
+def upgrade(conn: Connection):
+    conn.execute(text("ALTER TABLE todos ADD COLUMN IF NOT EXISTS chat_id BIGINT"))
+
+    owner = int(CHAT_ID) if CHAT_ID else 0
+    updated = conn.execute(
+        text("UPDATE todos SET chat_id = :chat_id WHERE chat_id IS NULL"),
+        {'chat_id': owner}
+    ).rowcount
+    if updated and not CHAT_ID:
+        logging.warning(f"未配置 CHAT_ID，{updated} 条已有待办事项归属于 chat_id = 0")
+    conn.execute(text("ALTER TABLE todos ALTER COLUMN chat_id SET NOT NULL"))
+
+    conn.execute(text("DROP INDEX IF EXISTS idx_todos_pending_end_time"))
+    conn.execute(text("DROP INDEX IF EXISTS idx_todos_status_create_time"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_todos_chat_pending_end_time ON todos (chat_id, end_time)"
+        " WHERE status = 'pending' AND end_time IS NOT NULL"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_todos_chat_status_create_time"
+        " ON todos (chat_id, status, create_time, todo_id)"
+    ))
@@ -0,0 +1,14 @@
+-- 每个会话的定时提醒：提醒时间和时区按会话保存，每分钟按 next_fire_at 取出到期的提醒
+CREATE TABLE IF NOT EXISTS reminders (
+    chat_id BIGINT NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    local_time TIME NOT NULL,
+    timezone VARCHAR(64) NOT NULL,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    next_fire_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (chat_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reminders_next_fire_at
+    ON reminders (next_fire_at)
+    WHERE enabled;
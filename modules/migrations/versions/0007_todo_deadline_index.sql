@@ -0,0 +1,4 @@
+-- 截止提醒定时器按截止时间跨会话加载未来一段时间内的未完成待办
+CREATE INDEX IF NOT EXISTS idx_todos_pending_end_time
+    ON todos (end_time)
+    WHERE status = 'pending' AND end_time IS NOT NULL;
@@ -0,0 +1,27 @@
+"""
+links 的时间列改为 TIMESTAMP WITH TIME ZONE，与 init.sql 建表和 todos 保持一致。
+
+旧数据由 datetime.utcnow() 写入，按 UTC 解释后转换；已经是 timestamptz 的列（init.sql 建表）保持不变。
+分页游标按列是否带时区编码，两种建表方式统一后游标才能在所有库上往返。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+COLUMNS = ('created_at', 'read_at')
+
+
+def upgrade(conn: Connection):
+    for column in COLUMNS:
+        data_type = conn.execute(
+            text(
+                "SELECT data_type FROM information_schema.columns"
+                " WHERE table_name = 'links' AND column_name = :column"
+            ),
+            {'column': column}
+        ).scalar()
+        if data_type != 'timestamp without time zone':
+            continue
+        conn.execute(text(
+            f"ALTER TABLE links ALTER COLUMN {column} TYPE TIMESTAMP WITH TIME ZONE"
+            f" USING {column} AT TIME ZONE 'UTC'"
+        ))
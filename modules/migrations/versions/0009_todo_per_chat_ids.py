@@ -0,0 +1,26 @@
+"""
+待办编号改为按会话分配：主键改为 (chat_id, todo_id)，编号由 todo_counters 按会话递增。
+
+已有事项保留原编号（此前全局唯一，会话内自然不重复），各会话的新编号从该会话当前的最大编号继续；
+不再使用 todos 的自增序列。init.sql 建表时主键和计数表已存在，重复执行结果相同。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS todo_counters ("
+        " chat_id BIGINT PRIMARY KEY,"
+        " last_id INTEGER NOT NULL)"
+    ))
+    conn.execute(text(
+        "INSERT INTO todo_counters (chat_id, last_id)"
+        " SELECT chat_id, MAX(todo_id) FROM todos GROUP BY chat_id"
+        " ON CONFLICT (chat_id) DO UPDATE SET last_id = GREATEST(todo_counters.last_id, EXCLUDED.last_id)"
+    ))
+
+    conn.execute(text("ALTER TABLE todos DROP CONSTRAINT IF EXISTS todos_pkey"))
+    conn.execute(text("ALTER TABLE todos ADD CONSTRAINT todos_pkey PRIMARY KEY (chat_id, todo_id)"))
+    conn.execute(text("ALTER TABLE todos ALTER COLUMN todo_id DROP DEFAULT"))
+    conn.execute(text("DROP SEQUENCE IF EXISTS todos_todo_id_seq"))
@@ -0,0 +1,20 @@
+"""
+ai_results.created_at 改为 TIMESTAMP WITH TIME ZONE，与 init.sql 建表、links 和 todos 保持一致。
+
+旧数据由 datetime.utcnow() 写入，按 UTC 解释后转换；已经是 timestamptz 的列（init.sql 建表）保持不变。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection):
+    data_type = conn.execute(text(
+        "SELECT data_type FROM information_schema.columns"
+        " WHERE table_name = 'ai_results' AND column_name = 'created_at'"
+    )).scalar()
+    if data_type != 'timestamp without time zone':
+        return
+    conn.execute(text(
+        "ALTER TABLE ai_results ALTER COLUMN created_at TYPE TIMESTAMP WITH TIME ZONE"
+        " USING created_at AT TIME ZONE 'UTC'"
+    ))
@@ -0,0 +1,88 @@
+import bisect
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+T = TypeVar("T")
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass
+class Page(Generic[T]):
+    """一页结果，items 按展示顺序排列"""
+    items: List[T] = field(default_factory=list)
+    has_prev: bool = False
+    has_next: bool = False
+
+
+def encode_time(value: datetime) -> str:
+    """把时间编码为微秒整数字符串，用于游标（无精度损失）"""
+    epoch = _EPOCH if value.tzinfo is None else _EPOCH_UTC
+    return str((value - epoch) // _MICROSECOND)
+
+
+def decode_time(value: str, aware: bool) -> datetime:
+    """encode_time 的逆操作，aware 对应列是否带时区"""
+    return (_EPOCH_UTC if aware else _EPOCH) + timedelta(microseconds=int(value))
+
+
+def keyset_query(query: Select, columns: Sequence, cursor: Optional[Tuple], forward: bool,
+                 descending: bool, limit: int) -> Select:
+    """
+    在查询上追加 keyset（seek）分页条件：
+    按 columns 的行值比较定位游标，而不是 OFFSET，翻到任何一页都只需一次索引范围扫描。
+
+    Args:
+        cursor: 当前页首条（向前翻）或末条（向后翻）的排序键，None 表示第一页
+        forward: True 取游标之后的一页，False 取游标之前的一页
+        descending: 展示顺序是否为倒序
+        limit: 每页条数，实际多取一条用于判断是否还有下一页
+    """
+    # 向前翻页时反向排序取最近的 limit 条，finish_page 再把顺序翻转回来
+    ascending = forward != descending
+    if cursor is not None:
+        key = tuple_(*columns)
+        query = query.where(key > tuple_(*cursor) if ascending else key < tuple_(*cursor))
+    order = [column.asc() if ascending else column.desc() for column in columns]
+    return query.order_by(*order).limit(limit + 1)
+
+
+def finish_page(rows: Sequence[T], limit: int, forward: bool, has_cursor: bool) -> Page:
+    """把 keyset_query 的结果整理为按展示顺序排列的一页"""
+    more = len(rows) > limit
+    items = list(rows[:limit])
+    if forward:
+        return Page(items, has_prev=has_cursor, has_next=more)
+    items.reverse()
+    return Page(items, has_prev=more, has_next=has_cursor)
+
+
+def paginate_sorted(items: Sequence[T], key: Callable[[T], Any], cursor: Optional[Tuple],
+                    forward: bool, descending: bool, limit: int) -> Page:
+    """与 keyset_query 语义相同的内存分页，供内存缓存使用"""
+    ordered = sorted(items, key=key)
+    keys = [key(item) for item in ordered]
+    if cursor is None:
+        after_start, before_end = 0, 0
+    else:
+        after_start, before_end = bisect.bisect_right(keys, cursor), bisect.bisect_left(keys, cursor)
+
+    if descending:
+        ordered.reverse()
+        # 倒序展示时，“之后”是排序键更小的部分
+        after = ordered[len(ordered) - before_end:] if cursor is not None else ordered
+        before = ordered[:len(ordered) - after_start] if cursor is not None else []
+    else:
+        after = ordered[after_start:]
+        before = ordered[:before_end]
+
+    if forward:
+        return Page(after[:limit], has_prev=len(after) < len(ordered), has_next=len(after) > limit)
+    return Page(before[-limit:] if limit else [], has_prev=len(before) > limit,
+                has_next=len(before) < len(ordered))
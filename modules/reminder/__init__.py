@@ -0,0 +1 @@
+# 定时提醒：每个会话的提醒时间、时区和下一次触发时间
@@ -0,0 +1,102 @@
+from datetime import datetime, time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from modules.database import AsyncSessionLocal
+from modules.reminder.models import Reminder
+
+
+class AsyncReminderDAO:
+    """定时提醒的数据访问"""
+
+    @staticmethod
+    async def enroll(rows: Iterable[Dict]):
+        """
+        插入尚不存在的提醒，并重新启用已停用的；已存在的提醒时间（用户可能改过）保持不变。
+        重新启用的提醒 next_fire_at 仍是停用前的值：超过 REMINDER_MAX_LATENESS 时由引擎跳过一次并推进
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        statement = insert(Reminder).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Reminder.chat_id, Reminder.kind],
+            set_={'enabled': True},
+            where=Reminder.enabled.is_(False)
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    @staticmethod
+    async def upsert(chat_id: int, kind: str, local_time: time, timezone: str, next_fire_at: datetime):
+        """设置会话某种提醒的时间，不存在时创建"""
+        statement = insert(Reminder).values(
+            chat_id=chat_id, kind=kind, local_time=local_time, timezone=timezone,
+            enabled=True, next_fire_at=next_fire_at
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[Reminder.chat_id, Reminder.kind],
+            set_={'local_time': local_time, 'enabled': True, 'next_fire_at': next_fire_at}
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    @staticmethod
+    async def list_for_chat(chat_id: int) -> List[Reminder]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Reminder).where(Reminder.chat_id == chat_id))
+            return result.scalars().all()
+
+    @staticmethod
+    async def reschedule_chat(chat_id: int, timezone: str, next_fire_at: Callable[[Reminder], datetime]) -> int:
+        """修改会话的时区，并按新时区重新计算每种提醒的下一次触发时间，返回修改的行数"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Reminder).where(Reminder.chat_id == chat_id).with_for_update()
+            )
+            reminders = result.scalars().all()
+            for reminder in reminders:
+                reminder.timezone = timezone
+                reminder.next_fire_at = next_fire_at(reminder)
+            await db.commit()
+            return len(reminders)
+
+    @staticmethod
+    async def claim_due(now: datetime, limit: int,
+                        next_fire_at: Callable[[Reminder], datetime]) -> List[Tuple[Reminder, datetime]]:
+        """
+        领取 next_fire_at <= now 的提醒（一次索引查询），并在同一事务中推进到下一次触发时间。
+        用 FOR UPDATE SKIP LOCKED，多个进程同时执行时不会重复领取。
+        返回 [(提醒, 本次应触发的时间)]
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Reminder)
+                .where(Reminder.enabled, Reminder.next_fire_at <= now)
+                .order_by(Reminder.next_fire_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = []
+            for reminder in result.scalars().all():
+                scheduled_at = reminder.next_fire_at
+                reminder.next_fire_at = next_fire_at(reminder)
+                claimed.append((reminder, scheduled_at))
+            await db.commit()
+            return claimed
+
+    @staticmethod
+    async def disable_chats(chat_ids: Iterable[int]):
+        """停用会话的所有提醒（例如机器人已被用户屏蔽）"""
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Reminder).where(Reminder.chat_id.in_(chat_ids)).values(enabled=False)
+            )
+            await db.commit()
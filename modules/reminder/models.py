@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Index, String, Time, text
+
+from modules.base_model import Base
+
+
+class Reminder(Base):
+    """每个会话的每种定时提醒一行，next_fire_at 为下一次触发的时间（UTC）"""
+    __tablename__ = 'reminders'
+    __table_args__ = (
+        # 由迁移 0006 创建：每分钟按 next_fire_at 取出到期的提醒
+        Index('idx_reminders_next_fire_at', 'next_fire_at', postgresql_where=text('enabled')),
+    )
+
+    chat_id = Column(BigInteger, primary_key=True)  # Telegram 会话ID
+    kind = Column(String(20), primary_key=True)  # morning / afternoon / digest
+    local_time = Column(Time, nullable=False)  # 会话时区中的触发时间
+    timezone = Column(String(64), nullable=False)  # IANA 时区名
+    enabled = Column(Boolean, nullable=False, default=True)
+    next_fire_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<Reminder(chat_id={self.chat_id}, kind={self.kind}, local_time={self.local_time}, " \
+               f"timezone={self.timezone}, next_fire_at={self.next_fire_at})>"
@@ -0,0 +1,149 @@
+import logging
+import re
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pytz
+
+from bot.config import REMINDER_AFTERNOON_TIME, REMINDER_DIGEST_TIME, REMINDER_TIME, TIMEZONE
+from modules.reminder.dao import AsyncReminderDAO
+from modules.reminder.models import Reminder
+
+# 提醒种类：早间提醒（今日截止）、下午提醒（今日和明日截止）、未读链接摘要
+MORNING = 'morning'
+AFTERNOON = 'afternoon'
+DIGEST = 'digest'
+KINDS = (MORNING, AFTERNOON, DIGEST)
+KIND_NAMES = {MORNING: '早间提醒', AFTERNOON: '下午提醒', DIGEST: '未读链接摘要'}
+
+# 本进程已确认存在提醒的 (会话, 种类)，避免每条消息都写一次数据库
+_enrolled: Set[Tuple[int, str]] = set()
+
+
+def parse_hhmm(value: str) -> time:
+    """
+    解析 HH:MM 格式的时间
+
+    Raises:
+        ValueError: 时间格式错误
+    """
+    match = re.match(r'^(\d{2}):(\d{2})$', value.strip())
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError("时间格式错误，请使用 HH:MM 格式")
+    return time(int(match.group(1)), int(match.group(2)))
+
+
+def default_times() -> Dict[str, time]:
+    return {
+        MORNING: parse_hhmm(REMINDER_TIME),
+        AFTERNOON: parse_hhmm(REMINDER_AFTERNOON_TIME),
+        DIGEST: parse_hhmm(REMINDER_DIGEST_TIME),
+    }
+
+
+def get_timezone(name: str):
+    """
+    按 IANA 名称取时区
+
+    Raises:
+        ValueError: 未知的时区
+    """
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"未知的时区: {name}，请使用 Asia/Shanghai 这样的 IANA 名称")
+
+
+def next_fire_time(local_time: time, tz_name: str, after: datetime) -> datetime:
+    """
+    返回晚于 after 的下一个“时区 tz_name 中的 local_time”，以 UTC 表示。
+    夏令时跳过的本地时间按 normalize 顺延，重复的本地时间取第一次
+    """
+    tz = get_timezone(tz_name)
+    day = after.astimezone(tz).date()
+    while True:
+        naive = datetime.combine(day, local_time)
+        try:
+            candidate = tz.localize(naive, is_dst=None)
+        except pytz.NonExistentTimeError:
+            candidate = tz.normalize(tz.localize(naive, is_dst=False))
+        except pytz.AmbiguousTimeError:
+            candidate = tz.localize(naive, is_dst=True)
+        if candidate > after:
+            return candidate.astimezone(pytz.utc)
+        day += timedelta(days=1)
+
+
+def advance(reminder: Reminder, now: Optional[datetime] = None) -> datetime:
+    """提醒触发后的下一次触发时间"""
+    return next_fire_time(reminder.local_time, reminder.timezone, now or datetime.now(pytz.utc))
+
+
+async def ensure_reminders(chat_id: int, kinds: Iterable[str]):
+    """确保会话有这些种类的启用的提醒（使用默认时间和时区），已存在的时间保持不变，已停用的重新启用"""
+    missing = [kind for kind in kinds if (chat_id, kind) not in _enrolled]
+    if not missing:
+        return
+    now = datetime.now(pytz.utc)
+    times = default_times()
+    rows = [
+        {
+            'chat_id': chat_id, 'kind': kind, 'local_time': times[kind], 'timezone': TIMEZONE.zone,
+            'enabled': True, 'next_fire_at': next_fire_time(times[kind], TIMEZONE.zone, now),
+        }
+        for kind in missing
+    ]
+    try:
+        await AsyncReminderDAO.enroll(rows)
+    except Exception as e:
+        logging.error(f"为会话 {chat_id} 创建提醒失败: {e}")
+        return
+    _enrolled.update((chat_id, kind) for kind in missing)
+
+
+async def disable_chats_async(chat_ids: Iterable[int]):
+    """停用会话的所有提醒（例如机器人已被用户屏蔽），会话再次活跃时由 ensure_reminders 重新启用"""
+    chat_ids = set(chat_ids)
+    if not chat_ids:
+        return
+    await AsyncReminderDAO.disable_chats(chat_ids)
+    _enrolled.difference_update((chat_id, kind) for chat_id in chat_ids for kind in KINDS)
+
+
+async def get_reminders_async(chat_id: int) -> List[Reminder]:
+    """会话的所有提醒，按 KINDS 的顺序"""
+    reminders = await AsyncReminderDAO.list_for_chat(chat_id)
+    return sorted(reminders, key=lambda r: KINDS.index(r.kind) if r.kind in KINDS else len(KINDS))
+
+
+async def set_reminder_time_async(chat_id: int, kind: str, hhmm: str) -> Reminder:
+    """
+    修改会话某种提醒的时间并持久化，时区沿用会话已有的设置
+
+    Raises:
+        ValueError: 时间格式错误或未知的提醒种类
+    """
+    if kind not in KINDS:
+        raise ValueError(f"未知的提醒种类: {kind}")
+    local_time = parse_hhmm(hhmm)
+    existing = await AsyncReminderDAO.list_for_chat(chat_id)
+    tz_name = existing[0].timezone if existing else TIMEZONE.zone
+    next_fire_at = next_fire_time(local_time, tz_name, datetime.now(pytz.utc))
+    await AsyncReminderDAO.upsert(chat_id, kind, local_time, tz_name, next_fire_at)
+    _enrolled.add((chat_id, kind))
+    return Reminder(chat_id=chat_id, kind=kind, local_time=local_time, timezone=tz_name,
+                    enabled=True, next_fire_at=next_fire_at)
+
+
+async def set_timezone_async(chat_id: int, tz_name: str) -> int:
+    """
+    修改会话所有提醒的时区，并按新时区重新计算下一次触发时间，返回修改的提醒数
+
+    Raises:
+        ValueError: 未知的时区
+    """
+    zone = get_timezone(tz_name.strip()).zone
+    now = datetime.now(pytz.utc)
+    return await AsyncReminderDAO.reschedule_chat(
+        chat_id, zone, lambda reminder: next_fire_time(reminder.local_time, zone, now)
+    )
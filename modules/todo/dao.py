@@ -1,17 +1,87 @@
 import logging
-from datetime import datetime, date
-from sqlalchemy import Date
-from modules.database import SessionLocal
-from modules.todo.models import Todo
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import BigInteger, DateTime, String, and_, case, column, select, values
+from sqlalchemy.dialects.postgresql import insert
+from modules.database import SessionLocal, AsyncSessionLocal
+from modules.pagination import Page, finish_page, keyset_query
+from modules.todo.models import Todo, TodoCounter
+
+
+def _next_id_statement(chat_id: int):
+    """
+    分配会话内的下一个待办编号。
+    计数行的行锁持有到事务提交，同一会话的并发创建依次拿到连续的编号
+    """
+    statement = insert(TodoCounter).values(chat_id=chat_id, last_id=1)
+    return statement.on_conflict_do_update(
+        index_elements=[TodoCounter.chat_id],
+        set_={'last_id': TodoCounter.last_id + 1}
+    ).returning(TodoCounter.last_id)
+
+
+def todo_sort_key(todo: Todo, pending_only: bool) -> Tuple:
+    """分页排序键（会话内）：全部列表按 (status, create_time, todo_id) 倒序，未完成列表按 (create_time, todo_id) 正序"""
+    if pending_only:
+        return todo.create_time, todo.todo_id
+    return todo.status, todo.create_time, todo.todo_id
+
+
+def _page_query(chat_id: int, pending_only: bool, cursor: Optional[Tuple], forward: bool, limit: int):
+    # 全部列表倒序：'pending' 排在 'completed' 前面，同状态内新建的在前
+    # 先按会话过滤，走 (chat_id, status, create_time, todo_id) 索引
+    if pending_only:
+        query = select(Todo).where(Todo.chat_id == chat_id, Todo.status == 'pending')
+        columns = (Todo.create_time, Todo.todo_id)
+    else:
+        query = select(Todo).where(Todo.chat_id == chat_id)
+        columns = (Todo.status, Todo.create_time, Todo.todo_id)
+    return keyset_query(query, columns, cursor, forward, descending=not pending_only, limit=limit)
+
+
+# 截止时间窗口：(会话ID, 分组名, start, end)，查询 [start, end) 内的未完成待办
+DueWindow = Tuple[int, str, datetime, datetime]
+
+
+def _due_windows_query(windows: List[DueWindow]):
+    """
+    窗口作为 VALUES 表与 todos 连接，一次查询取回所有窗口；
+    每个窗口是一次 idx_todos_chat_pending_end_time 范围扫描
+    """
+    window = values(
+        column('chat_id', BigInteger),
+        column('bucket', String),
+        column('start_at', DateTime(timezone=True)),
+        column('end_at', DateTime(timezone=True)),
+        name='windows'
+    ).data(windows)
+    return (
+        select(Todo, window.c.bucket)
+        .join(window, and_(Todo.chat_id == window.c.chat_id,
+                           Todo.end_time >= window.c.start_at,
+                           Todo.end_time < window.c.end_at))
+        .where(Todo.status == 'pending')
+        .order_by(Todo.chat_id, Todo.end_time.asc())
+    )
+
+
+def _bucket_rows(windows: List[DueWindow], rows) -> Dict[Tuple[int, str], List[Todo]]:
+    """按 (会话ID, 分组名) 分组，没有结果的窗口对应空列表"""
+    grouped: Dict[Tuple[int, str], List[Todo]] = {(chat_id, bucket): [] for chat_id, bucket, _, _ in windows}
+    for todo, bucket in rows:
+        grouped[(todo.chat_id, bucket)].append(todo)
+    return grouped
 
 
 class TodoDAO:
     @staticmethod
-    def create(todo_name: str, create_time: datetime, end_time: datetime = None) -> Todo:
+    def create(chat_id: int, todo_name: str, create_time: datetime, end_time: datetime = None) -> Todo:
         """创建新的待办事项"""
         db = SessionLocal()
         try:
             todo = Todo(
+                chat_id=chat_id,
+                todo_id=db.execute(_next_id_statement(chat_id)).scalar_one(),
                 todo_name=todo_name,
                 create_time=create_time,
                 end_time=end_time,
@@ -28,20 +98,20 @@ class TodoDAO:
             db.close()
 
     @staticmethod
-    def get_by_id(todo_id: int) -> Todo:
-        """获取指定ID的待办事项"""
+    def get_by_id(chat_id: int, todo_id: int) -> Todo:
+        """获取会话中指定ID的待办事项，不属于该会话时返回 None"""
         db = SessionLocal()
         try:
-            return db.query(Todo).filter(Todo.todo_id == todo_id).first()
+            return db.query(Todo).filter(Todo.chat_id == chat_id, Todo.todo_id == todo_id).first()
         finally:
             db.close()
 
     @staticmethod
-    def update_status(todo_id: int, status: str) -> bool:
+    def update_status(chat_id: int, todo_id: int, status: str) -> bool:
         """更新待办事项状态"""
         db = SessionLocal()
         try:
-            todo = db.query(Todo).filter(Todo.todo_id == todo_id).first()
+            todo = db.query(Todo).filter(Todo.chat_id == chat_id, Todo.todo_id == todo_id).first()
             if todo:
                 todo.status = status
                 db.commit()
@@ -54,11 +124,11 @@ class TodoDAO:
             db.close()
 
     @staticmethod
-    def update_end_time(todo_id: int, new_end_time: datetime) -> bool:
+    def update_end_time(chat_id: int, todo_id: int, new_end_time: datetime) -> bool:
         """更新待办事项的截止时间"""
         db = SessionLocal()
         try:
-            todo = db.query(Todo).filter(Todo.todo_id == todo_id).first()
+            todo = db.query(Todo).filter(Todo.chat_id == chat_id, Todo.todo_id == todo_id).first()
             if not todo:
                 return False
             if todo.status == 'completed':
@@ -73,11 +143,11 @@ class TodoDAO:
             db.close()
 
     @staticmethod
-    def delete(todo_id: int) -> bool:
+    def delete(chat_id: int, todo_id: int) -> bool:
         """删除待办事项"""
         db = SessionLocal()
         try:
-            todo = db.query(Todo).filter(Todo.todo_id == todo_id).first()
+            todo = db.query(Todo).filter(Todo.chat_id == chat_id, Todo.todo_id == todo_id).first()
             if todo:
                 db.delete(todo)
                 db.commit()
@@ -90,12 +160,12 @@ class TodoDAO:
             db.close()
 
     @staticmethod
-    def get_pending_todos():
-        """获取所有未完成的待办事项"""
+    def get_pending_todos(chat_id: int):
+        """获取会话中所有未完成的待办事项"""
         db = SessionLocal()
         try:
             return (db.query(Todo)
-                    .filter(Todo.status == 'pending')
+                    .filter(Todo.chat_id == chat_id, Todo.status == 'pending')
                     .order_by(Todo.end_time.asc().nullslast(),
                              Todo.create_time.desc())
                     .all())
@@ -106,23 +176,44 @@ class TodoDAO:
             db.close()
 
     @staticmethod
-    def get_today_todos(today_date: date):
-        """获取指定日期的待办事项"""
+    def get_due_todos(chat_id: int, start: datetime, end: datetime):
+        """
+        获取会话中截止时间在 [start, end) 内的未完成待办事项，按截止时间排序。
+        使用半开区间直接比较 end_time，可以走 idx_todos_chat_pending_end_time 索引
+        """
+        db = SessionLocal()
+        try:
+            return (db.query(Todo)
+                    .filter(Todo.chat_id == chat_id,
+                            Todo.status == 'pending',
+                            Todo.end_time >= start,
+                            Todo.end_time < end)
+                    .order_by(Todo.end_time.asc())
+                    .all())
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_due_windows(windows: List[DueWindow]) -> Dict[Tuple[int, str], List[Todo]]:
+        """
+        一次查询取出多个截止时间窗口内的未完成待办事项，按 (会话ID, 分组名) 分组、按截止时间排序。
+        同一会话的窗口应互不重叠，否则同一事项会出现在多个分组中
+        """
+        if not windows:
+            return {}
         db = SessionLocal()
         try:
-            return db.query(Todo).filter(
-                Todo.end_time.isnot(None),
-                Todo.end_time.cast(Date) == today_date
-            ).all()
+            return _bucket_rows(windows, db.execute(_due_windows_query(windows)).all())
         finally:
             db.close()
 
     @staticmethod
-    def get_all_todos():
-        """获取所有待办事项"""
+    def get_all_todos(chat_id: int):
+        """获取会话中所有待办事项"""
         db = SessionLocal()
         try:
             return (db.query(Todo)
+                    .filter(Todo.chat_id == chat_id)
                     .order_by(Todo.status,
                              Todo.create_time.desc())
                     .all())
@@ -131,3 +222,185 @@ class TodoDAO:
             return []
         finally:
             db.close()
+
+    @staticmethod
+    def get_page(chat_id: int, pending_only: bool, cursor: Optional[Tuple] = None, forward: bool = True,
+                 limit: int = 10) -> Page:
+        """
+        keyset 分页获取会话中的待办事项，每页一次索引查询。
+        cursor 为当前页首条/末条的 todo_sort_key，None 表示第一页
+        """
+        db = SessionLocal()
+        try:
+            rows = db.execute(_page_query(chat_id, pending_only, cursor, forward, limit)).scalars().all()
+            return finish_page(rows, limit, forward, cursor is not None)
+        finally:
+            db.close()
+
+
+class AsyncTodoDAO:
+    """TodoDAO 的异步版本，基于 AsyncSession，不会阻塞事件循环"""
+
+    @staticmethod
+    async def create(chat_id: int, todo_name: str, create_time: datetime, end_time: datetime = None) -> Todo:
+        """创建新的待办事项"""
+        async with AsyncSessionLocal() as db:
+            try:
+                todo = Todo(
+                    chat_id=chat_id,
+                    todo_id=(await db.execute(_next_id_statement(chat_id))).scalar_one(),
+                    todo_name=todo_name,
+                    create_time=create_time,
+                    end_time=end_time,
+                    status='pending'
+                )
+                db.add(todo)
+                await db.commit()
+                await db.refresh(todo)
+                return todo
+            except Exception as e:
+                await db.rollback()
+                raise e
+
+    @staticmethod
+    async def get_by_id(chat_id: int, todo_id: int) -> Todo:
+        """获取会话中指定ID的待办事项，不属于该会话时返回 None"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Todo).where(Todo.chat_id == chat_id, Todo.todo_id == todo_id))
+            return result.scalars().first()
+
+    @staticmethod
+    async def update_status(chat_id: int, todo_id: int, status: str) -> bool:
+        """更新待办事项状态"""
+        async with AsyncSessionLocal() as db:
+            try:
+                todo = await db.get(Todo, (chat_id, todo_id))
+                if todo:
+                    todo.status = status
+                    await db.commit()
+                    return True
+                return False
+            except Exception as e:
+                await db.rollback()
+                raise e
+
+    @staticmethod
+    async def update_end_time(chat_id: int, todo_id: int, new_end_time: datetime) -> bool:
+        """更新待办事项的截止时间"""
+        async with AsyncSessionLocal() as db:
+            try:
+                todo = await db.get(Todo, (chat_id, todo_id))
+                if not todo:
+                    return False
+                if todo.status == 'completed':
+                    raise ValueError("已完成的任务不能修改截止时间")
+                todo.end_time = new_end_time
+                await db.commit()
+                return True
+            except Exception as e:
+                await db.rollback()
+                raise e
+
+    @staticmethod
+    async def delete(chat_id: int, todo_id: int) -> bool:
+        """删除待办事项"""
+        async with AsyncSessionLocal() as db:
+            try:
+                todo = await db.get(Todo, (chat_id, todo_id))
+                if todo:
+                    await db.delete(todo)
+                    await db.commit()
+                    return True
+                return False
+            except Exception as e:
+                await db.rollback()
+                raise e
+
+    @staticmethod
+    async def get_pending_todos(chat_id: int):
+        """获取会话中所有未完成的待办事项"""
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await db.execute(
+                    select(Todo)
+                    .where(Todo.chat_id == chat_id, Todo.status == 'pending')
+                    .order_by(Todo.end_time.asc().nullslast(),
+                              Todo.create_time.desc())
+                )
+                return result.scalars().all()
+            except Exception as e:
+                logging.error(f"获取待办事项失败: {e}")
+                return []
+
+    @staticmethod
+    async def get_due_todos(chat_id: int, start: datetime, end: datetime):
+        """获取会话中截止时间在 [start, end) 内的未完成待办事项，按截止时间排序"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Todo)
+                .where(Todo.chat_id == chat_id,
+                       Todo.status == 'pending',
+                       Todo.end_time >= start,
+                       Todo.end_time < end)
+                .order_by(Todo.end_time.asc())
+            )
+            return result.scalars().all()
+
+    @staticmethod
+    async def get_pending_due_between(start: datetime, end: datetime) -> List[Todo]:
+        """所有会话中截止时间在 [start, end) 内的未完成待办事项，按截止时间排序，走 idx_todos_pending_end_time"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Todo)
+                .where(Todo.status == 'pending',
+                       Todo.end_time >= start,
+                       Todo.end_time < end)
+                .order_by(Todo.end_time.asc())
+            )
+            return result.scalars().all()
+
+    @staticmethod
+    async def get_due_windows(windows: List[DueWindow]) -> Dict[Tuple[int, str], List[Todo]]:
+        """TodoDAO.get_due_windows 的异步版本"""
+        if not windows:
+            return {}
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(_due_windows_query(windows))
+            return _bucket_rows(windows, result.all())
+
+    @staticmethod
+    async def get_all_todos(chat_id: int):
+        """获取会话中所有待办事项"""
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await db.execute(
+                    select(Todo).where(Todo.chat_id == chat_id).order_by(Todo.status, Todo.create_time.desc())
+                )
+                return result.scalars().all()
+            except Exception as e:
+                logging.error(f"获取所有待办事项失败: {e}")
+                return []
+
+    @staticmethod
+    async def get_cache_snapshot(chat_id: int, limit: int):
+        """
+        供内存缓存加载单个会话：未完成事项在前，其余按创建时间倒序，最多 limit + 1 条。
+        多取的一条用于判断结果是否被截断
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Todo)
+                .where(Todo.chat_id == chat_id)
+                .order_by(case((Todo.status == 'pending', 0), else_=1),
+                          Todo.create_time.desc())
+                .limit(limit + 1)
+            )
+            return result.scalars().all()
+
+    @staticmethod
+    async def get_page(chat_id: int, pending_only: bool, cursor: Optional[Tuple] = None, forward: bool = True,
+                       limit: int = 10) -> Page:
+        """keyset 分页获取待办事项（异步），参数同 TodoDAO.get_page"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(_page_query(chat_id, pending_only, cursor, forward, limit))
+            return finish_page(result.scalars().all(), limit, forward, cursor is not None)
@@ -0,0 +1,177 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from bot.config import DEADLINE_HORIZON, DEADLINE_WARNING_LEAD
+from modules.todo.dao import AsyncTodoDAO
+from modules.todo.models import Todo
+from modules.todo.repository import get_todo_repository
+from utils.metrics import SCHEDULER_JOB_SECONDS
+
+# 通知种类：即将截止 / 已过期
+DUE_SOON = 'due_soon'
+OVERDUE = 'overdue'
+
+# notify(chat_id -> {种类: [待办]})
+Notify = Callable[[Dict[int, Dict[str, List[Todo]]]], Awaitable[None]]
+
+
+class DeadlineTimer:
+    """
+    单个待办的截止通知：截止前 lead 秒发送“即将截止”，截止时发送“已过期”。
+
+    所有待办共用一个最小堆和一个后台任务，任务睡到堆顶的触发时间（或被新的更早条目唤醒），
+    不轮询数据库，也不为每个待办注册定时任务。
+
+    内存中只保留截止时间早于 loaded_until 的事项：每隔 horizon / 2 从数据库加载下一段，
+    期间的新建、改期、完成、删除通过 schedule() / cancel() 增量更新。
+    堆中条目不原地删除，触发时与 deadlines 中当前的截止时间比对，不一致即为过期条目直接丢弃。
+    """
+
+    def __init__(self, lead: float = DEADLINE_WARNING_LEAD, horizon: float = DEADLINE_HORIZON):
+        self.lead = lead
+        # 每段至少覆盖两倍提前量，保证“即将截止”的触发时间不早于加载时间
+        self.horizon = max(horizon, 2 * lead)
+        # (触发时间戳, 序号, 种类, 会话ID, 待办ID, 截止时间戳)
+        self.heap: List[Tuple[float, int, str, int, int, float]] = []
+        self.deadlines: Dict[Tuple[int, int], float] = {}
+        self.loaded_until: Optional[float] = None
+        self.next_reload = 0.0
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._notify: Optional[Notify] = None
+        self.counters = {'scheduled': 0, 'fired': 0, 'stale': 0, 'reloads': 0}
+
+    # ---- 增量更新 ----
+
+    def _push(self, fire_at: float, kind: str, chat_id: int, todo_id: int, end_ts: float):
+        entry = (fire_at, next(self._seq), kind, chat_id, todo_id, end_ts)
+        heapq.heappush(self.heap, entry)
+        if self.heap[0] is entry:
+            self._wakeup.set()
+
+    def _add(self, chat_id: int, todo_id: int, end_ts: float, now: float):
+        """登记一个截止时间，已经过去的触发点不再补发"""
+        self.deadlines[(chat_id, todo_id)] = end_ts
+        if end_ts - self.lead > now:
+            self._push(end_ts - self.lead, DUE_SOON, chat_id, todo_id, end_ts)
+        if end_ts > now:
+            self._push(end_ts, OVERDUE, chat_id, todo_id, end_ts)
+        self.counters['scheduled'] += 1
+
+    def schedule(self, chat_id: int, todo_id: int, end_time: Optional[datetime]):
+        """待办新建或修改截止时间后调用；超出已加载范围的留给下一次加载"""
+        self.cancel(chat_id, todo_id)
+        if self.loaded_until is None or end_time is None:
+            return
+        end_ts = end_time.timestamp()
+        if end_ts < self.loaded_until:
+            self._add(chat_id, todo_id, end_ts, time.time())
+
+    def cancel(self, chat_id: int, todo_id: int):
+        """待办完成或删除后调用，堆中的条目触发时自动丢弃"""
+        self.deadlines.pop((chat_id, todo_id), None)
+
+    # ---- 加载与触发 ----
+
+    async def _reload(self, now: float):
+        start = self.loaded_until if self.loaded_until is not None else now
+        end = now + self.horizon
+        todos = await AsyncTodoDAO.get_pending_due_between(
+            datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc)
+        )
+        for todo in todos:
+            if (todo.chat_id, todo.todo_id) not in self.deadlines:
+                self._add(todo.chat_id, todo.todo_id, todo.end_time.timestamp(), now)
+        self.loaded_until = end
+        self.next_reload = now + self.horizon / 2
+        self.counters['reloads'] += 1
+        logging.info(f"截止提醒已加载 {len(todos)} 条，覆盖到 {datetime.fromtimestamp(end, timezone.utc)}")
+
+    def _pop_due(self, now: float) -> List[Tuple[str, int, int, float]]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, kind, chat_id, todo_id, end_ts = heapq.heappop(self.heap)
+            if self.deadlines.get((chat_id, todo_id)) != end_ts:
+                self.counters['stale'] += 1
+                continue
+            if kind == OVERDUE:
+                # 已过期后不会再有通知
+                del self.deadlines[(chat_id, todo_id)]
+            due.append((kind, chat_id, todo_id, end_ts))
+        return due
+
+    async def _fire(self, due: List[Tuple[str, int, int, float]]):
+        # 其他进程可能已经修改了待办，发送前按缓存再核对一次
+        repository = get_todo_repository()
+        grouped: Dict[int, Dict[str, List[Todo]]] = {}
+        for kind, chat_id, todo_id, end_ts in due:
+            todo = await repository.get(chat_id, todo_id)
+            if not todo or todo.status != 'pending' or not todo.end_time or todo.end_time.timestamp() != end_ts:
+                self.counters['stale'] += 1
+                continue
+            grouped.setdefault(chat_id, {}).setdefault(kind, []).append(todo)
+            self.counters['fired'] += 1
+        if grouped:
+            with SCHEDULER_JOB_SECONDS.track(job="deadline_notices"):
+                await self._notify(grouped)
+
+    async def _run(self):
+        while True:
+            # 先清除唤醒标记：之后（包括 await 期间）登记的更早条目会让下面的等待立即返回
+            self._wakeup.clear()
+            try:
+                now = time.time()
+                if now >= self.next_reload:
+                    await self._reload(now)
+                due = self._pop_due(now)
+                if due:
+                    await self._fire(due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"处理截止提醒失败: {e}")
+                # 加载失败时稍后重试，避免紧密循环
+                self.next_reload = max(self.next_reload, time.time() + 60)
+
+            wake_at = min(self.next_reload, self.heap[0][0] if self.heap else self.next_reload)
+            timeout = wake_at - time.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self, notify: Notify):
+        """启动后台任务；notify 负责把到期通知发送出去"""
+        if self._task is None:
+            self._notify = notify
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {'pending': len(self.deadlines), 'heap': len(self.heap), **self.counters}
+
+
+_shared_timer: Optional[DeadlineTimer] = None
+
+
+def get_deadline_timer() -> DeadlineTimer:
+    """获取进程共享的截止提醒定时器"""
+    global _shared_timer
+    if _shared_timer is None:
+        _shared_timer = DeadlineTimer()
+    return _shared_timer
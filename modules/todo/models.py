@@ -1,26 +1,48 @@
-from datetime import datetime
-from sqlalchemy import Column, Integer, Text, DateTime, String
+from datetime import datetime, timezone
+from sqlalchemy import BigInteger, Column, Integer, Text, DateTime, String, Index, text
 from modules.base_model import Base
 
 
 class Todo(Base):
     __tablename__ = 'todos'
+    __table_args__ = (
+        # 由迁移 0005 创建：所有查询先按会话过滤
+        # 按截止时间范围查询会话内的未完成待办
+        Index('idx_todos_chat_pending_end_time', 'chat_id', 'end_time',
+              postgresql_where=text("status = 'pending' AND end_time IS NOT NULL")),
+        # /demo、/demoz keyset 分页
+        Index('idx_todos_chat_status_create_time', 'chat_id', 'status', 'create_time', 'todo_id'),
+        # 由迁移 0007 创建：截止提醒定时器跨会话按截止时间加载
+        Index('idx_todos_pending_end_time', 'end_time',
+              postgresql_where=text("status = 'pending' AND end_time IS NOT NULL")),
+    )
 
-    todo_id = Column(Integer, primary_key=True, autoincrement=True)
-    create_time = Column(DateTime, default=datetime.now)
-    end_time = Column(DateTime, nullable=True)
+    # 由迁移 0009 改为复合主键：编号在会话内唯一，由 todo_counters 分配
+    chat_id = Column(BigInteger, primary_key=True)  # 所属的 Telegram 会话
+    todo_id = Column(Integer, primary_key=True, autoincrement=False)  # 会话内的待办编号
+    create_time = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    end_time = Column(DateTime(timezone=True), nullable=True)
     todo_name = Column(Text, nullable=False)
     status = Column(String(20), default='pending')
 
     def __repr__(self):
-        return f"<Todo(id={self.todo_id}, todo_name={self.todo_name}, status={self.status})>"
+        return f"<Todo(id={self.todo_id}, chat_id={self.chat_id}, todo_name={self.todo_name}, status={self.status})>"
 
     def to_dict(self):
         """将对象转换为字典"""
         return {
             'todo_id': self.todo_id,
+            'chat_id': self.chat_id,
             'todo_name': self.todo_name,
             'status': self.status,
             'create_time': self.create_time.strftime('%Y-%m-%d %H:%M:%S') if self.create_time else None,
             'end_time': self.end_time.strftime('%Y-%m-%d %H:%M:%S') if self.end_time else None
         }
+
+
+class TodoCounter(Base):
+    """每个会话已分配的最大待办编号"""
+    __tablename__ = 'todo_counters'
+
+    chat_id = Column(BigInteger, primary_key=True)
+    last_id = Column(Integer, nullable=False)
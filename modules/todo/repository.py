@@ -1,50 +1,314 @@
+import bisect
+import logging
+from collections import OrderedDict
 from datetime import datetime
 from threading import Lock
+from typing import Dict, List, Optional, Set, Tuple
 
+from bot.config import CHAT_ID, TODO_CACHE_MAX_CHATS, TODO_CACHE_MAX_ENTRIES
+from modules.pagination import Page, paginate_sorted
+from modules.todo.dao import AsyncTodoDAO, todo_sort_key
 from modules.todo.models import Todo
+from utils.singleflight import SingleFlight
 
+# 加载期间会话一直有写入时，最多重新读取快照的次数
+_LOAD_ATTEMPTS = 3
 
-class TodoRepository:
-    def __init__(self):
+
+class ChatTodos:
+    """
+    单个会话的待办缓存分区：按状态和截止时间维护二级索引。
+    条目数超过上限时优先淘汰最早创建的已完成事项，此后“全部待办”回源数据库；
+    连未完成事项都放不下时，未完成列表和截止时间查询也回源。
+    """
+
+    def __init__(self, chat_id: int, max_entries: int):
+        self.chat_id = chat_id
+        self.max_entries = max_entries
+        self.todos: Dict[int, Todo] = {}
+        self.by_status: Dict[str, Set[int]] = {}
+        # 未完成且有截止时间的事项，按 (截止时间戳, ID) 有序
+        self.due_index: List[Tuple[float, int]] = []
+        # 分区是否包含会话的全部事项 / 全部未完成事项
+        self.has_all = False
+        self.has_all_pending = False
+
+    @staticmethod
+    def _due_key(todo: Todo) -> Tuple[float, int]:
+        return todo.end_time.timestamp(), todo.todo_id
+
+    def index(self, todo: Todo):
+        self.todos[todo.todo_id] = todo
+        self.by_status.setdefault(todo.status, set()).add(todo.todo_id)
+        if todo.status == 'pending' and todo.end_time:
+            bisect.insort(self.due_index, self._due_key(todo))
+
+    def unindex(self, todo_id: int) -> Optional[Todo]:
+        todo = self.todos.pop(todo_id, None)
+        if todo is None:
+            return None
+        self.by_status.get(todo.status, set()).discard(todo_id)
+        if todo.status == 'pending' and todo.end_time:
+            key = self._due_key(todo)
+            position = bisect.bisect_left(self.due_index, key)
+            if position < len(self.due_index) and self.due_index[position] == key:
+                del self.due_index[position]
+        return todo
+
+    def evict(self):
+        """超出上限时淘汰最早创建的已完成事项，仍然超出则淘汰最早创建的未完成事项"""
+        while len(self.todos) > self.max_entries:
+            completed = [self.todos[i] for i in self.by_status.get('completed', ())]
+            candidates = completed or list(self.todos.values())
+            oldest = min(candidates, key=lambda todo: (todo.create_time, todo.todo_id))
+            self.unindex(oldest.todo_id)
+            self.has_all = False
+            if oldest.status == 'pending':
+                self.has_all_pending = False
+
+    def load(self, rows: List[Todo]):
+        """用 get_cache_snapshot 的结果（最多 max_entries + 1 条）填充分区"""
+        truncated = len(rows) > self.max_entries
         self.todos = {}
-        self.next_id = 1
+        self.by_status = {}
+        self.due_index = []
+        for todo in rows[:self.max_entries]:
+            self.index(todo)
+        self.has_all = not truncated
+        # 快照中未完成事项排在前面，被截掉的第一条不是未完成事项就说明未完成事项都在
+        self.has_all_pending = not truncated or rows[self.max_entries].status != 'pending'
+
+
+class TodoRepository:
+    """
+    待办事项的写穿缓存，按会话分区：写操作先写数据库，成功后再更新对应分区；
+    列表和提醒查询由会话自己的分区返回，开销只与该会话的数据量有关。
+
+    分区在会话首次访问时加载（并发的首次访问只查询一次），
+    分区数超过上限时淘汰最久未访问的会话。其他进程直接改库后，可以用 resync() 重新加载。
+
+    每次写库成功后递增会话的版本号；快照查询期间版本号变化说明快照可能缺少这次写入，
+    丢弃后重新查询，避免旧快照覆盖分区未加载时发生的写入。
+    """
+
+    def __init__(self, max_entries: int = TODO_CACHE_MAX_ENTRIES, max_chats: int = TODO_CACHE_MAX_CHATS):
+        self.max_entries = max_entries
+        self.max_chats = max_chats
+        self.chats: "OrderedDict[int, ChatTodos]" = OrderedDict()
+        self.versions: Dict[int, int] = {}
         self.lock = Lock()
+        self._loads = SingleFlight()
+        self.counters = {'hits': 0, 'misses': 0, 'loads': 0, 'stale_loads': 0, 'evicted_chats': 0}
+
+    # ---- 分区 ----
 
-    def add(self, create_time: datetime, end_time, todo_name: str) -> Todo:
+    async def _load(self, chat_id: int) -> ChatTodos:
+        """
+        查询快照并安装分区
+
+        Raises:
+            Exception: 查询失败，或每次查询期间会话都有写入
+        """
+        for _ in range(_LOAD_ATTEMPTS):
+            version = self.versions.get(chat_id, 0)
+            rows = await AsyncTodoDAO.get_cache_snapshot(chat_id, self.max_entries)
+            partition = ChatTodos(chat_id, self.max_entries)
+            partition.load(rows)
+            with self.lock:
+                if self.versions.get(chat_id, 0) != version:
+                    self.counters['stale_loads'] += 1
+                    continue
+                self.chats[chat_id] = partition
+                self.chats.move_to_end(chat_id)
+                while len(self.chats) > self.max_chats:
+                    self.chats.popitem(last=False)
+                    self.counters['evicted_chats'] += 1
+            self.counters['loads'] += 1
+            return partition
+        raise Exception(f"会话 {chat_id} 的待办在加载期间持续变化，请稍后重试")
+
+    def _written(self, chat_id: int):
+        """写库成功后调用，使进行中的快照查询失效"""
         with self.lock:
-            todo = Todo(
-                todo_id=self.next_id,
-                create_time=create_time,
-                end_time=end_time,
-                todo_name=todo_name,
-                status='pending'
-            )
-            self.todos[self.next_id] = todo
-            self.next_id += 1
-        return todo
+            self.versions[chat_id] = self.versions.get(chat_id, 0) + 1
 
-    def get(self, todo_id: int):
-        return self.todos.get(todo_id)
+    async def _partition(self, chat_id: int) -> Optional[ChatTodos]:
+        """取会话分区，未加载时加载；加载失败返回 None，调用方回源数据库"""
+        partition = self.chats.get(chat_id)
+        if partition is not None:
+            with self.lock:
+                if chat_id in self.chats:
+                    self.chats.move_to_end(chat_id)
+            return partition
+        try:
+            return await self._loads.do(chat_id, lambda: self._load(chat_id))
+        except Exception as e:
+            logging.error(f"加载会话 {chat_id} 的待办缓存失败: {e}")
+            return None
 
-    def mark_as_done(self, todo_id: int) -> bool:
-        todo = self.get(todo_id)
-        if todo and todo.status != "completed":
-            todo.status = "completed"
-            return True
-        return False
+    def _store(self, chat_id: int, todo: Todo):
+        partition = self.chats.get(chat_id)
+        if partition is None:
+            # 分区未加载，下次访问时从数据库加载即可
+            return
+        with self.lock:
+            partition.unindex(todo.todo_id)
+            partition.index(todo)
+            partition.evict()
 
-    def delete(self, todo_id: int) -> bool:
-        if todo_id in self.todos:
-            del self.todos[todo_id]
-            return True
-        return False
+    @staticmethod
+    def _by_create_time(todos) -> List[Todo]:
+        return sorted(todos, key=lambda todo: (todo.create_time, todo.todo_id))
 
-    def get_pending(self):
-        return [todo for todo in self.todos.values() if todo.status == "pending"]
+    # ---- 加载 ----
 
-    def get_today_tasks(self, today):
+    async def resync(self, chat_id: Optional[int] = None) -> int:
         """
-        返回截止日期为 today 的任务列表
+        从数据库重新加载缓存。
+        指定 chat_id 时重新加载该会话并返回条数；否则清空所有分区（下次访问时重新加载），返回 0
         """
-        return [todo for todo in self.todos.values()
-                if todo.end_time and todo.end_time.date() == today]
+        if chat_id is None:
+            with self.lock:
+                self.chats.clear()
+            logging.info("待办缓存已清空，各会话将在下次访问时重新加载")
+            return 0
+        partition = await self._load(chat_id)
+        truncated = not partition.has_all
+        logging.info(f"会话 {chat_id} 的待办缓存已加载 {len(partition.todos)} 条{'（已截断）' if truncated else ''}")
+        return len(partition.todos)
+
+    async def warm(self):
+        """启动时预热配置的 CHAT_ID 会话，其他会话首次访问时加载；失败时查询回源数据库"""
+        if not CHAT_ID:
+            return
+        try:
+            await self.resync(int(CHAT_ID))
+        except Exception as e:
+            logging.error(f"预热待办缓存失败: {e}")
+
+    # ---- 写操作 ----
+
+    async def add(self, chat_id: int, create_time: datetime, end_time, todo_name: str) -> Todo:
+        todo = await AsyncTodoDAO.create(chat_id, todo_name, create_time, end_time)
+        self._written(chat_id)
+        self._store(chat_id, todo)
+        return todo
+
+    async def get(self, chat_id: int, todo_id: int) -> Optional[Todo]:
+        partition = await self._partition(chat_id)
+        if partition is not None:
+            todo = partition.todos.get(todo_id)
+            if todo is not None or partition.has_all:
+                self.counters['hits'] += 1
+                return todo
+        self.counters['misses'] += 1
+        todo = await AsyncTodoDAO.get_by_id(chat_id, todo_id)
+        if todo is not None:
+            self._store(chat_id, todo)
+        return todo
+
+    async def mark_as_done(self, chat_id: int, todo_id: int) -> bool:
+        todo = await self.get(chat_id, todo_id)
+        if not todo or todo.status == 'completed':
+            return False
+        if not await AsyncTodoDAO.update_status(chat_id, todo_id, 'completed'):
+            return False
+        self._written(chat_id)
+        partition = self.chats.get(chat_id)
+        with self.lock:
+            if partition is not None:
+                partition.unindex(todo_id)
+            todo.status = 'completed'
+            if partition is not None:
+                partition.index(todo)
+        return True
+
+    async def update_end_time(self, chat_id: int, todo_id: int, new_end_time: datetime) -> bool:
+        if not await AsyncTodoDAO.update_end_time(chat_id, todo_id, new_end_time):
+            return False
+        self._written(chat_id)
+        partition = self.chats.get(chat_id)
+        todo = partition.todos.get(todo_id) if partition is not None else None
+        if todo is not None:
+            with self.lock:
+                partition.unindex(todo_id)
+                todo.end_time = new_end_time
+                partition.index(todo)
+        return True
+
+    async def delete(self, chat_id: int, todo_id: int) -> bool:
+        deleted = await AsyncTodoDAO.delete(chat_id, todo_id)
+        if deleted:
+            self._written(chat_id)
+        partition = self.chats.get(chat_id)
+        if partition is not None:
+            with self.lock:
+                partition.unindex(todo_id)
+        return deleted
+
+    # ---- 查询 ----
+
+    async def get_all(self, chat_id: int) -> List[Todo]:
+        """会话中所有待办事项，按创建时间排序"""
+        partition = await self._partition(chat_id)
+        if partition is None or not partition.has_all:
+            self.counters['misses'] += 1
+            return self._by_create_time(await AsyncTodoDAO.get_all_todos(chat_id))
+        self.counters['hits'] += 1
+        return self._by_create_time(partition.todos.values())
+
+    async def get_pending(self, chat_id: int) -> List[Todo]:
+        """会话中未完成的待办事项，按创建时间排序"""
+        partition = await self._partition(chat_id)
+        if partition is None or not partition.has_all_pending:
+            self.counters['misses'] += 1
+            return self._by_create_time(await AsyncTodoDAO.get_pending_todos(chat_id))
+        self.counters['hits'] += 1
+        return self._by_create_time(partition.todos[i] for i in partition.by_status.get('pending', ()))
+
+    async def get_due(self, chat_id: int, start: datetime, end: datetime) -> List[Todo]:
+        """会话中截止时间在 [start, end) 内的未完成待办事项，按截止时间排序"""
+        partition = await self._partition(chat_id)
+        if partition is None or not partition.has_all_pending:
+            self.counters['misses'] += 1
+            return await AsyncTodoDAO.get_due_todos(chat_id, start, end)
+        self.counters['hits'] += 1
+        low = bisect.bisect_left(partition.due_index, (start.timestamp(), -1))
+        high = bisect.bisect_left(partition.due_index, (end.timestamp(), -1))
+        return [partition.todos[todo_id] for _, todo_id in partition.due_index[low:high]]
+
+    async def get_page(self, chat_id: int, pending_only: bool, cursor: Optional[Tuple] = None,
+                       forward: bool = True, limit: int = 10) -> Page:
+        """分页获取会话中的待办事项，排序与游标语义同 TodoDAO.get_page；缓存不完整时回源数据库"""
+        partition = await self._partition(chat_id)
+        if partition is None or not (partition.has_all_pending if pending_only else partition.has_all):
+            self.counters['misses'] += 1
+            return await AsyncTodoDAO.get_page(chat_id, pending_only, cursor, forward, limit)
+        self.counters['hits'] += 1
+        if pending_only:
+            items = [partition.todos[i] for i in partition.by_status.get('pending', ())]
+        else:
+            items = list(partition.todos.values())
+        return paginate_sorted(items, lambda todo: todo_sort_key(todo, pending_only),
+                               cursor, forward, descending=not pending_only, limit=limit)
+
+    def stats(self) -> dict:
+        partitions = list(self.chats.values())
+        return {
+            'chats': len(partitions),
+            'entries': sum(len(p.todos) for p in partitions),
+            'pending': sum(len(p.by_status.get('pending', ())) for p in partitions),
+            'truncated_chats': sum(1 for p in partitions if not p.has_all),
+            **self.counters,
+        }
+
+
+_shared_repository: Optional[TodoRepository] = None
+
+
+def get_todo_repository() -> TodoRepository:
+    """获取进程共享的待办缓存"""
+    global _shared_repository
+    if _shared_repository is None:
+        _shared_repository = TodoRepository()
+    return _shared_repository
@@ -1,9 +1,14 @@
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from bot.config import TIMEZONE
-from modules.todo.dao import TodoDAO
+from bot.config import TIMEZONE, TODO_PAGE_SIZE
+from modules.todo.dao import AsyncTodoDAO, DueWindow, TodoDAO
+from modules.todo.deadlines import get_deadline_timer
+from modules.pagination import Page, decode_time, encode_time
 from modules.todo.models import Todo
+from modules.todo.repository import get_todo_repository
+from utils.render import render_todo_list
+from utils.tracing import traced
 from modules.database import SessionLocal
 
 
@@ -48,32 +53,56 @@ def parse_todo_input(text: str):
     return None, text.strip()
 
 
-def create_todo(todo_name: str, end_time: Optional[datetime] = None) -> Todo:
-    """创建新的待办事项"""
-    db = SessionLocal()
+def create_todo(chat_id: int, todo_name: str, end_time: Optional[datetime] = None) -> Todo:
+    """在会话中创建新的待办事项"""
     try:
-        todo = Todo(
-            todo_name=todo_name,
-            end_time=end_time,
-            status='pending'
-        )
-        db.add(todo)
-        db.commit()
-        db.refresh(todo)
-        return todo
+        return TodoDAO.create(chat_id, todo_name, datetime.now(TIMEZONE), end_time)
     except Exception as e:
-        db.rollback()
         raise Exception(f"创建待办事项失败: {str(e)}")
-    finally:
-        db.close()
 
 
-def modify_end_time(todo_id: int, new_end_time_str: str) -> bool:
+@traced()
+async def create_todo_async(chat_id: int, todo_name: str, end_time: Optional[datetime] = None) -> Todo:
+    """在会话中创建新的待办事项（异步，经由待办缓存写入）"""
+    try:
+        todo = await get_todo_repository().add(chat_id, datetime.now(TIMEZONE), end_time, todo_name)
+    except Exception as e:
+        raise Exception(f"创建待办事项失败: {str(e)}")
+    get_deadline_timer().schedule(chat_id, todo.todo_id, todo.end_time)
+    return todo
+
+
+def _parse_new_end_time(new_end_time_str: str) -> datetime:
+    """
+    解析并校验新的截止时间字符串，格式为 YYYY-MM-DD [HH:MM]，时间默认为 18:00
+
+    Raises:
+        ValueError: 时间格式错误或新时间早于当前时间
+    """
+    # 处理时间格式
+    if len(new_end_time_str.strip()) == 10:  # YYYY-MM-DD
+        new_end_time_str += " 18:00"
+
+    try:
+        new_end_time = datetime.strptime(new_end_time_str, "%Y-%m-%d %H:%M")
+        new_end_time = TIMEZONE.localize(new_end_time)
+    except ValueError:
+        raise ValueError("截止时间格式错误，请使用 YYYY-MM-DD [HH:MM] 格式，时间可选，默认为 18:00")
+
+    # 检查新的截止时间是否晚于当前时间
+    current_time = datetime.now(TIMEZONE)
+    if new_end_time <= current_time:
+        raise ValueError("新的截止时间必须晚于当前时间")
+    return new_end_time
+
+
+def modify_end_time(chat_id: int, todo_id: int, new_end_time_str: str) -> bool:
     """
     修改指定待办事项的截止时间。
     所有错误检查都在这里完成，确保数据的一致性。
     
     Args:
+        chat_id: 会话ID，只能修改本会话的待办事项
         todo_id: 待办事项ID
         new_end_time_str: 新的截止时间字符串，格式为 YYYY-MM-DD [HH:MM]
         
@@ -85,39 +114,40 @@ def modify_end_time(todo_id: int, new_end_time_str: str) -> bool:
             - 新时间早于当前时间
     """
     # 先检查任务是否存在
-    todo = TodoDAO.get_by_id(todo_id)
+    todo = TodoDAO.get_by_id(chat_id, todo_id)
     if not todo:
         raise ValueError("任务不存在")
 
     if todo.status == 'completed':
         raise ValueError("已完成的任务不能修改截止时间")
 
-    # 处理时间格式
-    if len(new_end_time_str.strip()) == 10:  # YYYY-MM-DD
-        new_end_time_str += " 18:00"
+    new_end_time = _parse_new_end_time(new_end_time_str)
+    return TodoDAO.update_end_time(chat_id, todo_id, new_end_time)
 
-    try:
-        new_end_time = datetime.strptime(new_end_time_str, "%Y-%m-%d %H:%M")
-        new_end_time = TIMEZONE.localize(new_end_time)
 
-        # 检查新的截止时间是否晚于当前时间
-        current_time = datetime.now(TIMEZONE)
-        if new_end_time <= current_time:
-            raise ValueError("新的截止时间必须晚于当前时间")
+@traced()
+async def modify_end_time_async(chat_id: int, todo_id: int, new_end_time_str: str) -> bool:
+    """modify_end_time 的异步版本，校验规则相同"""
+    repository = get_todo_repository()
+    todo = await repository.get(chat_id, todo_id)
+    if not todo:
+        raise ValueError("任务不存在")
 
-        return TodoDAO.update_end_time(todo_id, new_end_time)
+    if todo.status == 'completed':
+        raise ValueError("已完成的任务不能修改截止时间")
 
-    except ValueError as e:
-        if str(e) in ["新的截止时间必须晚于当前时间", "任务不存在", "已完成的任务不能修改截止时间"]:
-            raise
-        raise ValueError("截止时间格式错误，请使用 YYYY-MM-DD [HH:MM] 格式，时间可选，默认为 18:00")
+    new_end_time = _parse_new_end_time(new_end_time_str)
+    if not await repository.update_end_time(chat_id, todo_id, new_end_time):
+        return False
+    get_deadline_timer().schedule(chat_id, todo_id, new_end_time)
+    return True
 
 
-def complete_todo(todo_id: int) -> bool:
-    """完成待办事项"""
+def complete_todo(chat_id: int, todo_id: int) -> bool:
+    """完成会话中的待办事项"""
     db = SessionLocal()
     try:
-        todo = db.query(Todo).filter(Todo.todo_id == todo_id).first()
+        todo = db.query(Todo).filter(Todo.chat_id == chat_id, Todo.todo_id == todo_id).first()
         if todo and todo.status != 'completed':
             todo.status = 'completed'
             db.commit()
@@ -130,73 +160,196 @@ def complete_todo(todo_id: int) -> bool:
         db.close()
 
 
-def delete_todo(todo_id: int) -> bool:
-    """删除待办事项"""
-    todo = TodoDAO.get_by_id(todo_id)
+@traced()
+async def complete_todo_async(chat_id: int, todo_id: int) -> bool:
+    """完成会话中的待办事项（异步）"""
+    try:
+        completed = await get_todo_repository().mark_as_done(chat_id, todo_id)
+    except Exception as e:
+        raise Exception(f"完成待办事项失败: {str(e)}")
+    if completed:
+        get_deadline_timer().cancel(chat_id, todo_id)
+    return completed
+
+
+def delete_todo(chat_id: int, todo_id: int) -> bool:
+    """删除会话中的待办事项"""
+    todo = TodoDAO.get_by_id(chat_id, todo_id)
+    if not todo:
+        raise ValueError("任务不存在")
+    return TodoDAO.delete(chat_id, todo_id)
+
+
+@traced()
+async def delete_todo_async(chat_id: int, todo_id: int) -> bool:
+    """删除会话中的待办事项（异步）"""
+    repository = get_todo_repository()
+    todo = await repository.get(chat_id, todo_id)
     if not todo:
         raise ValueError("任务不存在")
-    return TodoDAO.delete(todo_id)
+    deleted = await repository.delete(chat_id, todo_id)
+    get_deadline_timer().cancel(chat_id, todo_id)
+    return deleted
 
 
-def get_pending_todos() -> List[Todo]:
-    """获取未完成的待办事项"""
+def get_pending_todos(chat_id: int) -> List[Todo]:
+    """获取会话中未完成的待办事项"""
     db = SessionLocal()
     try:
-        return db.query(Todo).filter(Todo.status == 'pending').order_by(Todo.create_time.asc()).all()
+        return db.query(Todo).filter(Todo.chat_id == chat_id, Todo.status == 'pending').order_by(Todo.create_time.asc()).all()
     except Exception as e:
         raise Exception(f"获取未完成待办事项失败: {str(e)}")
     finally:
         db.close()
 
 
-def get_today_todos():
-    """获取今天的待办事项"""
+@traced()
+async def get_pending_todos_async(chat_id: int) -> List[Todo]:
+    """获取会话中未完成的待办事项（异步，优先从待办缓存读取）"""
+    try:
+        return await get_todo_repository().get_pending(chat_id)
+    except Exception as e:
+        raise Exception(f"获取未完成待办事项失败: {str(e)}")
+
+
+def local_day_range(day: date, tz=TIMEZONE) -> Tuple[datetime, datetime]:
+    """
+    返回时区 tz（默认 TIMEZONE）中某一天的 [当天 0 点, 次日 0 点)。
+    两端分别本地化，夏令时切换的日子也是准确的一整天
+    """
+    start = tz.localize(datetime.combine(day, time.min))
+    end = tz.localize(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+# 截止窗口的分组名：今日、明日，以及今日之前截止仍未完成的
+TODAY = 'today'
+TOMORROW = 'tomorrow'
+OVERDUE = 'overdue'
+_DAY_LABELS = (TODAY, TOMORROW)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def due_windows(chat_id: int, day: date, days: int = 1, tz=TIMEZONE, overdue: bool = True) -> List[DueWindow]:
+    """
+    会话的截止窗口：从 day 开始连续 days 天（最多两天，分组名 today、tomorrow），
+    以及 overdue 分组 [1970-01-01, day 0 点)。各窗口互不重叠，按时区 tz 计算
+    """
+    if not 1 <= days <= len(_DAY_LABELS):
+        raise ValueError(f"days 只能是 1 到 {len(_DAY_LABELS)}")
+    windows = [(chat_id, label, *local_day_range(day + timedelta(days=offset), tz))
+               for offset, label in enumerate(_DAY_LABELS[:days])]
+    if overdue:
+        windows.append((chat_id, OVERDUE, _EPOCH, windows[0][2]))
+    return windows
+
+
+def get_due_buckets(windows: Sequence[DueWindow]) -> Dict[Tuple[int, str], List[Todo]]:
+    """一次查询取出 due_windows 生成的所有窗口内的未完成待办事项，按 (会话ID, 分组名) 分组"""
+    return TodoDAO.get_due_windows(list(windows))
+
+
+@traced()
+async def get_due_buckets_async(windows: Sequence[DueWindow]) -> Dict[Tuple[int, str], List[Todo]]:
+    """get_due_buckets 的异步版本，多个会话的窗口可以合并为一次查询"""
+    return await AsyncTodoDAO.get_due_windows(list(windows))
+
+
+def to_local(value: datetime) -> datetime:
+    """把数据库中读出的时间转换为 TIMEZONE 的本地时间用于展示"""
+    if value.tzinfo is None:
+        return TIMEZONE.localize(value)
+    return value.astimezone(TIMEZONE)
+
+
+def get_today_todos(chat_id: int):
+    """获取会话中今天截止的未完成待办事项"""
     today = datetime.now(TIMEZONE).date()
-    return TodoDAO.get_today_todos(today)
+    return TodoDAO.get_due_todos(chat_id, *local_day_range(today))
 
 
-def get_tomorrow_todos():
-    """获取明天截止的待办事项"""
+def get_tomorrow_todos(chat_id: int):
+    """获取会话中明天截止的未完成待办事项"""
     tomorrow = datetime.now(TIMEZONE).date() + timedelta(days=1)
-    return TodoDAO.get_today_todos(tomorrow)
+    return TodoDAO.get_due_todos(chat_id, *local_day_range(tomorrow))
 
 
-def format_todo_list(todos: List[Todo], list_type: str = "all") -> str:
-    """格式化待办事项列表"""
-    if not todos:
-        return f"📝 没有{'未完成的' if list_type == 'pending' else ''}待办事项"
-    
-    result = f"📝 {'未完成的' if list_type == 'pending' else '所有'}待办事项:\n"
-    
-    for todo in todos:
-        # 基本信息
-        result += f"\n━━━━━━━━━━━━━━━\n"
-        result += f"📌 <code>{todo.todo_id}</code> "
-        result += "✅" if todo.status == 'completed' else "⭕️"
-        result += f" {todo.todo_name}\n"
-        
-        # 时间信息
-        result += f"⏰ 创建：{todo.create_time.strftime('%m-%d %H:%M')}"
-        if todo.end_time:
-            time_diff = todo.end_time - datetime.now()
-            if time_diff.days >= 0:
-                days = time_diff.days
-                hours = time_diff.seconds // 3600
-                result += f"\n⏳ 截止：{todo.end_time.strftime('%m-%d %H:%M')}"
-                result += f" (还剩 {days}天{hours}小时)"
-            else:
-                result += f"\n⚠️ 截止：{todo.end_time.strftime('%m-%d %H:%M')} [已过期]"
-    
-    result += "\n━━━━━━━━━━━━━━━"
-    return result
+@traced()
+async def get_today_todos_async(chat_id: int):
+    """获取会话中今天截止的未完成待办事项（异步）"""
+    today = datetime.now(TIMEZONE).date()
+    return await get_todo_repository().get_due(chat_id, *local_day_range(today))
+
+
+@traced()
+async def get_tomorrow_todos_async(chat_id: int):
+    """获取会话中明天截止的未完成待办事项（异步）"""
+    tomorrow = datetime.now(TIMEZONE).date() + timedelta(days=1)
+    return await get_todo_repository().get_due(chat_id, *local_day_range(tomorrow))
+
+
+def format_todo_list(todos: List[Todo], list_type: str = "all") -> List[str]:
+    """格式化待办事项列表，超过 Telegram 长度上限时拆成多条消息"""
+    return render_todo_list(todos, list_type)
 
 
-def get_all_todos() -> List[Todo]:
-    """获取所有待办事项"""
+def get_all_todos(chat_id: int) -> List[Todo]:
+    """获取会话中所有待办事项"""
     db = SessionLocal()
     try:
-        return db.query(Todo).order_by(Todo.create_time.asc()).all()
+        return db.query(Todo).filter(Todo.chat_id == chat_id).order_by(Todo.create_time.asc()).all()
     except Exception as e:
         raise Exception(f"获取所有待办事项失败: {str(e)}")
     finally:
         db.close()
+
+
+@traced()
+async def get_all_todos_async(chat_id: int) -> List[Todo]:
+    """获取会话中所有待办事项（异步，优先从待办缓存读取）"""
+    try:
+        return await get_todo_repository().get_all(chat_id)
+    except Exception as e:
+        raise Exception(f"获取所有待办事项失败: {str(e)}")
+
+
+def encode_todo_cursor(todo: Todo, pending_only: bool) -> str:
+    """把待办事项的分页排序键编码为回调数据中的游标"""
+    key = f"{encode_time(todo.create_time)}:{todo.todo_id}"
+    return key if pending_only else f"{todo.status}:{key}"
+
+
+def decode_todo_cursor(value: str, pending_only: bool) -> Tuple:
+    """
+    encode_todo_cursor 的逆操作
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    parts = value.split(':')
+    if len(parts) != (2 if pending_only else 3):
+        raise ValueError("无效的分页参数")
+    *status, create_time, todo_id = parts
+    return (*status, decode_time(create_time, aware=True), int(todo_id))
+
+
+@traced()
+async def get_todo_page_async(chat_id: int, pending_only: bool, cursor: Optional[str] = None,
+                              forward: bool = True) -> Page:
+    """
+    分页获取会话中的待办事项。
+
+    Args:
+        chat_id: 会话ID
+        pending_only: 只看未完成事项（/demoz）还是全部事项（/demo）
+        cursor: 当前页首条（向前翻）或末条（向后翻）的游标，None 表示第一页
+        forward: True 为下一页，False 为上一页
+    """
+    key = decode_todo_cursor(cursor, pending_only) if cursor else None
+    return await get_todo_repository().get_page(chat_id, pending_only, key, forward, TODO_PAGE_SIZE)
+
+
+@traced()
+async def resync_todos_async(chat_id: int) -> int:
+    """从数据库重新加载会话的待办缓存，返回加载的条数"""
+    return await get_todo_repository().resync(chat_id)
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# bot.config 导入时会校验必填配置，测试不需要真实的值
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test")
+os.environ.setdefault("XAI_API_KEY", "test")
+# 需要数据库的测试使用独立的测试库（需事先 CREATE DATABASE），连不上时跳过
+os.environ["DB_NAME"] = os.getenv("TEST_DB_NAME", "todobot_test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
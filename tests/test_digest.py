@@ -0,0 +1,54 @@
+import asyncio
+
+from bot import scheduler
+from modules.link.models import Link
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+
+
+class FakeLinkService:
+    """每个链接单独成组；第二个链接的摘要在 release 之前不会完成"""
+
+    def __init__(self):
+        self.links = [Link(id=i, user_id=1, url=f"https://example.com/{i}", title=f"Article {i}") for i in (1, 2)]
+        self.release = asyncio.Event()
+
+    async def get_unread_links_async(self, chat_id, limit):
+        return self.links
+
+    def start_summaries(self, links, concurrency, timeout, batch_size):
+        async def first():
+            return {1: "第一篇的摘要"}
+
+        async def second():
+            await self.release.wait()
+            return {}
+
+        return [([links[0]], asyncio.ensure_future(first())), ([links[1]], asyncio.ensure_future(second()))]
+
+
+def test_digest_sends_each_group_as_soon_as_it_is_ready(monkeypatch):
+    service = FakeLinkService()
+    monkeypatch.setattr(scheduler, "LinkService", lambda: service)
+    bot = FakeBot()
+
+    async def scenario():
+        sending = asyncio.ensure_future(scheduler.send_unread_links_summary(bot, 1))
+        for _ in range(20):
+            await asyncio.sleep(0)
+        # 总览和第一篇已经发出，第二篇仍在生成
+        assert len(bot.sent) == 2
+        assert "第一篇的摘要" in bot.sent[1]
+        service.release.set()
+        await sending
+
+    asyncio.run(scenario())
+    assert len(bot.sent) == 3
+    assert "Article 2" in bot.sent[2]
+    assert "摘要暂时无法生成" in bot.sent[2]
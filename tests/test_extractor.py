@@ -0,0 +1,47 @@
+from modules.link.extractor import extract_main_text, fit_to_budget, estimate_tokens
+
+PARAGRAPH = "缓存一致性与延迟之间的取舍，是这篇文章反复讨论的问题，作者给出了三种实现并比较了它们的写放大。"
+
+
+def page(body: str) -> str:
+    return f"<html><head><title>标题</title></head><body>{body}</body></html>"
+
+
+def test_negative_wrapper_around_the_article_is_kept():
+    html = page(
+        '<div id="page" class="layout has-sidebar">'
+        + "".join(f"<p>{PARAGRAPH}第{i}段。</p>" for i in range(5))
+        + '</div><div class="sidebar"><a href="/a">热门文章一</a><a href="/b">热门文章二</a></div>'
+    )
+    text = extract_main_text(html)
+    assert "第0段" in text and "第4段" in text
+    assert "热门文章" not in text
+
+
+def test_noise_inside_the_main_node_is_removed():
+    html = page(
+        '<article class="post">'
+        + "".join(f"<p>{PARAGRAPH}第{i}段。</p>" for i in range(5))
+        + '<div class="share"><a href="/wx">分享到微信</a> <a href="/wb">分享到微博</a></div>'
+        + '<div class="related"><p>相关推荐：另一篇文章</p></div>'
+        + "</article>"
+    )
+    text = extract_main_text(html)
+    assert text.startswith("标题\n")
+    assert "第4段" in text
+    assert "分享到" not in text
+    assert "相关推荐" not in text
+
+
+def test_tag_level_noise_is_dropped():
+    html = page("<nav>首页 关于</nav><script>var x = 1;</script>" + f"<p>{PARAGRAPH}</p>" * 3)
+    text = extract_main_text(html)
+    assert "首页" not in text and "var x" not in text
+    assert PARAGRAPH in text
+
+
+def test_fit_to_budget_stays_within_budget():
+    text = "\n".join(PARAGRAPH for _ in range(50))
+    fitted = fit_to_budget(text, 200)
+    assert estimate_tokens(fitted) <= 200 + 1
+    assert fitted.startswith(PARAGRAPH)
@@ -0,0 +1,195 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.exc import OperationalError
+
+from bot.config import ENRICH_BACKOFF_BASE, ENRICH_BACKOFF_MAX, ENRICH_MAX_ATTEMPTS, ENRICH_VISIBILITY_TIMEOUT
+from modules.link.jobs import EnrichmentQueue, retry_delay
+from modules.link.models import LinkJob
+
+
+@pytest.mark.parametrize("attempts", range(1, 12))
+def test_retry_delay_grows_exponentially_up_to_the_cap(attempts):
+    full = min(ENRICH_BACKOFF_MAX, ENRICH_BACKOFF_BASE * 2 ** (attempts - 1))
+    for _ in range(20):
+        assert full / 2 <= retry_delay(attempts) <= full
+
+
+@pytest.fixture(scope="module")
+def database():
+    from modules.database import close_async_engine, engine, init_db
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"无法连接测试数据库: {str(e).splitlines()[0]}")
+    init_db()
+    yield
+    asyncio.run(close_async_engine())
+
+
+def run(coro):
+    """每个用例一个事件循环；asyncpg 连接不能跨事件循环复用，结束时释放连接池"""
+    from modules.database import close_async_engine
+
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await close_async_engine()
+    return asyncio.run(wrapper())
+
+
+async def reset():
+    from modules.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(LinkJob))
+        await db.commit()
+
+
+async def shift(job_id: int, **values):
+    from modules.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(LinkJob).where(LinkJob.id == job_id).values(**values))
+        await db.commit()
+
+
+async def load(job_id: int) -> LinkJob:
+    from modules.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(LinkJob).where(LinkJob.id == job_id))).scalars().one()
+
+
+def test_claim_fail_and_backoff(database):
+    queue = EnrichmentQueue()
+
+    async def scenario():
+        await reset()
+        job_id = await queue.enqueue(1)
+        job = await queue.claim()
+        assert job.id == job_id and job.status == 'running' and job.attempts == 1
+        # 已领取的任务不会被再次领取
+        assert await queue.claim() is None
+
+        await queue.fail(job, "ValueError: 无法访问链接")
+        stored = await load(job_id)
+        assert stored.status == 'pending'
+        assert stored.last_error == "ValueError: 无法访问链接"
+        # 退避期间不可领取
+        assert stored.run_at > stored.updated_at
+        assert await queue.claim() is None
+
+        await shift(job_id, run_at=stored.updated_at - timedelta(seconds=1))
+        job = await queue.claim()
+        assert job.attempts == 2
+        assert await queue.complete(job) is True
+        assert (await load(job_id)).status == 'done'
+        assert await queue.depth() == {'done': 1}
+
+    run(scenario())
+
+
+def test_fail_gives_up_after_max_attempts(database):
+    queue = EnrichmentQueue()
+
+    async def scenario():
+        await reset()
+        job_id = await queue.enqueue(1)
+        job = await queue.claim()
+        job.attempts = ENRICH_MAX_ATTEMPTS
+        await queue.fail(job, "boom")
+        assert (await load(job_id)).status == 'failed'
+
+    run(scenario())
+
+
+def test_stale_running_job_is_reclaimed_until_attempts_run_out(database):
+    queue = EnrichmentQueue()
+
+    async def scenario():
+        await reset()
+        job_id = await queue.enqueue(1)
+        job = await queue.claim()
+        stale = job.locked_at - timedelta(seconds=ENRICH_VISIBILITY_TIMEOUT + 1)
+
+        # worker 退出后任务停留在 running：超时后重新领取
+        await shift(job_id, locked_at=stale)
+        job = await queue.claim()
+        assert job.id == job_id and job.attempts == 2
+
+        # 尝试次数用完后不再领取，标记为 failed
+        await shift(job_id, locked_at=stale, attempts=ENRICH_MAX_ATTEMPTS)
+        assert await queue.claim() is None
+        stored = await load(job_id)
+        assert stored.status == 'failed'
+        assert stored.attempts == ENRICH_MAX_ATTEMPTS
+
+    run(scenario())
+
+
+def test_prune_removes_only_old_done_jobs(database):
+    queue = EnrichmentQueue()
+
+    async def scenario():
+        await reset()
+        old_done, recent_done, failed = [await queue.enqueue(i) for i in (1, 2, 3)]
+        for job_id in (old_done, recent_done):
+            await shift(job_id, status='done')
+        await shift(failed, status='failed')
+        now = (await load(failed)).updated_at
+        await shift(old_done, updated_at=now - timedelta(days=30))
+        await shift(failed, updated_at=now - timedelta(days=30))
+
+        assert await queue.prune(retention=timedelta(days=7).total_seconds()) == 1
+        assert await queue.depth() == {'done': 1, 'failed': 1}
+
+    run(scenario())
+
+
+def test_worker_that_lost_its_lease_cannot_overwrite_the_new_owner(database):
+    queue = EnrichmentQueue()
+
+    async def scenario():
+        await reset()
+        job_id = await queue.enqueue(1)
+        stale_job = await queue.claim()
+        await shift(job_id, locked_at=stale_job.locked_at - timedelta(seconds=ENRICH_VISIBILITY_TIMEOUT + 1))
+        job = await queue.claim()
+        assert job.attempts == stale_job.attempts + 1
+
+        # 超时的旧持有者完成或失败都不影响新持有者
+        assert await queue.complete(stale_job) is False
+        assert await queue.fail(stale_job, "boom") is False
+        stored = await load(job_id)
+        assert stored.status == 'running' and stored.attempts == job.attempts and stored.last_error is None
+
+        assert await queue.complete(job) is True
+        assert (await load(job_id)).status == 'done'
+        # 已完成的任务不能再被标记
+        assert await queue.fail(job, "boom") is False
+
+    run(scenario())
+
+
+def test_save_link_enqueues_in_the_same_transaction(database):
+    from modules.link.models import Link
+    from modules.link.service import LinkService
+    service = LinkService()
+
+    async def scenario():
+        from modules.database import AsyncSessionLocal
+        await reset()
+        response = await service.save_link(-3001, "值得一读 https://example.com/jobs-test")
+        assert response.startswith("✅")
+        async with AsyncSessionLocal() as db:
+            link = (await db.execute(
+                select(Link).where(Link.user_id == -3001).order_by(Link.id.desc())
+            )).scalars().first()
+            jobs = (await db.execute(select(LinkJob).where(LinkJob.link_id == link.id))).scalars().all()
+            await db.execute(delete(Link).where(Link.user_id == -3001))
+            await db.commit()
+        assert [(job.kind, job.status) for job in jobs] == [('enrich', 'pending')]
+
+    run(scenario())
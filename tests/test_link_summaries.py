@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import pytest
+
+from modules.link import ai_service as ai_service_module
+from modules.link.ai_cache import AIResultCache
+from modules.link.ai_service import AIService
+from modules.link.models import Link
+from modules.link.service import LinkService
+
+
+class MemoryCache(AIResultCache):
+    """只用进程内存的缓存，不访问数据库"""
+
+    async def get(self, key):
+        return self._memory.get(key)
+
+    async def put(self, key, result, url=None):
+        self._remember(key, result)
+
+
+class FakeClient:
+    """正文中含有 hang 的请求一直不返回，其余请求返回固定摘要"""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def post_json(self, payload):
+        self.requests += 1
+        prompt = payload["messages"][-1]["content"]
+        if "hang" in prompt:
+            await asyncio.sleep(3600)
+        return {"choices": [{"message": {"content": "一段摘要"}}]}
+
+
+def make_service(client=None) -> LinkService:
+    service = LinkService()
+    service.ai_service = AIService(client=client or FakeClient(), cache=MemoryCache())
+    service._write_back_summary = _no_write_back
+    return service
+
+
+async def _no_write_back(link, summary):
+    link.summary = summary
+
+
+def make_links(count):
+    return [Link(id=i, user_id=1, url=f"https://example.com/{i}", title=f"Article {i}") for i in range(1, count + 1)]
+
+
+def test_generate_summaries_keeps_finished_items_on_timeout(monkeypatch):
+    monkeypatch.setattr(ai_service_module, "LLM_BATCH_MAX_ITEMS", 1)
+    service = AIService(client=FakeClient(), cache=MemoryCache())
+    items = [(1, "https://example.com/1", "正常内容"), (2, "https://example.com/2", "hang")]
+
+    async def scenario():
+        start = time.monotonic()
+        results = await service.generate_summaries(items, timeout=0.2)
+        return results, time.monotonic() - start
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == {1: "一段摘要"}
+    assert elapsed < 1
+
+
+def test_summarize_many_deadline_covers_semaphore_wait():
+    service = make_service()
+
+    async def slow_fetch(url, task):
+        await asyncio.sleep(3600)
+
+    service._fetch_text = slow_fetch
+    links = make_links(4)
+
+    async def scenario():
+        start = time.monotonic()
+        # 并发为 1：排在后面的链接若只在拿到信号量后才开始计时，总耗时会是时限的 4 倍
+        results = await service.summarize_many(links, concurrency=1, timeout=0.2, batch_size=1)
+        return results, time.monotonic() - start
+
+    results, elapsed = asyncio.run(scenario())
+    assert results == {}
+    assert elapsed < 0.6
+
+
+def test_summarize_many_keeps_other_groups_when_one_times_out():
+    service = make_service()
+
+    async def fetch(url, task):
+        return "hang" if url.endswith("/2") else f"正文 {url}"
+
+    service._fetch_text = fetch
+    links = make_links(4)
+
+    # 第一组的批量请求一直不返回，只影响同组的链接
+    results = asyncio.run(service.summarize_many(links, concurrency=4, timeout=0.2, batch_size=2))
+    assert results == {3: "一段摘要", 4: "一段摘要"}
+    assert links[2].summary == "一段摘要"
+    assert links[0].summary is None
+
+
+def test_start_summaries_groups_complete_independently():
+    service = make_service()
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def fetch(url, task):
+            if url.endswith("/3"):
+                await gate.wait()
+            return f"正文 {url}"
+
+        service._fetch_text = fetch
+        groups = service.start_summaries(make_links(3), concurrency=3, timeout=5, batch_size=2)
+        assert [[link.id for link in group] for group, _ in groups] == [[1, 2], [3]]
+        first = await groups[0][1]
+        # 第一组不必等待第二组的抓取
+        assert not groups[1][1].done()
+        gate.set()
+        second = await groups[1][1]
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert set(first) == {1, 2}
+    assert set(second) == {3}
+
+
+def test_parse_batch_response_skips_malformed_entries():
+    text = '```json\n{"summaries": [{"id": 1, "summary": " 摘要一 "}, "oops", null, 3, {"id": 2, "summary": ""}]}\n```'
+    assert AIService._parse_batch_response(text) == {1: "摘要一"}
+
+
+def test_parse_batch_response_skips_entries_with_bad_ids():
+    text = ('{"summaries": [{"id": "文档3", "summary": "坏编号"}, {"id": "4", "summary": "摘要四"}, '
+            '{"summary": "缺少 id"}, {"id": null, "summary": "空编号"}, {"id": [5], "summary": "列表编号"}, '
+            '{"id": 6, "summary": "摘要六"}]}')
+    assert AIService._parse_batch_response(text) == {4: "摘要四", 6: "摘要六"}
+
+
+def test_parse_batch_response_rejects_unexpected_shapes():
+    for text in ('没有 JSON', '{"summaries": "摘要"}', '{"summaries": {"1": "摘要"}}'):
+        with pytest.raises(ValueError):
+            AIService._parse_batch_response(text)
+
+
+def test_batch_with_malformed_entries_falls_back_per_item():
+    class BatchClient(FakeClient):
+        async def post_json(self, payload):
+            self.requests += 1
+            prompt = payload["messages"][-1]["content"]
+            if "篇文档" in prompt:
+                return {"choices": [{"message": {"content": '{"summaries": [{"id": 1, "summary": "批量摘要"}, "坏条目"]}'}}]}
+            return {"choices": [{"message": {"content": "单条摘要"}}]}
+
+    client = BatchClient()
+    service = AIService(client=client, cache=MemoryCache())
+    items = [(1, "https://example.com/1", "内容一"), (2, "https://example.com/2", "内容二")]
+    assert asyncio.run(service.generate_summaries(items)) == {1: "批量摘要", 2: "单条摘要"}
+    assert client.requests == 2
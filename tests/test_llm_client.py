@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from modules.link.llm_client import CircuitBreaker, CircuitOpenError, LLMClient, LLMError
+
+
+def make_client(threshold: int = 1, reset: float = 0.0) -> LLMClient:
+    client = LLMClient(api_url="http://llm.invalid", api_key="test")
+    client.breaker = CircuitBreaker(threshold, reset)
+    client.max_retries = 0
+    return client
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_reset():
+    breaker = CircuitBreaker(2, 60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    breaker.opened_at -= 61
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # 试探请求未结束前不放行第二个
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(1, 0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_cancelled_probe_releases_slot():
+    client = make_client()
+    client.breaker.record_failure()
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(3600)
+
+        probe = asyncio.ensure_future(client._with_retries(hang))
+        await started.wait()
+        assert not client.breaker.allow()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(scenario())
+    assert client.breaker.state == "half_open"
+    assert client.breaker.allow()
+
+
+def test_unexpected_probe_error_releases_slot():
+    client = make_client()
+    client.breaker.record_failure()
+
+    async def broken():
+        raise ValueError("响应不是合法的 JSON")
+
+    with pytest.raises(ValueError):
+        asyncio.run(client._with_retries(broken))
+    assert client.breaker.allow()
+
+
+def test_cancelled_request_does_not_release_another_callers_probe():
+    client = make_client(threshold=1, reset=0)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(3600)
+
+        # closed 状态下发出的普通请求
+        slow = asyncio.ensure_future(client._with_retries(hang))
+        await started.wait()
+        client.breaker.record_failure()
+        assert client.breaker.allow()  # 另一个调用者占用了试探名额
+        slow.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await slow
+        assert not client.breaker.allow()
+
+    asyncio.run(scenario())
+
+
+def test_open_breaker_rejects_immediately():
+    client = make_client(reset=60)
+    client.breaker.record_failure()
+
+    async def never_called():
+        raise AssertionError("熔断时不应发出请求")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client._with_retries(never_called))
+
+
+def test_non_retryable_error_does_not_count_as_failure():
+    client = make_client(threshold=1)
+
+    async def bad_request():
+        raise LLMError("bad request", status=400)
+
+    with pytest.raises(LLMError):
+        asyncio.run(client._with_retries(bad_request))
+    assert client.breaker.state == "closed"
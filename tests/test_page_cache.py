@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.link.page_cache import DISK_ENTRY_MAX_RATIO, CachedPage, PageCache
+
+
+def page(i: int, size: int) -> CachedPage:
+    return CachedPage(f"https://example.com/{i}", 200, "x" * size, etag=f'"{i}"', expires_at=1e12)
+
+
+def test_concurrent_disk_writes_keep_usage_accurate_and_within_budget(tmp_path):
+    cache = PageCache(cache_dir=str(tmp_path), disk_bytes=200_000)
+    pages = [page(i % 60, 1000 + (i * 37) % 9000) for i in range(600)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(cache._disk_write, pages))
+
+    assert cache._disk_used == cache._scan_disk_usage()
+    assert cache._disk_used <= cache.disk_bytes
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_oversized_body_is_not_written_to_disk(tmp_path):
+    cache = PageCache(cache_dir=str(tmp_path), disk_bytes=100_000)
+    small = page(1, 1000)
+    cache._disk_write(small)
+    assert cache._disk_read(small.url).text == small.text
+
+    # 同一 URL 的正文变得过大：不写入，并删除旧版本
+    large = page(1, int(cache.disk_bytes * DISK_ENTRY_MAX_RATIO) + 1)
+    cache._disk_write(large)
+    assert cache._disk_read(large.url) is None
+    assert cache._disk_used == 0 == cache._scan_disk_usage()
+
+
+def test_prune_removes_oldest_files_first(tmp_path):
+    cache = PageCache(cache_dir=str(tmp_path), disk_bytes=50_000)
+    for i in range(20):
+        cache._disk_write(page(i, 4000))
+    assert cache._disk_used == cache._scan_disk_usage() <= cache.disk_bytes
+    assert cache._disk_read(page(19, 0).url) is not None
+    assert cache._disk_read(page(0, 0).url) is None
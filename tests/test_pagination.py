@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from modules.link.models import Link
+from modules.link.service import LinkService
+from modules.pagination import decode_time, encode_time, paginate_sorted
+
+BASE = datetime(2026, 10, 16, 8, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def make_links():
+    # 每两条共用一个保存时间，翻页边界落在相同时间的两条之间
+    return [Link(id=i, user_id=1, url=f"https://example.com/{i}", created_at=BASE - timedelta(minutes=i // 2))
+            for i in range(1, 8)]
+
+
+def link_key(link):
+    return link.created_at, link.id
+
+
+def page(links, cursor, forward=True):
+    return paginate_sorted(links, link_key, cursor, forward, descending=True, limit=3)
+
+
+def test_time_round_trip_keeps_awareness():
+    naive = BASE.replace(tzinfo=None)
+    assert decode_time(encode_time(BASE), aware=True) == BASE
+    assert decode_time(encode_time(BASE), aware=True).tzinfo is not None
+    assert decode_time(encode_time(naive), aware=False) == naive
+
+
+def test_unread_cursor_round_trip():
+    link = make_links()[2]
+    cursor = LinkService.encode_unread_cursor(link)
+    assert LinkService.decode_unread_cursor(cursor) == (link.created_at, link.id)
+
+
+def test_unread_cursor_walks_pages_at_tied_timestamps():
+    links = make_links()
+    expected = [link.id for link in sorted(links, key=link_key, reverse=True)]
+
+    seen = []
+    cursor = None
+    while True:
+        result = page(links, cursor)
+        seen.extend(link.id for link in result.items)
+        if not result.has_next:
+            break
+        cursor = LinkService.decode_unread_cursor(LinkService.encode_unread_cursor(result.items[-1]))
+    assert seen == expected
+
+    # 从第二页向前翻回到第一页
+    first = page(links, None)
+    second = page(links, LinkService.decode_unread_cursor(LinkService.encode_unread_cursor(first.items[-1])))
+    back = page(links, LinkService.decode_unread_cursor(LinkService.encode_unread_cursor(second.items[0])),
+                forward=False)
+    assert [link.id for link in back.items] == [link.id for link in first.items]
+    assert not back.has_prev and back.has_next
+
+
+@pytest.mark.parametrize("value", ["", "123", "abc:1", "1:2:3"])
+def test_unread_cursor_rejects_malformed_values(value):
+    with pytest.raises(ValueError):
+        LinkService.decode_unread_cursor(value)
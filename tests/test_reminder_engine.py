@@ -0,0 +1,204 @@
+import asyncio
+from datetime import datetime, time, timedelta
+
+import pytest
+import pytz
+from telegram.error import Forbidden
+
+from bot import scheduler
+from modules.reminder import service as reminder_service
+from modules.reminder.models import Reminder
+from modules.reminder.service import next_fire_time
+from modules.todo import service as todo_service
+from modules.todo.models import Todo
+
+NOW = datetime(2026, 10, 16, 1, 0, tzinfo=pytz.utc)  # 上海时间 09:00
+
+
+def test_next_fire_time_is_later_today_or_tomorrow():
+    assert next_fire_time(time(10, 0), "Asia/Shanghai", NOW) == datetime(2026, 10, 16, 2, 0, tzinfo=pytz.utc)
+    assert next_fire_time(time(9, 0), "Asia/Shanghai", NOW) == datetime(2026, 10, 17, 1, 0, tzinfo=pytz.utc)
+
+
+def test_next_fire_time_handles_dst_transitions():
+    # 2026-03-08 02:30 在纽约不存在，顺延到 03:30 EDT
+    before_gap = datetime(2026, 3, 8, 5, 0, tzinfo=pytz.utc)
+    assert next_fire_time(time(2, 30), "America/New_York", before_gap) == datetime(2026, 3, 8, 7, 30, tzinfo=pytz.utc)
+    # 2026-11-01 01:30 在纽约出现两次，取第一次（EDT）
+    before_overlap = datetime(2026, 11, 1, 4, 0, tzinfo=pytz.utc)
+    assert next_fire_time(time(1, 30), "America/New_York", before_overlap) == datetime(2026, 11, 1, 5, 30,
+                                                                                       tzinfo=pytz.utc)
+
+
+def test_unknown_timezone_is_rejected():
+    with pytest.raises(ValueError):
+        next_fire_time(time(9, 0), "Mars/Olympus", NOW)
+
+
+class FakeBot:
+    def __init__(self, blocked=()):
+        self.sent = []
+        self.blocked = set(blocked)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        self.sent.append((chat_id, text))
+
+
+class FakeReminderDAO:
+    """按 next_fire_at 领取并推进，与 AsyncReminderDAO.claim_due 语义相同"""
+
+    def __init__(self, reminders):
+        self.reminders = reminders
+        self.disabled = set()
+        self.claims = 0
+
+    async def claim_due(self, now, limit, next_fire_at):
+        self.claims += 1
+        due = sorted((r for r in self.reminders if r.enabled and r.next_fire_at <= now),
+                     key=lambda r: r.next_fire_at)[:limit]
+        claimed = []
+        for reminder in due:
+            scheduled_at = reminder.next_fire_at
+            reminder.next_fire_at = next_fire_at(reminder)
+            claimed.append((reminder, scheduled_at))
+        return claimed
+
+    async def enroll(self, rows):
+        existing = {(r.chat_id, r.kind): r for r in self.reminders}
+        for row in rows:
+            current = existing.get((row['chat_id'], row['kind']))
+            if current is None:
+                self.reminders.append(Reminder(**row))
+            else:
+                current.enabled = True
+
+    async def disable_chats(self, chat_ids):
+        self.disabled |= set(chat_ids)
+        for reminder in self.reminders:
+            if reminder.chat_id in chat_ids:
+                reminder.enabled = False
+
+
+def reminder(chat_id, kind, scheduled_at=NOW, tz="Asia/Shanghai"):
+    local = scheduled_at.astimezone(pytz.timezone(tz)).time()
+    return Reminder(chat_id=chat_id, kind=kind, local_time=local, timezone=tz, enabled=True,
+                    next_fire_at=scheduled_at)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    buckets_calls = []
+    digests = []
+
+    async def get_due_buckets_async(windows):
+        windows = list(windows)
+        buckets_calls.append(windows)
+        grouped = {(chat_id, label): [] for chat_id, label, _, _ in windows}
+        grouped[(1, todo_service.TODAY)] = [Todo(todo_id=3, chat_id=1, todo_name="交周报", status='pending')]
+        return grouped
+
+    async def send_unread_links_summary(bot, chat_id):
+        digests.append(chat_id)
+        await bot.send_message(chat_id=chat_id, text="📚 今天没有未读的链接")
+
+    monkeypatch.setattr(scheduler.todo_service, "get_due_buckets_async", get_due_buckets_async)
+    monkeypatch.setattr(scheduler, "send_unread_links_summary", send_unread_links_summary)
+
+    def make(reminders, bot=None):
+        dao = FakeReminderDAO(reminders)
+        monkeypatch.setattr(scheduler, "AsyncReminderDAO", dao)
+        monkeypatch.setattr(reminder_service, "AsyncReminderDAO", dao)
+        monkeypatch.setattr(reminder_service, "_enrolled", set())
+        instance = scheduler.ReminderEngine(bot or FakeBot())
+        instance.buckets_calls = buckets_calls
+        instance.digests = digests
+        instance.dao = dao
+        return instance
+
+    return make
+
+
+def run_tick(engine, now=NOW):
+    async def scenario():
+        await engine.fire(await engine.dao.claim_due(now, 100, lambda r: reminder_service.advance(r, now)), now)
+    asyncio.run(scenario())
+
+
+def test_fires_due_reminders_with_one_bucket_query(engine):
+    reminders = [
+        reminder(1, reminder_service.MORNING),
+        reminder(1, reminder_service.AFTERNOON),
+        reminder(2, reminder_service.MORNING),
+        reminder(3, reminder_service.DIGEST),
+        reminder(4, reminder_service.MORNING, scheduled_at=NOW + timedelta(minutes=1)),
+    ]
+    instance = engine(reminders)
+    run_tick(instance)
+
+    chats = [chat_id for chat_id, _ in instance.bot.sent]
+    assert sorted(set(chats)) == [1, 2, 3]
+    assert len(instance.buckets_calls) == 1
+    # 会话 1 的早间和下午提醒共用今日、已过期窗口
+    windows = instance.buckets_calls[0]
+    assert len(windows) == len({window[:2] for window in windows})
+    assert any("交周报" in text for chat_id, text in instance.bot.sent if chat_id == 1)
+    assert instance.digests == [3]
+    # 已触发的提醒推进到明天，未到时间的保持不变
+    assert reminders[0].next_fire_at == NOW + timedelta(days=1)
+    assert reminders[4].next_fire_at == NOW + timedelta(minutes=1)
+    assert instance.counters['fired'] == 4
+
+
+def test_late_reminders_are_skipped(engine):
+    late = NOW - timedelta(seconds=scheduler.REMINDER_MAX_LATENESS + 60)
+    reminders = [reminder(1, reminder_service.MORNING, scheduled_at=late)]
+    instance = engine(reminders)
+    run_tick(instance)
+    assert instance.bot.sent == []
+    assert instance.counters['skipped_late'] == 1
+    assert reminders[0].next_fire_at > NOW
+
+
+def test_blocked_chats_are_disabled(engine):
+    reminders = [reminder(1, reminder_service.MORNING), reminder(5, reminder_service.DIGEST),
+                 reminder(6, reminder_service.MORNING)]
+    instance = engine(reminders, FakeBot(blocked={5, 6}))
+    run_tick(instance)
+    assert instance.dao.disabled == {5, 6}
+    assert instance.counters['blocked_chats'] == 2
+    assert [chat_id for chat_id, _ in instance.bot.sent] == [1]
+
+
+def test_blocked_chat_is_reenabled_when_it_becomes_active_again(engine):
+    reminders = [reminder(7, reminder_service.MORNING)]
+    bot = FakeBot(blocked={7})
+    instance = engine(reminders, bot)
+    asyncio.run(reminder_service.ensure_reminders(7, [reminder_service.MORNING]))
+
+    run_tick(instance)
+    assert reminders[0].enabled is False
+    assert bot.sent == []
+
+    # 用户解除屏蔽后再次使用机器人
+    bot.blocked.clear()
+    asyncio.run(reminder_service.ensure_reminders(7, [reminder_service.MORNING]))
+    assert reminders[0].enabled is True
+    # 已有的提醒时间保持不变
+    assert reminders[0].local_time == time(9, 0)
+
+    run_tick(instance, NOW + timedelta(days=1))
+    assert [chat_id for chat_id, _ in bot.sent] == [7]
+
+
+def test_tick_claims_in_batches_until_drained(engine, monkeypatch):
+    monkeypatch.setattr(scheduler, "REMINDER_BATCH_SIZE", 2)
+    monkeypatch.setattr(scheduler, "datetime", type("FrozenDatetime", (datetime,), {
+        "now": classmethod(lambda cls, tz=None: NOW)
+    }))
+    reminders = [reminder(chat_id, reminder_service.MORNING) for chat_id in range(1, 6)]
+    instance = engine(reminders)
+    asyncio.run(instance.tick())
+    assert instance.dao.claims == 3
+    assert sorted(chat_id for chat_id, _ in instance.bot.sent) == [1, 2, 3, 4, 5]
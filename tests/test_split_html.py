@@ -0,0 +1,81 @@
+import random
+import re
+
+import pytest
+
+from utils.render import pack_messages, split_html
+
+_TAG = re.compile(r"<(/?)([a-z]+)[^>]*>")
+_OPEN_TAGS = ['<b>', '<i>', '<u>', '<s>', '<code>', '<a href="https://example.com/post?id=1&amp;x=2">']
+
+
+def visible(html: str) -> str:
+    """去掉标签和所有空白后的文本，用于比较切分前后内容是否一致"""
+    return re.sub(r"\s+", "", re.sub(r"<[^>]*>", "", html))
+
+
+def assert_balanced(chunk: str):
+    stack = []
+    for closing, name in _TAG.findall(chunk):
+        if closing:
+            assert stack and stack.pop() == name, chunk
+        else:
+            stack.append(name)
+    assert not stack, chunk
+
+
+def random_html(rng: random.Random, depth: int, words: int) -> str:
+    out = []
+    for _ in range(words):
+        roll = rng.random()
+        if roll < 0.15 and depth < 6:
+            tag = rng.choice(_OPEN_TAGS)
+            name = _TAG.match(tag).group(2)
+            out.append(f"{tag}{random_html(rng, depth + 1, rng.randint(1, 6))}</{name}>")
+        elif roll < 0.25:
+            out.append(rng.choice(["&amp;", "&lt;", "&#8212;", "\n"]))
+        else:
+            out.append(rng.choice(["word", "缓存一致性", "x" * rng.randint(1, 40)]) + " ")
+    return "".join(out)
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("limit", [16, 24, 40, 64, 200])
+def test_chunks_never_exceed_limit(seed, limit):
+    rng = random.Random(seed)
+    text = random_html(rng, 0, 60)
+    chunks = split_html(text, limit)
+    assert all(len(chunk) <= limit for chunk in chunks), [len(c) for c in chunks]
+    assert visible("".join(chunks)) == visible(text)
+    for chunk in chunks:
+        assert_balanced(chunk)
+
+
+def test_reopened_tags_are_counted():
+    text = "<b><i>" + "字" * 50 + "</i></b>"
+    chunks = split_html(text, 20)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert all(chunk.startswith("<b><i>") and chunk.endswith("</i></b>") for chunk in chunks)
+
+
+def test_degrades_to_plain_text_when_tag_overhead_exceeds_limit():
+    text = '<b><i><u><s><code>' + "x" * 100 + '</code></s></u></i></b>'
+    chunks = split_html(text, 30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert "".join(chunks) == "x" * 100
+
+
+def test_raises_when_a_single_entity_cannot_fit():
+    with pytest.raises(ValueError):
+        split_html("&#8212;" * 10, 5)
+
+
+def test_short_text_is_returned_unchanged():
+    assert split_html("<b>短</b>", 100) == ["<b>短</b>"]
+
+
+def test_pack_messages_respects_limit():
+    blocks = [f"<b>条目 {i}</b> " + "内容" * (i % 30) for i in range(200)]
+    messages = pack_messages(blocks, header="<b>标题</b>", limit=120)
+    assert all(len(message) <= 120 for message in messages)
+    assert messages[0].startswith("<b>标题</b>")
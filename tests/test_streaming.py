@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+from modules.link.streaming import EMPTY_RESULT_TEXT, StreamingReply
+
+
+class FakeMessage:
+    """模拟 Telegram 消息：空文本或无效 HTML 与真实接口一样被拒绝"""
+
+    def __init__(self, text="🤖 正在生成摘要，请稍候...", throttled=0):
+        self.text = text
+        self.edits = []
+        self.replies = []
+        self.throttled = throttled  # 接下来被限流的编辑次数
+
+    async def edit_text(self, text, parse_mode=None, **kwargs):
+        if self.throttled:
+            self.throttled -= 1
+            raise RetryAfter(0)
+        if not text.strip():
+            raise BadRequest("Message text is empty")
+        if parse_mode == ParseMode.HTML and "<unknown>" in text:
+            raise BadRequest("Can't parse entities")
+        self.edits.append((text, parse_mode))
+        self.text = text
+
+    async def reply_text(self, text, parse_mode=None, **kwargs):
+        self.replies.append(text)
+
+
+@pytest.mark.parametrize("final", ["", "   \n", "<b> </b>"])
+def test_empty_result_replaces_status_with_fallback(final):
+    message = FakeMessage()
+    asyncio.run(StreamingReply(message).finish(final))
+    assert message.text == EMPTY_RESULT_TEXT
+    assert len(message.edits) == 1
+
+
+def test_finish_edits_final_html():
+    message = FakeMessage()
+    reply = StreamingReply(message, interval=0)
+
+    async def scenario():
+        await reply.update("部分")
+        await reply.finish("<b>完整</b>摘要")
+
+    asyncio.run(scenario())
+    assert message.edits == [("部分 ▌", None), ("<b>完整</b>摘要", ParseMode.HTML)]
+
+
+def test_finish_falls_back_to_plain_text_when_html_is_rejected():
+    message = FakeMessage()
+    asyncio.run(StreamingReply(message).finish("<unknown>摘要"))
+    assert message.edits == [("<unknown>摘要", None)]
+
+
+def test_long_result_is_split_into_follow_up_messages():
+    message = FakeMessage()
+    asyncio.run(StreamingReply(message).finish("<b>" + "字" * 5000 + "</b>"))
+    assert len(message.edits) == 1
+    assert len(message.replies) == 1
+    assert message.replies[0].startswith("<b>") and message.replies[0].endswith("</b>")
+
+
+def test_final_edit_is_retried_after_flood_wait():
+    message = FakeMessage()
+    reply = StreamingReply(message, interval=0)
+
+    async def scenario():
+        await reply.update("部分")
+        message.throttled = 1
+        await reply.finish("<b>完整</b>摘要")
+
+    asyncio.run(scenario())
+    assert message.text == "<b>完整</b>摘要"
+    assert message.edits[-1] == ("<b>完整</b>摘要", ParseMode.HTML)
+
+
+def test_intermediate_edit_is_skipped_when_throttled():
+    message = FakeMessage(throttled=1)
+    reply = StreamingReply(message, interval=0)
+    asyncio.run(reply.update("部分"))
+    assert message.edits == []
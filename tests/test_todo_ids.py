@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+
+from modules.todo.dao import AsyncTodoDAO, TodoDAO, _next_id_statement
+from modules.todo.models import Todo, TodoCounter
+
+# 测试数据所属的两个会话
+CHAT, OTHER_CHAT = -2001, -2002
+
+
+def test_todo_primary_key_is_scoped_by_chat():
+    assert [column.name for column in Todo.__table__.primary_key.columns] == ['chat_id', 'todo_id']
+    assert Todo.__table__.c.todo_id.autoincrement is False
+
+
+def test_next_id_increments_the_chat_counter():
+    sql = str(_next_id_statement(42).compile(dialect=postgresql.dialect()))
+    assert "INSERT INTO todo_counters" in sql
+    assert "ON CONFLICT (chat_id) DO UPDATE SET last_id = (todo_counters.last_id +" in sql
+    assert sql.rstrip().endswith("RETURNING todo_counters.last_id")
+
+
+@pytest.fixture(scope="module")
+def database():
+    from modules.database import close_async_engine, engine, init_db
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"无法连接测试数据库: {str(e).splitlines()[0]}")
+    init_db()
+    yield
+    asyncio.run(close_async_engine())
+
+
+def run(coro):
+    """每个用例一个事件循环；asyncpg 连接不能跨事件循环复用，结束时释放连接池"""
+    from modules.database import close_async_engine
+
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await close_async_engine()
+    return asyncio.run(wrapper())
+
+
+def reset():
+    from modules.database import SessionLocal
+    db = SessionLocal()
+    try:
+        for chat_id in (CHAT, OTHER_CHAT):
+            db.execute(delete(Todo).where(Todo.chat_id == chat_id))
+            db.execute(delete(TodoCounter).where(TodoCounter.chat_id == chat_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_ids_are_numbered_per_chat(database):
+    reset()
+    now = datetime.now(timezone.utc)
+    assert [TodoDAO.create(CHAT, f"事项 {i}", now).todo_id for i in range(3)] == [1, 2, 3]
+    assert run(AsyncTodoDAO.create(OTHER_CHAT, "另一个会话", now)).todo_id == 1
+    assert run(AsyncTodoDAO.create(CHAT, "事项 3", now)).todo_id == 4
+
+
+def test_async_writes_address_todos_by_chat_and_id(database):
+    reset()
+    now = datetime.now(timezone.utc)
+    TodoDAO.create(CHAT, "交周报", now)
+    TodoDAO.create(OTHER_CHAT, "别的会话的 1 号", now)
+    deadline = now + timedelta(days=1)
+
+    async def scenario():
+        assert await AsyncTodoDAO.update_end_time(CHAT, 1, deadline) is True
+        assert await AsyncTodoDAO.update_status(CHAT, 1, 'completed') is True
+        with pytest.raises(ValueError):
+            await AsyncTodoDAO.update_end_time(CHAT, 1, deadline + timedelta(days=1))
+        # 不存在的编号
+        assert await AsyncTodoDAO.update_status(CHAT, 9, 'completed') is False
+        assert await AsyncTodoDAO.update_end_time(CHAT, 9, deadline) is False
+        assert await AsyncTodoDAO.delete(CHAT, 9) is False
+
+        todo = await AsyncTodoDAO.get_by_id(CHAT, 1)
+        assert todo.status == 'completed' and todo.end_time == deadline
+        # 另一个会话的同号待办不受影响
+        other = await AsyncTodoDAO.get_by_id(OTHER_CHAT, 1)
+        assert other.status == 'pending' and other.end_time is None
+
+        assert await AsyncTodoDAO.delete(CHAT, 1) is True
+        assert await AsyncTodoDAO.get_by_id(CHAT, 1) is None
+        assert await AsyncTodoDAO.get_by_id(OTHER_CHAT, 1) is not None
+
+    run(scenario())
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from modules.todo import repository as repository_module
+from modules.todo.models import Todo
+from modules.todo.repository import TodoRepository
+
+CHAT = 42
+NOW = datetime(2026, 10, 16, 9, 0, tzinfo=timezone.utc)
+
+
+def copy(todo):
+    return Todo(todo_id=todo.todo_id, chat_id=todo.chat_id, todo_name=todo.todo_name, status=todo.status,
+                create_time=todo.create_time, end_time=todo.end_time)
+
+
+class FakeTodoDAO:
+    """
+    内存中的 AsyncTodoDAO，与数据库一样每次查询返回新对象；
+    snapshot_gate 不为 None 时快照查询读取数据后等待它
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.next_id = 1
+        self.snapshot_gate = None
+        self.snapshot_started = asyncio.Event()
+
+    def seed(self, name, status='pending', end_time=None):
+        todo = Todo(todo_id=self.next_id, chat_id=CHAT, todo_name=name, status=status,
+                    create_time=NOW + timedelta(minutes=self.next_id), end_time=end_time)
+        self.rows[todo.todo_id] = todo
+        self.next_id += 1
+        return todo
+
+    async def get_cache_snapshot(self, chat_id, limit):
+        rows = sorted((t for t in self.rows.values() if t.chat_id == chat_id),
+                      key=lambda t: (t.status != 'pending', -t.create_time.timestamp()))[:limit + 1]
+        rows = [copy(todo) for todo in rows]
+        self.snapshot_started.set()
+        if self.snapshot_gate is not None:
+            gate, self.snapshot_gate = self.snapshot_gate, None
+            await gate.wait()
+        return rows
+
+    async def create(self, chat_id, todo_name, create_time, end_time=None):
+        return copy(self.seed(todo_name, end_time=end_time))
+
+    async def get_by_id(self, chat_id, todo_id):
+        todo = self.rows.get(todo_id)
+        return copy(todo) if todo else None
+
+    async def update_status(self, chat_id, todo_id, status):
+        if todo_id not in self.rows:
+            return False
+        self.rows[todo_id].status = status
+        return True
+
+    async def update_end_time(self, chat_id, todo_id, end_time):
+        if todo_id not in self.rows:
+            return False
+        self.rows[todo_id].end_time = end_time
+        return True
+
+    async def delete(self, chat_id, todo_id):
+        return self.rows.pop(todo_id, None) is not None
+
+    async def get_all_todos(self, chat_id):
+        return [copy(todo) for todo in self.rows.values()]
+
+    async def get_pending_todos(self, chat_id):
+        return [copy(todo) for todo in self.rows.values() if todo.status == 'pending']
+
+
+@pytest.fixture
+def dao(monkeypatch):
+    fake = FakeTodoDAO()
+    monkeypatch.setattr(repository_module, "AsyncTodoDAO", fake)
+    return fake
+
+
+def names(todos):
+    return [todo.todo_name for todo in todos]
+
+
+def test_add_during_load_is_not_lost(dao):
+    dao.seed("旧事项")
+    repository = TodoRepository()
+
+    async def run():
+        gate = asyncio.Event()
+        dao.snapshot_gate = gate
+        loading = asyncio.ensure_future(repository.get_all(CHAT))
+        await dao.snapshot_started.wait()
+        await repository.add(CHAT, NOW, None, "新事项")
+        gate.set()
+        await loading
+        return await repository.get_all(CHAT)
+
+    todos = asyncio.run(run())
+    assert names(todos) == ["旧事项", "新事项"]
+    assert repository.counters['stale_loads'] == 1
+    assert 2 in repository.chats[CHAT].todos
+
+
+def test_delete_during_resync_is_not_resurrected(dao):
+    kept = dao.seed("保留")
+    removed = dao.seed("删除")
+    repository = TodoRepository()
+
+    async def run():
+        await repository.get_all(CHAT)
+        gate = asyncio.Event()
+        dao.snapshot_gate = gate
+        dao.snapshot_started.clear()
+        resync = asyncio.ensure_future(repository.resync(CHAT))
+        await dao.snapshot_started.wait()
+        assert await repository.delete(CHAT, removed.todo_id)
+        gate.set()
+        return await resync
+
+    assert asyncio.run(run()) == 1
+    assert list(repository.chats[CHAT].todos) == [kept.todo_id]
+
+
+def test_writes_keep_indexes_in_sync(dao):
+    repository = TodoRepository()
+    due = NOW + timedelta(hours=2)
+
+    async def run():
+        first = await repository.add(CHAT, NOW, due, "写周报")
+        second = await repository.add(CHAT, NOW, None, "买牛奶")
+        assert names(await repository.get_pending(CHAT)) == ["写周报", "买牛奶"]
+        assert names(await repository.get_due(CHAT, NOW, NOW + timedelta(hours=3))) == ["写周报"]
+
+        assert await repository.mark_as_done(CHAT, first.todo_id)
+        assert not await repository.mark_as_done(CHAT, first.todo_id)
+        assert await repository.get_due(CHAT, NOW, NOW + timedelta(hours=3)) == []
+
+        assert await repository.update_end_time(CHAT, second.todo_id, due)
+        assert names(await repository.get_due(CHAT, NOW, NOW + timedelta(hours=3))) == ["买牛奶"]
+
+        assert await repository.delete(CHAT, second.todo_id)
+        assert await repository.get_pending(CHAT) == []
+        assert names(await repository.get_all(CHAT)) == ["写周报"]
+
+    asyncio.run(run())
+    assert repository.counters['loads'] == 1
+
+
+def test_load_gives_up_when_chat_keeps_changing(dao, monkeypatch):
+    repository = TodoRepository()
+    original = dao.get_cache_snapshot
+
+    async def busy_snapshot(chat_id, limit):
+        rows = await original(chat_id, limit)
+        repository._written(chat_id)
+        return rows
+
+    monkeypatch.setattr(dao, "get_cache_snapshot", busy_snapshot)
+    dao.seed("事项")
+
+    async def run():
+        # 分区始终加载失败时查询回源数据库
+        todos = await repository.get_all(CHAT)
+        with pytest.raises(Exception):
+            await repository.resync(CHAT)
+        return todos
+
+    assert names(asyncio.run(run())) == ["事项"]
+    assert CHAT not in repository.chats
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import Bot
+
+from bot.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "s3cret_token-1"
+UPDATE = {
+    "update_id": 10001,
+    "message": {
+        "message_id": 7,
+        "date": 1760000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "测试"},
+        "text": "todo 交周报",
+    },
+}
+
+
+def make_server():
+    application = SimpleNamespace(bot=Bot("123456:TEST"), update_queue=asyncio.Queue(), running=True)
+    return WebhookServer(application, listen="127.0.0.1", port=0, path="telegram", secret_token=SECRET)
+
+
+def post(server, *requests):
+    """启动测试服务，依次向 webhook 路径发出 POST（每个参数是一次请求的 kwargs），返回状态码列表"""
+    async def scenario():
+        async with TestClient(TestServer(server.app)) as client:
+            statuses = []
+            for kwargs in requests:
+                async with client.post("/telegram", **kwargs) as response:
+                    statuses.append(response.status)
+            return statuses
+    return asyncio.run(scenario())
+
+
+def test_rejects_wrong_secret():
+    server = make_server()
+    assert post(server, dict(json=UPDATE, headers={SECRET_HEADER: "wrong"}), dict(json=UPDATE)) == [403, 403]
+    assert server.counters['rejected'] == 2
+    assert server.application.update_queue.empty()
+
+
+def test_rejects_invalid_json():
+    server = make_server()
+    headers = {SECRET_HEADER: SECRET, "Content-Type": "application/json"}
+    assert post(server, dict(data="{不是 JSON", headers=headers)) == [400]
+    assert server.counters['invalid'] == 1
+
+
+def test_rejects_json_that_is_not_an_object():
+    server = make_server()
+    bodies = ([], 1, "update", None, {"update_id": 1, "message": 1})
+    assert post(server, *(dict(json=body, headers={SECRET_HEADER: SECRET}) for body in bodies)) == [400] * 5
+    assert server.counters['invalid'] == 5
+    assert server.application.update_queue.empty()
+
+
+def test_valid_update_is_enqueued():
+    server = make_server()
+    assert post(server, dict(json=UPDATE, headers={SECRET_HEADER: SECRET})) == [200]
+    update = server.application.update_queue.get_nowait()
+    assert update.update_id == 10001
+    assert update.effective_chat.id == 42
+    assert update.effective_message.text == "todo 交周报"
+    assert server.counters['accepted'] == 1
+    assert server.last_update_at is not None
@@ -1,40 +1,76 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from bot.config import LOG_LEVEL, LOG_PAYLOAD_MAX_CHARS
+
+# 慢查询日志的记录器名称，单独写入 logs/sql.log
+SLOW_QUERY_LOGGER = 'sql.slow'
+# 每个更新的耗时分解（utils/tracing.py），单独写入 logs/trace.log
+TRACE_LOGGER = 'trace'
+
+_listener: Optional[QueueListener] = None
+
+
+def truncate(value, limit: int = LOG_PAYLOAD_MAX_CHARS) -> str:
+    """把较大的对象（请求体、网页正文、SQL 参数）截断后再写日志"""
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…（共 {len(text)} 字符）"
+
+
+class _NameFilter(logging.Filter):
+    """只放行（或只拦截）某个记录器及其子记录器的日志"""
+
+    def __init__(self, name: str, exclude: bool = False):
+        super().__init__(name)
+        self.exclude = exclude
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        matched = super().filter(record)
+        return not matched if self.exclude else matched
 
 
 def init_logger():
+    """
+    初始化日志：业务代码只把日志记录放进队列（QueueHandler），
+    格式化和写控制台、写文件都在 QueueListener 的后台线程完成，不占用事件循环
+    """
+    global _listener
+    if _listener is not None:
+        return
+
     # 创建 logs 目录（如果不存在）
     if not os.path.exists('logs'):
         os.makedirs('logs')
 
-    # 配置根日志记录器
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
-    # 创建文件处理器
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+    console_handler.addFilter(_NameFilter(TRACE_LOGGER, exclude=True))
+
     file_handler = RotatingFileHandler(
         'logs/bot.log',  # 日志文件路径
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5,  # 保留5个备份文件
         encoding='utf-8'
     )
-
-    # 设置文件处理器的格式
-    formatter = logging.Formatter(
-        '%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
     file_handler.setFormatter(formatter)
+    file_handler.addFilter(_NameFilter(SLOW_QUERY_LOGGER, exclude=True))
+    file_handler.addFilter(_NameFilter(TRACE_LOGGER, exclude=True))
 
-    # 获取根日志记录器并添加文件处理器
-    root_logger = logging.getLogger()
-    root_logger.addHandler(file_handler)
-
-    # 单独配置 SQL 日志
+    # 慢查询单独写一个文件（替代原来的 SQL echo 日志）
     sql_handler = RotatingFileHandler(
         'logs/sql.log',
         maxBytes=10 * 1024 * 1024,
@@ -42,8 +78,37 @@ def init_logger():
         encoding='utf-8'
     )
     sql_handler.setFormatter(formatter)
+    sql_handler.addFilter(_NameFilter(SLOW_QUERY_LOGGER))
+
+    trace_handler = RotatingFileHandler(
+        'logs/trace.log',
+        maxBytes=10 * 1024 * 1024,
+        backupCount=5,
+        encoding='utf-8'
+    )
+    trace_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    trace_handler.addFilter(_NameFilter(TRACE_LOGGER))
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, console_handler, file_handler, sql_handler, trace_handler,
+                              respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logger)
+
+    # 根日志记录器只保留队列处理器
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(LOG_LEVEL)
+
+    # httpx 每个请求（包括长轮询的 getUpdates）都会打一条 INFO 日志
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
 
-    # 配置 SQLAlchemy 日志
-    sql_logger = logging.getLogger('sqlalchemy.engine')
-    sql_logger.setLevel(logging.INFO)
-    sql_logger.addHandler(sql_handler)
+def stop_logger():
+    """停止后台写日志的线程，写完队列中剩余的记录"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,241 @@
+"""
+进程内指标：计数器、仪表和直方图，按 Prometheus 文本格式（0.0.4）导出，不依赖 prometheus_client。
+
+- 指标在本模块底部集中定义，各模块导入后直接记录，例如
+  HANDLER_SECONDS.observe(0.12, command="done", outcome="ok")
+- 已有 stats() 的组件（限流器、各类缓存、提醒引擎、连接池）用 register_stats 登记，导出时读取当前值
+- 记录只在内存中累加，导出由 bot/metrics_server.py 的 /metrics 完成
+"""
+import math
+import re
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+_NAME = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*$')
+
+# 默认直方图分桶（秒），覆盖从毫秒级查询到分钟级的 LLM 调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        if not _NAME.match(name):
+            raise ValueError(f"指标名不合法: {name}")
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.lock = Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"指标 {self.name} 缺少标签 {e}")
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    """分桶累计的耗时或大小分布"""
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数（非累计）..., +Inf 桶计数], 总和
+        self.values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """同 time，并按 with 块是否抛出异常自动填写 outcome 标签（ok / error）"""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            self.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    def samples(self) -> Iterable[str]:
+        with self.lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self.values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """指标登记表，render() 输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.stats_sources: Dict[str, Tuple[str, Callable[[], dict]]] = {}
+        self.lock = Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"指标 {metric.name} 已登记")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, description, labelnames))
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, description, labelnames, buckets))
+
+    def register_stats(self, prefix: str, description: str, stats: Callable[[], dict]):
+        """
+        登记一个返回 {名称: 数值} 的 stats()，导出时每个数值一个仪表 <prefix>_<名称>；
+        同名前缀重复登记时替换（例如重启后的新实例）
+        """
+        if not _NAME.match(prefix):
+            raise ValueError(f"指标前缀不合法: {prefix}")
+        with self.lock:
+            self.stats_sources[prefix] = (description, stats)
+
+    def _render_stats(self, prefix: str, description: str, stats: Callable[[], dict]) -> List[str]:
+        try:
+            values = stats()
+        except Exception:
+            return []
+        lines = []
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}"
+            lines += [f"# HELP {name} {description}: {key}", f"# TYPE {name} gauge",
+                      f"{name} {_format_value(value)}"]
+        return lines
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+            sources = list(self.stats_sources.items())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        for prefix, (description, stats) in sources:
+            lines += self._render_stats(prefix, description, stats)
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+# ---- 指标定义 ----
+
+HANDLER_SECONDS = _registry.histogram(
+    "bot_handler_seconds", "处理一条消息或命令的耗时（秒）", ("command", "outcome"))
+DB_QUERY_SECONDS = _registry.histogram(
+    "db_query_seconds", "单条 SQL 语句的执行耗时（秒）", ("engine", "operation"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+PAGE_FETCH_SECONDS = _registry.histogram(
+    "page_fetch_seconds", "网页抓取耗时（秒），result 为 hit / revalidated / miss / error", ("result",))
+PAGE_FETCH_BYTES = _registry.histogram(
+    "page_fetch_bytes", "抓取到的网页大小（字节）", (),
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+LLM_REQUEST_SECONDS = _registry.histogram(
+    "llm_request_seconds", "单次 LLM 请求耗时（秒，流式请求为到首个字节），status 为状态码或错误类型", ("mode", "status"))
+SCHEDULER_JOB_SECONDS = _registry.histogram(
+    "scheduler_job_seconds", "定时任务耗时（秒）", ("job", "outcome"))
+
+
+def register_stats(prefix: str, description: str, stats: Callable[[], dict]):
+    _registry.register_stats(prefix, description, stats)
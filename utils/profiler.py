@@ -0,0 +1,96 @@
+"""
+按需开启的采样分析器。
+
+后台线程每隔 PROFILE_INTERVAL_MS 读取一次所有线程的调用栈（sys._current_frames），
+汇总为 collapsed stack 格式：每行 "线程名;外层函数;...;内层函数 次数"，
+可直接交给 flamegraph.pl 生成火焰图，或拖进 speedscope 查看。
+
+不依赖 py-spy 等外部工具；只在 /profile 指定的时长内运行，同一时间只允许一个。
+事件循环空闲时的栈停在 selectors 的 select 上，工作线程空闲时停在队列的 get 上
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from bot.config import PROFILE_INTERVAL_MS
+
+_active: Optional["SamplingProfiler"] = None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    # 分号是 collapsed 格式的分隔符
+    return label.replace(";", ":")
+
+
+class SamplingProfiler:
+    """定时采样所有线程的调用栈"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.duration = time.monotonic() - self.started_at
+
+    def collapsed(self) -> str:
+        """collapsed stack 格式的结果，按次数从多到少"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+async def profile(seconds: float, interval: float = PROFILE_INTERVAL_MS / 1000) -> SamplingProfiler:
+    """
+    采样 seconds 秒后返回分析器，期间事件循环照常运行
+
+    Raises:
+        ValueError: 已有分析在进行中
+    """
+    global _active
+    if _active is not None:
+        raise ValueError("已有性能分析在进行中，请稍后再试")
+    profiler = _active = SamplingProfiler(interval)
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        # join 只等待一个采样间隔，不会明显阻塞事件循环
+        profiler.stop()
+        _active = None
+    return profiler
@@ -0,0 +1,329 @@
+"""
+Telegram 消息渲染：预编译模板 + join 拼接 + 按长度上限安全切分。
+
+- 模板在导入时绑定为 str.format，渲染时不再解析格式串；待办列表逐行的模板用更快的 % 格式化
+- 每次渲染只取一次当前时间，时区偏移按小时缓存，日期字段直接用 % 格式化，不调用 astimezone 和 strftime
+- 输出按 Telegram 4096 字符上限切分为多条消息：优先在条目之间切分，
+  条目本身过长时在换行或空格处切分，不会切开 HTML 标签或实体，
+  切分处仍未闭合的标签会在本条末尾闭合、下一条开头重新打开
+"""
+import logging
+import re
+from datetime import datetime
+from html import escape
+from typing import Iterable, List, Optional
+
+from telegram.constants import MessageLimit
+
+from bot.config import TIMEZONE
+
+MAX_MESSAGE_LENGTH = MessageLimit.MAX_TEXT_LENGTH
+
+# ---- 模板 ----
+
+_TODO_HEADER = "📝 {title}待办事项:".format
+_TODO_EMPTY = "📝 没有{title}待办事项".format
+# 待办列表逐行渲染，用 % 格式化（比 str.format 快）：(编号, 标记, 名称, 创建时间)
+_TODO_ITEM = "━━━━━━━━━━━━━━━\n📌 <code>%s</code> %s %s\n⏰ 创建：%s"
+_TODO_DUE = "\n⏳ 截止：%s (还剩 %d天%d小时)"
+_TODO_OVERDUE = "\n⚠️ 截止：%s [已过期]"
+_TODO_FOOTER = "━━━━━━━━━━━━━━━"
+
+_REMINDER_ITEM = "{marker} <code>{id}</code>. {name}".format
+
+_LINK_HEAD = "🔗 链接 {id}:".format
+_LINK_TITLE = "📝 标题: {title}".format
+_LINK_URL = "🌐 URL: {url}".format
+_LINK_SUMMARY = "📋 摘要: {summary}".format
+_LINK_SAVED = "⏰ 保存时间: {saved}".format
+
+_DIGEST_OVERVIEW_ITEM = "{index}. <a href=\"{url}\">{title}</a>".format
+_DIGEST_ITEM = "🔍 <b>{title}</b>\n\n🌐 <a href=\"{url}\">原文链接</a>\n\n📝 <b>摘要</b>:\n{summary}".format
+
+
+def _text(value) -> str:
+    """转义用户内容，避免破坏 HTML 结构"""
+    return escape(str(value), quote=False)
+
+
+def _attr(value) -> str:
+    return escape(str(value), quote=True)
+
+
+class _LocalClock:
+    """
+    一次渲染共用的时钟：当前时间只取一次；
+    到 TIMEZONE 的偏移按 (原时区, 小时) 缓存，逐行只做一次 datetime 加法，避免 astimezone 和 replace
+    """
+
+    def __init__(self, now: Optional[datetime] = None):
+        self.now = self.aware(now or datetime.now(TIMEZONE))
+        self._shifts = {}
+
+    @staticmethod
+    def aware(value: datetime) -> datetime:
+        # 无时区的时间按 TIMEZONE 本地时间解释
+        return value if value.tzinfo is not None else TIMEZONE.localize(value)
+
+    def md_hm(self, value: datetime) -> str:
+        """MM-DD HH:MM（TIMEZONE 本地时间），value 需带时区"""
+        key = (value.tzinfo, value.toordinal() * 24 + value.hour, value.fold)
+        shift = self._shifts.get(key)
+        if shift is None:
+            shift = self._shifts[key] = value.astimezone(TIMEZONE).utcoffset() - value.utcoffset()
+        # 加上偏移后年月日时分即为本地时间；% 格式化比 strftime 和 f-string 都快
+        value += shift
+        return "%02d-%02d %02d:%02d" % (value.month, value.day, value.hour, value.minute)
+
+
+def _ymd_hm(value: datetime) -> str:
+    """YYYY-MM-DD HH:MM，比 datetime.strftime 快"""
+    return "%04d-%02d-%02d %02d:%02d" % (value.year, value.month, value.day, value.hour, value.minute)
+
+
+# ---- 切分 ----
+
+_TOKEN = re.compile(r"<[^<>]*>|&#?\w+;|[^<&]+|[<&]")
+_TAG_NAME = re.compile(r"</?\s*([a-zA-Z0-9-]+)")
+_STRIP_TAGS = re.compile(r"<[^<>]*>")
+
+
+class _Overflow(Exception):
+    """当前段只有重新打开的标签，仍然放不下下一个标签、实体或字符"""
+
+
+def split_html(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    把一段 HTML 切分为不超过 limit 的多段。
+    标签和实体不会被切开；切分处未闭合的标签在本段末尾闭合，下一段开头重新打开，
+    选择切分点时为这些标签预留长度。标签嵌套过深、重新打开和闭合的标签本身就超过 limit 时，
+    去掉所有标签按纯文本切分。
+
+    Raises:
+        ValueError: limit 小于单个实体的长度
+    """
+    if len(text) <= limit:
+        return [text]
+    try:
+        return _split_tokens(text, limit)
+    except _Overflow:
+        logging.warning(f"HTML 标签嵌套过深，无法在 {limit} 字符内切分，改为纯文本")
+    plain = _STRIP_TAGS.sub("", text)
+    if len(plain) <= limit:
+        return [plain]
+    try:
+        return _split_tokens(plain, limit)
+    except _Overflow:
+        raise ValueError(f"切分长度 {limit} 过小，放不下单个 HTML 实体")
+
+
+def _split_tokens(text: str, limit: int) -> List[str]:
+    chunks: List[str] = []
+    open_tags: List[tuple] = []  # [(标签名, 原始开标签)]
+    parts: List[str] = []
+    size = 0
+    closing = 0  # 闭合当前所有标签所需的长度
+
+    def flush():
+        nonlocal size
+        chunks.append("".join(parts) + "".join(f"</{name}>" for name, _ in reversed(open_tags)))
+        parts.clear()
+        parts.extend(tag for _, tag in open_tags)
+        size = sum(len(tag) for _, tag in open_tags)
+
+    def has_content() -> bool:
+        return len(parts) > len(open_tags)
+
+    def make_room(needed: int):
+        """放不下 needed 时先切分；新的一段（只有重新打开的标签）仍然放不下时抛出 _Overflow"""
+        if size + needed + closing <= limit:
+            return
+        if not has_content():
+            raise _Overflow()
+        flush()
+        if size + needed + closing > limit:
+            raise _Overflow()
+
+    for token in _TOKEN.findall(text):
+        if token.startswith("<") and len(token) > 1:
+            match = _TAG_NAME.match(token)
+            name = match.group(1).lower() if match else ""
+            if token.startswith("</"):
+                # 闭合标签：弹出到对应的开标签为止，长度已计入 closing
+                for index in range(len(open_tags) - 1, -1, -1):
+                    if open_tags[index][0] == name:
+                        for popped, _ in open_tags[index:]:
+                            closing -= len(popped) + 3
+                        del open_tags[index:]
+                        break
+                else:
+                    make_room(len(token))
+                parts.append(token)
+                size += len(token)
+                continue
+            # 开标签、对应的闭合标签，以及至少一个字符的内容
+            make_room(len(token) + (len(name) + 3 if name else 0) + 1)
+            parts.append(token)
+            size += len(token)
+            if name:
+                open_tags.append((name, token))
+                closing += len(name) + 3
+            continue
+
+        if token.startswith("&") and len(token) > 1:
+            make_room(len(token))
+            parts.append(token)
+            size += len(token)
+            continue
+
+        # 普通文本：放不下时优先在换行、其次在空格处切分
+        while token:
+            available = limit - size - closing
+            if len(token) <= available:
+                parts.append(token)
+                size += len(token)
+                break
+            cut = token.rfind("\n", 0, available + 1)
+            if cut <= 0:
+                cut = token.rfind(" ", 0, available + 1)
+            if cut <= 0:
+                if has_content():
+                    flush()
+                    continue
+                if available < 1:
+                    raise _Overflow()
+                cut = available
+            parts.append(token[:cut])
+            size += cut
+            flush()
+            token = token[cut:].lstrip("\n")
+
+    if has_content():
+        chunks.append("".join(parts) + "".join(f"</{name}>" for name, _ in reversed(open_tags)))
+    return chunks
+
+
+def pack_messages(blocks: Iterable[str], header: str = "", footer: str = "", sep: str = "\n",
+                  limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    把若干条目拼成尽量少的消息，每条不超过 limit。
+    只在条目之间切分；单个条目超长时用 split_html 再切。
+    header 只出现在第一条，footer 只出现在最后一条。
+    """
+    messages: List[str] = []
+    current: List[str] = [header] if header else []
+    size = len(header)
+
+    def flush():
+        nonlocal size
+        if current:
+            messages.append(sep.join(current))
+        current.clear()
+        size = 0
+
+    for block in blocks:
+        extra = len(block) + (len(sep) if current else 0)
+        if size + extra > limit:
+            flush()
+            if len(block) > limit:
+                pieces = split_html(block, limit)
+                messages.extend(pieces[:-1])
+                block = pieces[-1]
+            extra = len(block)
+        current.append(block)
+        size += extra
+
+    if footer:
+        if size + len(sep) + len(footer) > limit:
+            flush()
+        current.append(footer)
+    flush()
+    return messages or [""]
+
+
+# ---- 待办事项 ----
+
+def render_todo_list(todos, list_type: str = "all", now: Optional[datetime] = None) -> List[str]:
+    """渲染待办事项列表，返回一条或多条消息"""
+    title = "未完成的" if list_type == "pending" else ""
+    if not todos:
+        return [_TODO_EMPTY(title=title)]
+
+    clock = _LocalClock(now)
+    blocks = []
+    for todo in todos:
+        block = _TODO_ITEM % (
+            todo.todo_id,
+            "✅" if todo.status == 'completed' else "⭕️",
+            _text(todo.todo_name),
+            clock.md_hm(clock.aware(todo.create_time))
+        )
+        if todo.end_time:
+            end_time = clock.aware(todo.end_time)
+            remaining = end_time - clock.now
+            if remaining.days >= 0:
+                block += _TODO_DUE % (clock.md_hm(end_time), remaining.days, remaining.seconds // 3600)
+            else:
+                block += _TODO_OVERDUE % clock.md_hm(end_time)
+        blocks.append(block)
+
+    header = _TODO_HEADER(title=title if list_type == "pending" else "所有") + "\n"
+    return pack_messages(blocks, header=header, footer=_TODO_FOOTER)
+
+
+def render_due_reminder(title: str, section: str, todos, marker: str, empty_text: str) -> List[str]:
+    """渲染截止提醒：标题、分组名，以及每条待办一行"""
+    return render_due_sections(title, [(section, todos, marker, empty_text)])
+
+
+def render_due_sections(title: str, sections) -> List[str]:
+    """
+    渲染包含多个分组（今日、明日、已过期……）的截止提醒，合并为尽量少的消息。
+    sections 为 [(分组名, 待办列表, 标记, 为空时的文本)]，为空时的文本为 None 的空分组不显示
+    """
+    blocks = []
+    for section, todos, marker, empty_text in sections:
+        if not todos:
+            if empty_text is not None:
+                blocks.append(f"\n{section}\n{empty_text}")
+            continue
+        blocks.append(f"\n{section}")
+        blocks.extend(_REMINDER_ITEM(marker=marker, id=todo.todo_id, name=_text(todo.todo_name)) for todo in todos)
+    return pack_messages(blocks, header=title)
+
+
+# ---- 链接 ----
+
+def render_link_info(link) -> str:
+    """渲染单个链接的信息"""
+    lines = [_LINK_HEAD(id=link.id)]
+    if link.title:
+        lines.append(_LINK_TITLE(title=_text(link.title)))
+    lines.append(_LINK_URL(url=_text(link.url)))
+    if link.summary:
+        lines.append(_LINK_SUMMARY(summary=_text(link.summary)))
+    lines.append(_LINK_SAVED(saved=_ymd_hm(link.created_at)))
+    return "\n".join(lines)
+
+
+def render_link_list(links, header: str) -> List[str]:
+    """渲染链接列表，链接之间空一行"""
+    return pack_messages((render_link_info(link) + "\n" for link in links), header=header)
+
+
+def render_digest_overview(links, header: str = "📚 <b>未读链接摘要</b>\n") -> List[str]:
+    """渲染未读链接摘要的总览"""
+    lines = [
+        _DIGEST_OVERVIEW_ITEM(index=index, url=_attr(link.url), title=_text(link.title or '无标题'))
+        for index, link in enumerate(links, 1)
+    ]
+    return pack_messages(lines, header=header)
+
+
+def render_digest_item(link, summary: str) -> List[str]:
+    """渲染单个链接的摘要消息"""
+    return split_html(_DIGEST_ITEM(
+        title=_text(link.title or '无标题'),
+        url=_attr(link.url),
+        summary=_text(summary)
+    ))
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发调用：同一时刻只执行一次，其他调用者等待同一个结果。
+
+    - 执行出错时所有等待者都收到同一个异常，记录随即清除，下一次调用会重新执行
+    - 单个调用者被取消不会影响其他等待者；所有等待者都取消时才取消底层任务
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.counters = {'leaders': 0, 'followers': 0}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def _done(self, key: Hashable, call: _Call, task: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 标记异常已被读取，避免无人等待时出现 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """执行 func 或加入已在进行中的同 key 调用，返回共享结果"""
+        call: Optional[_Call] = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, k=key, c=call: self._done(k, c, task))
+            self.counters['leaders'] += 1
+        else:
+            self.counters['followers'] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 所有等待者都已取消：取消底层任务，并让后续调用重新开始
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
@@ -0,0 +1,169 @@
+"""
+按 Telegram update_id 的轻量链路追踪。
+
+- Application 处理每个更新时 start_trace(update_id)，追踪对象保存在 ContextVar 中，
+  同一更新内 await 的调用、asyncio.to_thread 和 SQLAlchemy 异步引擎的 greenlet 都能读到
+- 业务入口（todo service、LinkService、AIService）用 @traced 标记；
+  SQL 语句、网页抓取、LLM 请求在已有的计时点调用 add_span
+- 更新处理完后把耗时分解写入 logs/trace.log，例如
+
+    update 1024 handler done 152.3ms | sql 2 次 41.0ms
+        0.1ms  +151.9ms  handler done
+        0.3ms  +148.2ms    todo.service.complete_todo_async
+        2.0ms   +30.5ms      sql UPDATE
+
+没有进行中的追踪时，span / add_span 只读取一次 ContextVar
+"""
+import asyncio
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bot.config import TRACE_MAX_SPANS, TRACE_MIN_MS
+from utils.logger import TRACE_LOGGER
+
+# 业务调用；其他种类（sql / fetch / llm）在摘要行中按次数和总耗时汇总
+CALL = 'call'
+
+trace_logger = logging.getLogger(TRACE_LOGGER)
+
+_current: ContextVar[Optional["Trace"]] = ContextVar('trace', default=None)
+# 当前嵌套深度；并发的子任务各自持有一份副本
+_depth: ContextVar[int] = ContextVar('trace_depth', default=0)
+
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    start: float
+    duration: float
+    depth: int
+
+
+class Trace:
+    """一个更新的所有 span，结束后不再接受新的 span（例如更新处理完后仍在运行的后台任务）"""
+
+    def __init__(self, update_id: int, name: str, max_spans: int = TRACE_MAX_SPANS):
+        self.update_id = update_id
+        self.name = name
+        self.max_spans = max_spans
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def add(self, kind: str, name: str, start: float, duration: float, depth: int):
+        if self.duration is not None:
+            return
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return
+        self.spans.append(Span(kind, name, start - self.start, duration, depth))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def summary(self) -> Dict[str, Tuple[int, float]]:
+        """非业务调用的 span 按种类汇总为 (次数, 总耗时)"""
+        totals: Dict[str, Tuple[int, float]] = {}
+        for span in self.spans:
+            if span.kind != CALL:
+                count, total = totals.get(span.kind, (0, 0.0))
+                totals[span.kind] = (count + 1, total + span.duration)
+        return totals
+
+    def render(self) -> str:
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        head = f"update {self.update_id} {self.name} {duration * 1000:.1f}ms"
+        parts = [f"{kind} {count} 次 {total * 1000:.1f}ms" for kind, (count, total) in self.summary().items()]
+        lines = [" | ".join([head] + parts)]
+        for span in sorted(self.spans, key=lambda s: s.start):
+            lines.append(f"    {span.start * 1000:7.1f}ms {span.duration * 1000:+8.1f}ms  "
+                         f"{'  ' * span.depth}{span.name}")
+        if self.dropped:
+            lines.append(f"    …另有 {self.dropped} 个 span 未记录")
+        return "\n".join(lines)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def start_trace(update_id: int, name: str):
+    """
+    在追踪上下文中处理一个更新，结束后耗时不低于 TRACE_MIN_MS 的写入 trace 日志；
+    TRACE_MIN_MS 为负数时不追踪
+    """
+    if TRACE_MIN_MS < 0:
+        yield None
+        return
+    trace = Trace(update_id, name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.finish()
+        if trace.duration * 1000 >= TRACE_MIN_MS:
+            trace_logger.info(trace.render())
+
+
+def add_span(kind: str, name: str, start: float, duration: float):
+    """记录一个已完成的操作（start 为 time.perf_counter() 读数），没有进行中的追踪时忽略"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(kind, name, start, duration, _depth.get())
+
+
+@contextmanager
+def span(name: str, kind: str = CALL):
+    """记录 with 块的耗时，块内的 span 嵌套在其下"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+        trace.add(kind, name, start, time.perf_counter() - start, depth)
+
+
+def _default_name(func: Callable) -> str:
+    # 方法用 类名.方法名，模块函数用去掉顶层包的模块路径，例如 todo.service.create_todo_async
+    if "." in func.__qualname__:
+        return func.__qualname__
+    return ".".join(func.__module__.split(".")[1:] + [func.__qualname__])
+
+
+def traced(name: Optional[str] = None):
+    """
+    把函数调用记录为 span 的装饰器，支持普通函数和协程函数。
+    异步生成器（流式输出）不适用：ContextVar 不能跨 yield 重置
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or _default_name(func)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator